@@ -0,0 +1,89 @@
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.schemas.schemas import ArchivedCourse, ArchivedRegistration
+from app.services.archive_service import ArchiveService
+from app.models.models import CourseCategory
+
+router = APIRouter()
+
+
+@router.get("/courses", response_model=List[ArchivedCourse])
+def get_archived_courses(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    category: Optional[CourseCategory] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    db: Session = Depends(get_db)
+):
+    """
+    取得已封存的課程（依日期新到舊）
+
+    - **category**: 課程類別篩選（選填）
+    - **from** / **to**: 課程日期區間（選填，含起訖日）
+    - **q**: 標題或地點關鍵字（選填）
+    """
+    return ArchiveService.get_courses(
+        db=db,
+        skip=skip,
+        limit=limit,
+        category=category,
+        date_from=date_from,
+        date_to=date_to,
+        keyword=q
+    )
+
+
+@router.get("/courses/{course_id}", response_model=ArchivedCourse)
+def get_archived_course(
+    course_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    取得單一已封存的課程
+
+    - **course_id**: 課程 ID（與封存前相同）
+    """
+    course = ArchiveService.get_course(db=db, course_id=course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="找不到此封存課程")
+    return course
+
+
+@router.get("/courses/{course_id}/registrations", response_model=List[ArchivedRegistration])
+def get_archived_course_registrations(
+    course_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    取得已封存課程的報名記錄
+
+    需要管理員權限（暫未實作權限驗證）
+    """
+    if not ArchiveService.get_course(db=db, course_id=course_id):
+        raise HTTPException(status_code=404, detail="找不到此封存課程")
+    return ArchiveService.get_registrations(db=db, skip=skip, limit=limit, course_id=course_id)
+
+
+@router.get("/registrations", response_model=List[ArchivedRegistration])
+def get_archived_registrations(
+    email: str = Query(..., min_length=3),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    依 email 查詢已封存的報名記錄
+
+    - **email**: 報名者的電子郵件
+
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return ArchiveService.get_registrations(db=db, skip=skip, limit=limit, email=email)
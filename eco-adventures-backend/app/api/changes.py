@@ -0,0 +1,40 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.config import settings
+from app.schemas.schemas import ChangeFeed
+from app.services.change_feed import ENTITIES, change_watcher
+
+router = APIRouter()
+
+
+@router.get("/", response_model=ChangeFeed)
+async def get_changes(
+    since: int = Query(0, ge=0, description="上次回應的 next；0 表示從頭取得完整資料"),
+    limit: int = Query(settings.CHANGES_PAGE_SIZE, ge=1, le=1000),
+    wait: int = Query(0, ge=0, le=settings.CHANGES_LONG_POLL_MAX_SECONDS),
+    entities: Optional[str] = Query(None, description="以逗號分隔的資料種類，例如 course,faq"),
+):
+    """
+    取得課程、講師、活動與 FAQ 在 since 之後的異動（增量同步）
+
+    - **since**: 上次回應的 next；0 表示從頭取得所有現有資料
+    - **limit**: 每次讀取的異動紀錄數
+    - **wait**: 沒有新異動時最多等待的秒數（長輪詢），有異動時立即回傳
+    - **entities**: 只回傳指定種類的資料（course、instructor、activity、faq）
+
+    同一筆資料只回傳最後一次異動：upsert 附上與 GET 端點相同的內容，delete 為 tombstone。
+    has_more 為 true 時以 next 立即再請求；reset 為 true 時同步位置已過期，
+    需以列表端點重新下載完整資料，再從 next 繼續
+    """
+    selected = None
+    if entities:
+        selected = {part.strip() for part in entities.split(",") if part.strip()}
+        unknown = selected - set(ENTITIES)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"entities 只能是 {', '.join(ENTITIES)}，不支援：{', '.join(sorted(unknown))}"
+            )
+    return await change_watcher.poll(since, limit, selected or None, wait)
@@ -1,11 +1,23 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
-from app.schemas.schemas import Course, CourseCreate, CourseUpdate, Message
+from app.schemas.schemas import (
+    Course, CourseCreate, CourseUpdate, Message,
+    CalendarDay, MonthSummary, CategorySummary,
+    CourseBulkStatus, CourseBulkResult, CourseFacets
+)
 from app.services.course_service import CourseService
+from app.services.calendar_service import CalendarService
+from app.services.facet_service import course_facets
+from app.services.seat_stream import seat_broadcaster
+from app.services.projection import course_projection
 from app.models.models import CourseStatus, CourseCategory
+from app.services.versioning import etag
+from app.api.params import parse_ids, parse_fields, project, parse_if_match
 
 router = APIRouter()
 
@@ -16,6 +28,11 @@ def get_courses(
     limit: int = Query(100, ge=1, le=100),
     status: Optional[CourseStatus] = None,
     category: Optional[CourseCategory] = None,
+    ids: Optional[List[int]] = Depends(parse_ids),
+    fields: Optional[str] = None,
+    has_spots: Optional[bool] = None,
+    min_spots: Optional[int] = Query(None, ge=1),
+    sort: Literal["date", "spots"] = "date",
     db: Session = Depends(get_db)
 ):
     """
@@ -25,44 +42,164 @@ def get_courses(
     - **limit**: 限制回傳的項目數
     - **status**: 課程狀態篩選（選填）
     - **category**: 課程類別篩選（選填）
+    - **ids**: 只取指定的課程，以逗號分隔（選填，例如 1,2,3）
+    - **fields**: 只回傳指定的欄位，以逗號分隔（選填，例如 title,date,available_spots）
+    - **has_spots**: true 只列出還有名額的課程，false 只列出沒有名額的課程（選填）
+    - **min_spots**: 剩餘名額至少幾個（選填）
+    - **sort**: date（日期新到舊，預設）或 spots（剩餘名額多到少）
     """
+    selected = parse_fields(course_projection, fields)
     courses = CourseService.get_multi(
         db=db,
         skip=skip,
         limit=limit,
         status=status,
-        category=category
+        category=category,
+        ids=ids,
+        fields=selected,
+        has_spots=has_spots,
+        min_spots=min_spots,
+        sort=sort
     )
-    return courses
+    return project(courses, course_projection, selected)
 
 
 @router.get("/upcoming", response_model=List[Course])
 def get_upcoming_courses(
     limit: int = Query(10, ge=1, le=50),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     取得即將開始的課程
     
     - **limit**: 限制回傳的課程數量（預設 10）
+    - **fields**: 只回傳指定的欄位，以逗號分隔（選填）
     """
-    courses = CourseService.get_upcoming(db=db, limit=limit)
-    return courses
+    selected = parse_fields(course_projection, fields)
+    courses = CourseService.get_upcoming(db=db, limit=limit, fields=selected)
+    return project(courses, course_projection, selected)
+
+
+@router.get("/calendar", response_model=List[CalendarDay])
+def get_course_calendar(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    db: Session = Depends(get_db)
+):
+    """
+    取得日期區間內的課程行事曆（依日期分組）
+    
+    - **from**: 起始日期（含）
+    - **to**: 結束日期（含），區間最長 92 天
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="結束日期不可早於起始日期")
+    if (date_to - date_from).days > 92:
+        raise HTTPException(status_code=400, detail="查詢區間最長 92 天")
+    
+    days = CalendarService.get_range(db=db, date_from=date_from, date_to=date_to)
+    result = []
+    for day, day_courses in days.items():
+        open_courses = [c for c in day_courses if c.status != CourseStatus.CANCELLED]
+        total_spots = sum(c.max_spots or 0 for c in open_courses)
+        registered = sum(c.current_registrations or 0 for c in open_courses)
+        result.append(CalendarDay(
+            date=day,
+            total_spots=total_spots,
+            available_spots=max(total_spots - registered, 0),
+            courses=day_courses
+        ))
+    return result
+
+
+@router.get("/calendar/summary", response_model=List[MonthSummary])
+def get_course_calendar_summary(
+    from_month: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    to_month: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    db: Session = Depends(get_db)
+):
+    """
+    取得每月課程摘要（課程數、各類別剩餘名額）
+    
+    - **from_month**: 起始月份（YYYY-MM）
+    - **to_month**: 結束月份（YYYY-MM）
+    
+    資料來自預先計算的摘要表，不會即時統計
+    """
+    summaries = CalendarService.get_month_summaries(
+        db=db, from_month=from_month, to_month=to_month
+    )
+    months = {}
+    for row in summaries:
+        month = months.setdefault(row.month, MonthSummary(
+            month=row.month, course_count=0, remaining_spots=0, categories=[]
+        ))
+        remaining = max(row.total_spots - row.registered, 0)
+        month.course_count += row.course_count
+        month.remaining_spots += remaining
+        month.categories.append(CategorySummary(
+            category=row.category,
+            course_count=row.course_count,
+            remaining_spots=remaining
+        ))
+    return list(months.values())
+
+
+@router.get("/facets", response_model=CourseFacets)
+def get_course_facets(
+    status: Optional[CourseStatus] = None,
+    category: Optional[CourseCategory] = None,
+    has_spots: Optional[bool] = None,
+    min_spots: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    """
+    取得課程列表篩選條件的計數（各類別、狀態、月份與地點的課程數）
+    
+    篩選參數與課程列表相同，計數套用所有指定的條件；結果會快取，課程或報名有異動時失效
+    """
+    return course_facets.get(
+        db=db, status=status, category=category, has_spots=has_spots, min_spots=min_spots
+    )
+
+
+@router.get("/seats/stream")
+async def stream_course_seats(ids: Optional[List[int]] = Depends(parse_ids)):
+    """
+    以 Server-Sent Events 推播課程名額與狀態的異動
+    
+    - **ids**: 只訂閱指定的課程，以逗號分隔（選填；未指定時訂閱所有課程的異動）
+    
+    指定課程時先送出目前狀態；之後每次異動送出 `seats` 事件（名額、報名人數、狀態、版本號），
+    課程刪除或封存時送出 `removed` 事件。短時間內的多次異動會合併，只送出最新的狀態
+    """
+    if seat_broadcaster.is_full:
+        raise HTTPException(status_code=503, detail="即時推播連線數已達上限，請稍後再試")
+    return StreamingResponse(
+        seat_broadcaster.stream(ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{course_id}", response_model=Course)
 def get_course(
     course_id: int,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
     取得單一課程詳細資訊
     
     - **course_id**: 課程 ID
+    
+    回應的 ETag 為課程的版本號，更新時以 If-Match 帶回
     """
     course = CourseService.get(db=db, course_id=course_id)
     if not course:
         raise HTTPException(status_code=404, detail="課程不存在")
+    response.headers["ETag"] = etag(course.version)
     return course
 
 
@@ -80,20 +217,44 @@ def create_course(
     return course
 
 
+@router.post("/bulk/status", response_model=CourseBulkResult)
+def bulk_update_course_status(
+    bulk_in: CourseBulkStatus,
+    db: Session = Depends(get_db)
+):
+    """
+    整批變更課程狀態（例如一次關閉多門課程的報名）
+    
+    - **course_ids**: 課程 ID（最多 1000 個，不存在的 ID 會被略過）
+    - **status**: 新的課程狀態
+    
+    以單一 UPDATE 在一個交易中完成，回傳符合與實際變更的課程數。
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return CourseService.bulk_set_status(db=db, course_ids=bulk_in.course_ids, status=bulk_in.status)
+
+
 @router.put("/{course_id}", response_model=Course)
 def update_course(
     course_id: int,
     course_in: CourseUpdate,
+    response: Response,
+    expected_version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db)
 ):
     """
     更新課程資訊
     
+    - **If-Match**: 取得課程時的 ETag（選填），課程已被修改（包含報名人數變動）時回傳 412
+    
     需要管理員權限（暫未實作權限驗證）
     """
-    course = CourseService.update(db=db, course_id=course_id, course_in=course_in)
+    course = CourseService.update(
+        db=db, course_id=course_id, course_in=course_in, expected_version=expected_version
+    )
     if not course:
         raise HTTPException(status_code=404, detail="課程不存在")
+    response.headers["ETag"] = etag(course.version)
     return course
 
 
@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Header, Response
+
+from app.core.compression import choose_encoding
+from app.schemas.schemas import HomeBundle
+from app.services.home_service import home_snapshot
+
+router = APIRouter()
+
+
+@router.get("/", response_model=HomeBundle)
+def get_home(
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    取得首頁所需的所有資料（即將開始的課程、講師、活動、FAQ）
+    
+    資料來自寫入時失效的快照，一個請求取代首頁原本的四個請求；
+    依 Accept-Encoding 直接回傳預先壓縮的內容（brotli 或 gzip），並支援 ETag 條件請求
+    """
+    snapshot = home_snapshot.get()
+    headers = {"ETag": snapshot.etag, "Vary": "Accept-Encoding"}
+    if if_none_match and snapshot.etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    
+    encoding = choose_encoding(accept_encoding, snapshot.encoded)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(snapshot.encoded[encoding], media_type="application/json", headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
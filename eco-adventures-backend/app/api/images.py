@@ -0,0 +1,64 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.services.image_service import image_service, available_formats, FORMATS
+
+router = APIRouter()
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.get("/{image_path:path}")
+async def get_image(
+    image_path: str,
+    w: Optional[int] = Query(None, description="寬度，必須是 IMAGE_WIDTHS 之一"),
+    format: Optional[str] = Query(None, pattern="^(avif|webp|jpeg)$"),
+    v: Optional[str] = Query(None, description="原圖版本（srcset 網址中的內容雜湊）"),
+    accept: Optional[str] = Header(None),
+):
+    """
+    取得縮圖
+    
+    - **w**: 寬度（未指定時使用最大寬度）
+    - **format**: avif、webp 或 jpeg（未指定時依 Accept 標頭選擇）
+    - **v**: 原圖版本；與目前內容相符時回應可永久快取
+    
+    API 回應中的 image_srcset 已包含這些參數
+    """
+    # 檢查檔案與計算雜湊會讀取磁碟，在 thread 中執行
+    source = await asyncio.to_thread(image_service.resolve_source, image_path)
+    if source is None:
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    
+    width = w or max(settings.IMAGE_WIDTHS)
+    if width not in settings.IMAGE_WIDTHS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"寬度必須是 {', '.join(map(str, settings.IMAGE_WIDTHS))} 其中之一"
+        )
+    
+    formats = available_formats()
+    if not formats:
+        # 沒有 Pillow，直接回傳原圖
+        return FileResponse(source, headers={"Cache-Control": "public, max-age=300"})
+    if format:
+        if format not in formats:
+            raise HTTPException(status_code=400, detail=f"此伺服器不支援 {format} 格式")
+        fmt = format
+    else:
+        accepted = (accept or "").lower()
+        fmt = next(
+            (f for f in formats if f == "jpeg" or FORMATS[f][1] in accepted),
+            "jpeg"
+        )
+    
+    path = await image_service.get_variant(source, width, fmt)
+    versioned = v is not None and len(v) >= 8 and \
+        (await asyncio.to_thread(image_service.digest, source)).startswith(v)
+    headers = {"Cache-Control": IMMUTABLE if versioned else "public, max-age=300"}
+    if not format:
+        headers["Vary"] = "Accept"
+    return FileResponse(path, media_type=FORMATS[fmt][1], headers=headers)
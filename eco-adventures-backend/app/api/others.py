@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
@@ -10,6 +10,11 @@ from app.schemas.schemas import (
     Message
 )
 from app.services.other_services import InstructorService, ActivityService, FAQService
+from app.services.projection import (
+    instructor_projection, activity_projection, faq_projection
+)
+from app.services.versioning import etag
+from app.api.params import parse_ids, parse_fields, project, parse_if_match
 
 # ============ 講師 API ============
 instructor_router = APIRouter()
@@ -20,21 +25,25 @@ def get_instructors(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     is_active: Optional[bool] = None,
+    ids: Optional[List[int]] = Depends(parse_ids),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """取得講師列表"""
+    """取得講師列表（ids：只取指定的講師；fields：只回傳指定的欄位）"""
+    selected = parse_fields(instructor_projection, fields)
     instructors = InstructorService.get_multi(
-        db=db, skip=skip, limit=limit, is_active=is_active
+        db=db, skip=skip, limit=limit, is_active=is_active, ids=ids, fields=selected
     )
-    return instructors
+    return project(instructors, instructor_projection, selected)
 
 
 @instructor_router.get("/{instructor_id}", response_model=Instructor)
-def get_instructor(instructor_id: int, db: Session = Depends(get_db)):
-    """取得單一講師"""
+def get_instructor(instructor_id: int, response: Response, db: Session = Depends(get_db)):
+    """取得單一講師（ETag 為版本號）"""
     instructor = InstructorService.get(db=db, instructor_id=instructor_id)
     if not instructor:
         raise HTTPException(status_code=404, detail="講師不存在")
+    response.headers["ETag"] = etag(instructor.version)
     return instructor
 
 
@@ -52,14 +61,18 @@ def create_instructor(
 def update_instructor(
     instructor_id: int,
     instructor_in: InstructorUpdate,
+    response: Response,
+    expected_version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db)
 ):
-    """更新講師資訊"""
+    """更新講師資訊（If-Match 與目前版本不同時回傳 412）"""
     instructor = InstructorService.update(
-        db=db, instructor_id=instructor_id, instructor_in=instructor_in
+        db=db, instructor_id=instructor_id, instructor_in=instructor_in,
+        expected_version=expected_version
     )
     if not instructor:
         raise HTTPException(status_code=404, detail="講師不存在")
+    response.headers["ETag"] = etag(instructor.version)
     return instructor
 
 
@@ -81,21 +94,25 @@ def get_activities(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     category: Optional[str] = None,
+    ids: Optional[List[int]] = Depends(parse_ids),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """取得活動列表"""
+    """取得活動列表（ids：只取指定的活動；fields：只回傳指定的欄位）"""
+    selected = parse_fields(activity_projection, fields)
     activities = ActivityService.get_multi(
-        db=db, skip=skip, limit=limit, category=category
+        db=db, skip=skip, limit=limit, category=category, ids=ids, fields=selected
     )
-    return activities
+    return project(activities, activity_projection, selected)
 
 
 @activity_router.get("/{activity_id}", response_model=Activity)
-def get_activity(activity_id: int, db: Session = Depends(get_db)):
-    """取得單一活動"""
+def get_activity(activity_id: int, response: Response, db: Session = Depends(get_db)):
+    """取得單一活動（ETag 為版本號）"""
     activity = ActivityService.get(db=db, activity_id=activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="活動不存在")
+    response.headers["ETag"] = etag(activity.version)
     return activity
 
 
@@ -113,14 +130,18 @@ def create_activity(
 def update_activity(
     activity_id: int,
     activity_in: ActivityUpdate,
+    response: Response,
+    expected_version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db)
 ):
-    """更新活動資訊"""
+    """更新活動資訊（If-Match 與目前版本不同時回傳 412）"""
     activity = ActivityService.update(
-        db=db, activity_id=activity_id, activity_in=activity_in
+        db=db, activity_id=activity_id, activity_in=activity_in,
+        expected_version=expected_version
     )
     if not activity:
         raise HTTPException(status_code=404, detail="活動不存在")
+    response.headers["ETag"] = etag(activity.version)
     return activity
 
 
@@ -143,21 +164,26 @@ def get_faqs(
     limit: int = Query(100, ge=1, le=100),
     is_active: Optional[bool] = None,
     category: Optional[str] = None,
+    ids: Optional[List[int]] = Depends(parse_ids),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """取得 FAQ 列表"""
+    """取得 FAQ 列表（ids：只取指定的 FAQ；fields：只回傳指定的欄位）"""
+    selected = parse_fields(faq_projection, fields)
     faqs = FAQService.get_multi(
-        db=db, skip=skip, limit=limit, is_active=is_active, category=category
+        db=db, skip=skip, limit=limit, is_active=is_active, category=category,
+        ids=ids, fields=selected
     )
-    return faqs
+    return project(faqs, faq_projection, selected)
 
 
 @faq_router.get("/{faq_id}", response_model=FAQ)
-def get_faq(faq_id: int, db: Session = Depends(get_db)):
-    """取得單一 FAQ"""
+def get_faq(faq_id: int, response: Response, db: Session = Depends(get_db)):
+    """取得單一 FAQ（ETag 為版本號）"""
     faq = FAQService.get(db=db, faq_id=faq_id)
     if not faq:
         raise HTTPException(status_code=404, detail="FAQ 不存在")
+    response.headers["ETag"] = etag(faq.version)
     return faq
 
 
@@ -172,12 +198,17 @@ def create_faq(faq_in: FAQCreate, db: Session = Depends(get_db)):
 def update_faq(
     faq_id: int,
     faq_in: FAQUpdate,
+    response: Response,
+    expected_version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db)
 ):
-    """更新 FAQ"""
-    faq = FAQService.update(db=db, faq_id=faq_id, faq_in=faq_in)
+    """更新 FAQ（If-Match 與目前版本不同時回傳 412）"""
+    faq = FAQService.update(
+        db=db, faq_id=faq_id, faq_in=faq_in, expected_version=expected_version
+    )
     if not faq:
         raise HTTPException(status_code=404, detail="FAQ 不存在")
+    response.headers["ETag"] = etag(faq.version)
     return faq
 
 
@@ -0,0 +1,57 @@
+"""API 共用的參數：列表的 multi-get（ids=）與欄位投影（fields=），以及更新的 If-Match"""
+
+from typing import List, Optional
+from fastapi import Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from app.services.projection import Projection
+
+# 一次 multi-get 最多的 ID 數（與列表的 limit 上限相同）
+MAX_IDS = 100
+
+
+def parse_ids(
+    ids: Optional[str] = Query(None, description="以逗號分隔的 ID，例如 1,2,3")
+) -> Optional[List[int]]:
+    """解析 `ids=` 參數"""
+    if not ids:
+        return None
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids 必須是以逗號分隔的整數")
+    if len(parsed) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"ids 最多 {MAX_IDS} 個")
+    return parsed or None
+
+
+def parse_fields(projection: Projection, fields: Optional[str]) -> Optional[List[str]]:
+    """解析 `fields=` 參數，欄位不存在時回傳 400"""
+    try:
+        return projection.parse(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def project(items, projection: Projection, fields: Optional[List[str]]):
+    """有指定 fields 時只回傳要求的欄位，否則交給 response_model 序列化"""
+    if not fields:
+        return items
+    return JSONResponse(projection.dump_many(items, fields))
+
+
+def parse_if_match(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    """
+    解析 `If-Match` 標頭，回傳預期的版本號
+
+    ETag 即資料的版本號（例如 "3"）；未指定或為 * 時回傳 None（不比對版本）
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match 必須是單一 ETag，例如 \"3\"")
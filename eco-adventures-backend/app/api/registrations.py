@@ -1,14 +1,22 @@
+from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.schemas.schemas import (
     Registration, RegistrationCreate, RegistrationUpdate,
-    RegistrationWithCourse, Message
+    RegistrationWithCourse, Message,
+    RegistrationBulkTarget, BulkResult
 )
 from app.services.registration_service import RegistrationService
+from app.services.export_service import RegistrationExportService
+from app.services.projection import registration_projection
 from app.models.models import RegistrationStatus
+from app.services.versioning import etag
+from app.api.params import parse_ids, parse_fields, project, parse_if_match
+from app.core.ratelimit import limit_registration_email
 
 router = APIRouter()
 
@@ -19,6 +27,8 @@ def get_registrations(
     limit: int = Query(100, ge=1, le=100),
     course_id: Optional[int] = None,
     status: Optional[RegistrationStatus] = None,
+    ids: Optional[List[int]] = Depends(parse_ids),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -28,17 +38,60 @@ def get_registrations(
     - **limit**: 限制回傳的項目數
     - **course_id**: 課程 ID 篩選（選填）
     - **status**: 報名狀態篩選（選填）
+    - **ids**: 只取指定的報名，以逗號分隔（選填）
+    - **fields**: 只回傳指定的欄位，以逗號分隔（選填）
     
     需要管理員權限（暫未實作權限驗證）
     """
+    selected = parse_fields(registration_projection, fields)
     registrations = RegistrationService.get_multi(
         db=db,
         skip=skip,
         limit=limit,
         course_id=course_id,
-        status=status
+        status=status,
+        ids=ids,
+        fields=selected
+    )
+    return project(registrations, registration_projection, selected)
+
+
+@router.get("/export")
+def export_registrations(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    course_id: Optional[int] = None,
+    status: Optional[RegistrationStatus] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+):
+    """
+    串流匯出報名名冊
+    
+    - **format**: csv 或 xlsx
+    - **course_id**: 課程 ID 篩選（選填）
+    - **status**: 報名狀態篩選（選填）
+    - **from** / **to**: 課程日期區間（選填，例如整個學期）
+    
+    需要管理員權限（暫未實作權限驗證）
+    """
+    if date_from and date_to and date_to < date_from:
+        raise HTTPException(status_code=400, detail="結束日期不可早於起始日期")
+    
+    stmt = RegistrationExportService.build_query(
+        course_id=course_id, status=status, date_from=date_from, date_to=date_to
+    )
+    filename = f"registrations-{course_id or 'all'}.{format}"
+    if format == "xlsx":
+        content = RegistrationExportService.stream_xlsx(stmt)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        content = RegistrationExportService.stream_csv(stmt)
+        media_type = "text/csv"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
-    return registrations
 
 
 @router.get("/by-email/{email}", response_model=List[RegistrationWithCourse])
@@ -58,20 +111,33 @@ def get_registrations_by_email(
 @router.get("/{registration_id}", response_model=Registration)
 def get_registration(
     registration_id: int,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
     取得單一報名記錄
     
     - **registration_id**: 報名 ID
+    
+    回應的 ETag 為報名記錄的版本號，更新時以 If-Match 帶回
     """
     registration = RegistrationService.get(db=db, registration_id=registration_id)
     if not registration:
         raise HTTPException(status_code=404, detail="報名記錄不存在")
+    response.headers["ETag"] = etag(registration.version)
     return registration
 
 
-@router.post("/", response_model=Registration, status_code=201)
+async def _limit_registration_email(registration_in: RegistrationCreate) -> None:
+    await limit_registration_email(registration_in.email)
+
+
+@router.post(
+    "/",
+    response_model=Registration,
+    status_code=201,
+    dependencies=[Depends(_limit_registration_email)]
+)
 def create_registration(
     registration_in: RegistrationCreate,
     db: Session = Depends(get_db)
@@ -82,6 +148,7 @@ def create_registration(
     - 會自動檢查課程名額
     - 如果名額已滿，會加入候補名單
     - 會檢查是否重複報名
+    - 同一個 email 的報名頻率有上限（超過時回傳 429）
     """
     # 檢查是否重複報名
     if RegistrationService.check_duplicate(
@@ -104,24 +171,72 @@ def create_registration(
     return registration
 
 
+@router.post("/bulk/cancel", response_model=BulkResult)
+def bulk_cancel_registrations(
+    bulk_in: RegistrationBulkTarget,
+    db: Session = Depends(get_db)
+):
+    """
+    整批取消報名（例如課程因天候停辦時取消該課程的所有報名）
+    
+    - **course_ids**: 取消這些課程的報名
+    - **registration_ids**: 取消這些報名
+    - **status**: 只取消此狀態的報名（選填）
+    
+    已取消的報名會被略過；釋放的名額依課程一次更新，全部在一個交易中完成。
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return RegistrationService.bulk_cancel(
+        db=db,
+        course_ids=bulk_in.course_ids,
+        registration_ids=bulk_in.registration_ids,
+        status=bulk_in.status
+    )
+
+
+@router.post("/bulk/delete", response_model=BulkResult)
+def bulk_delete_registrations(
+    bulk_in: RegistrationBulkTarget,
+    db: Session = Depends(get_db)
+):
+    """
+    整批刪除報名記錄
+    
+    條件與整批取消相同；已確認報名的名額會釋放，全部在一個交易中完成。
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return RegistrationService.bulk_delete(
+        db=db,
+        course_ids=bulk_in.course_ids,
+        registration_ids=bulk_in.registration_ids,
+        status=bulk_in.status
+    )
+
+
 @router.put("/{registration_id}", response_model=Registration)
 def update_registration(
     registration_id: int,
     registration_in: RegistrationUpdate,
+    response: Response,
+    expected_version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db)
 ):
     """
     更新報名記錄
     
+    - **If-Match**: 取得報名記錄時的 ETag（選填），記錄已被修改時回傳 412
+    
     需要管理員權限（暫未實作權限驗證）
     """
     registration = RegistrationService.update(
         db=db,
         registration_id=registration_id,
-        registration_in=registration_in
+        registration_in=registration_in,
+        expected_version=expected_version
     )
     if not registration:
         raise HTTPException(status_code=404, detail="報名記錄不存在")
+    response.headers["ETag"] = etag(registration.version)
     return registration
 
 
@@ -0,0 +1,35 @@
+from typing import List, Optional
+from fastapi import APIRouter, Query
+
+from app.schemas.schemas import SearchSuggestion
+from app.services.search_index import suggestion_index, KIND_LOCATION
+
+router = APIRouter()
+
+
+@router.get("/suggest", response_model=List[SearchSuggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    types: Optional[str] = None
+):
+    """
+    搜尋框自動完成建議
+
+    - **q**: 使用者目前輸入的字串（可含尚未選字的注音）
+    - **limit**: 回傳筆數上限（預設 10）
+    - **types**: 以逗號分隔的類型篩選：course, location, instructor, faq（選填）
+
+    直接查詢記憶體索引，不會存取資料庫
+    """
+    kinds = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    results = suggestion_index.suggest(q, limit=limit, kinds=kinds)
+    return [
+        SearchSuggestion(
+            type=doc.kind,
+            id=None if doc.kind == KIND_LOCATION else doc.ident,
+            text=doc.text,
+            popularity=doc.popularity,
+        )
+        for doc in results
+    ]
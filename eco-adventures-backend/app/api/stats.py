@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.schemas.schemas import Dashboard
+from app.services.stats_service import StatsService
+
+router = APIRouter()
+
+
+@router.get("/dashboard", response_model=Dashboard)
+def get_dashboard(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_db)
+):
+    """
+    取得管理後台儀表板統計
+    
+    - **days**: 每日報名統計要涵蓋的天數（預設 30）
+    
+    資料來自增量維護的統計表，不會即時執行 count()
+    
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return StatsService.get_dashboard(db=db, days=days)
@@ -0,0 +1,216 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db import partitions
+from app.db.database import get_db
+from app.models.models import Registration
+from app.services.scheduler import lifecycle_scheduler
+from app.services.reconcile_service import ReconcileService
+from app.services.archive_service import ArchiveService
+from app.services.notification_service import NotificationService, notification_worker
+from app.services.outbox import OutboxService, outbox_dispatcher
+from app.services.home_service import home_snapshot
+from app.services.facet_service import course_facets
+from app.services.image_service import image_service
+from app.core.ratelimit import rate_limiter
+from app.services.cache_sync import cache_sync
+from app.services.seat_stream import seat_broadcaster
+from app.services.change_feed import ChangeFeedService, change_watcher
+from app.services.catalog_publisher import catalog_publisher
+
+router = APIRouter()
+
+
+@router.get("/scheduler")
+def get_scheduler_status():
+    """
+    取得課程狀態排程器的狀態
+    
+    - **is_leader**: 此 worker 是否為執行排程的領導者
+    - **last_run_at**: 上次套用狀態轉換的時間
+    - **last_lag_seconds**: 上次執行時距離到期時間的延遲秒數
+    - **next_due_at**: 下一個到期的狀態轉換時間
+    """
+    return lifecycle_scheduler.status()
+
+
+@router.post("/reconcile-seats")
+def reconcile_seats(
+    fix: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    """
+    核對所有課程的報名人數與額滿狀態
+    
+    - **fix**: 是否修正差異（預設只回報）
+    
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return ReconcileService.reconcile(db=db, fix=fix)
+
+
+@router.post("/archive")
+def archive_courses(
+    older_than_days: Optional[int] = Query(None, ge=0),
+    dry_run: bool = Query(True),
+    db: Session = Depends(get_db)
+):
+    """
+    將已結束或已取消的舊課程與其報名搬到封存表
+    
+    - **older_than_days**: 課程日期早於今天減去此天數才封存（預設 ARCHIVE_AFTER_DAYS）
+    - **dry_run**: 只計算會封存的課程與報名數（預設 true）
+    
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return ArchiveService.archive(db=db, older_than_days=older_than_days, dry_run=dry_run)
+
+
+@router.get("/notifications")
+def get_notification_status(db: Session = Depends(get_db)):
+    """
+    取得通知信件佇列狀態
+    
+    - **queue**: 各狀態的信件數
+    - **worker**: 此 worker 的寄送統計
+    """
+    return {
+        "queue": NotificationService.get_queue_stats(db),
+        "worker": notification_worker.status(),
+    }
+
+
+@router.get("/outbox")
+def get_outbox_status(db: Session = Depends(get_db)):
+    """
+    取得 outbox 事件分派狀態
+    
+    - **consumers**: 各訂閱者的檢查點、未處理事件數與延遲秒數
+    - **dispatcher**: 此 worker 的分派統計
+    """
+    return {
+        **OutboxService.get_status(db),
+        "dispatcher": outbox_dispatcher.status(),
+    }
+
+
+@router.get("/home-snapshot")
+def get_home_snapshot_status():
+    """
+    取得首頁資料快照狀態
+    
+    - **cached**: 目前是否有有效的快照
+    - **age_seconds** / **size** / **encoded_sizes**: 快照的建立時間、原始與各壓縮版本的大小
+    - **building**: 目前是否有執行緒正在重建（同一時間只有一個）
+    - **builds**: 此 worker 重建快照的次數
+    - **stale_served**: 重建期間改回傳過期快照的次數
+    """
+    return home_snapshot.status()
+
+
+@router.get("/facets")
+def get_facet_cache_status():
+    """
+    取得課程篩選計數快取狀態
+    
+    - **entries**: 目前快取的篩選條件組合數
+    - **hits** / **misses**: 此 worker 的快取命中與重新計算次數
+    """
+    return course_facets.status()
+
+
+@router.get("/images")
+def get_image_cache_status():
+    """
+    取得縮圖快取狀態
+    
+    - **formats**: 此伺服器可輸出的格式
+    - **cache_bytes**: 磁碟快取大小（此 worker 尚未產生過縮圖時為 null）
+    - **hits** / **renders** / **evictions**: 此 worker 的快取命中、產生與淘汰次數
+    """
+    return image_service.status()
+
+
+@router.get("/rate-limits")
+def get_rate_limit_status():
+    """
+    取得寫入 API 速率限制狀態
+    
+    - **allowed** / **limited**: 此 worker 各限制範圍允許與拒絕（429）的請求數
+    - **rejected_busy**: 因同時寫入請求過多而拒絕（503）的請求數
+    - **writes_in_flight**: 目前處理中的寫入請求數
+    """
+    return rate_limiter.status()
+
+
+@router.get("/cache-sync")
+def get_cache_sync_status():
+    """
+    取得此 worker 的快取同步狀態
+    
+    - **origin**: 此 worker 的識別碼
+    - **channels**: 已訂閱的頻道
+    - **last_id** / **received** / **last_poll_at**: 已讀到的通知 ID、收到的通知數與上次輪詢時間
+    """
+    return cache_sync.status()
+
+
+@router.get("/seat-stream")
+def get_seat_stream_status():
+    """
+    取得此 worker 的名額推播狀態
+    
+    - **subscribers** / **catalog_subscribers** / **watched_courses**: 連線數、訂閱整個目錄的連線數與被訂閱的課程數
+    - **batches** / **delivered** / **last_batch_at**: 合併後的推送批次、送到連線的次數與上次推送時間
+    """
+    return seat_broadcaster.status()
+
+
+@router.get("/changes")
+def get_change_feed_status(db: Session = Depends(get_db)):
+    """
+    取得增量同步異動紀錄的狀態
+    
+    - **head** / **horizon**: 最新的異動序號與已清除的 tombstone 序號（同步位置更早的用戶端需重新同步）
+    - **entries** / **tombstones**: 異動紀錄與其中 tombstone 的筆數
+    - **watcher**: 此 worker 等待中的長輪詢請求數與喚醒次數
+    """
+    return {
+        **ChangeFeedService.get_status(db),
+        "watcher": change_watcher.status(),
+    }
+
+
+@router.post("/compact-changes")
+def compact_changes(db: Session = Depends(get_db)):
+    """
+    壓縮增量同步的異動紀錄（刪除被取代的紀錄與過期的 tombstone）
+    
+    需要管理員權限（暫未實作權限驗證）
+    """
+    return ChangeFeedService.compact(db)
+
+
+@router.get("/catalog")
+def get_catalog_publisher_status():
+    """
+    取得公開目錄靜態快照的發布狀態
+    
+    - **enabled** / **directory**: 是否設定 CATALOG_PUBLISH_DIR 與輸出目錄
+    - **published_seq** / **published_version**: 已發布的異動序號與此 worker 上次發布的版本
+    - **last_published_at** / **last_duration_seconds** / **publishes**: 此 worker 的發布時間、耗時與次數
+    """
+    return catalog_publisher.status()
+
+
+@router.get("/partitions")
+def get_partition_status(db: Session = Depends(get_db)):
+    """
+    取得報名資料表的分割狀態
+    
+    - **partitioned**: 是否為分割表（只有 PostgreSQL 支援，SQLite 為 false）
+    - **partitions**: 各分割的名稱、月份、範圍與估計筆數
+    """
+    return partitions.status(db.connection(), Registration.__table__)
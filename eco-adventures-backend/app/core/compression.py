@@ -0,0 +1,127 @@
+"""
+回應壓縮
+
+依 Accept-Encoding 協商 brotli 或 gzip。一般回應由 CompressionMiddleware 在執行緒中壓縮
+（不佔用事件迴圈）；快取的回應（例如首頁快照）在建立時以 compress_variants() 預先壓縮，
+之後每個請求只需挑選對應的版本。
+"""
+
+import gzip
+from typing import Dict, Iterable, Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時只提供 gzip
+    brotli = None
+
+# 同品質時的偏好順序
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+# 值得壓縮的內容類型
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def compress(body: bytes, encoding: str, precompressed: bool = False) -> bytes:
+    """以指定編碼壓縮（預先壓縮的內容只做一次，使用較高的壓縮等級）"""
+    if encoding == "br":
+        quality = 11 if precompressed else settings.COMPRESSION_BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    level = 9 if precompressed else settings.COMPRESSION_GZIP_LEVEL
+    return gzip.compress(body, compresslevel=level)
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """預先產生所有支援編碼的壓縮版本（小於門檻的內容不壓縮）"""
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return {}
+    return {encoding: compress(body, encoding, precompressed=True) for encoding in SUPPORTED_ENCODINGS}
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """
+    依 Accept-Encoding（含 q 值）選擇編碼，沒有可用的編碼時回傳 None
+    """
+    if not accept_encoding:
+        return None
+    available = list(available)
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    壓縮一般（非串流）回應
+
+    已帶 Content-Encoding 的回應（預先壓縮的快取內容）、串流回應、
+    小於門檻或不適合壓縮的內容類型直接放行。
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not headers.get("content-type", "").startswith(_COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -37,11 +37,115 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: Optional[str] = None
     EMAILS_FROM_EMAIL: Optional[str] = None
     EMAILS_FROM_NAME: Optional[str] = None
+    EMAIL_BACKEND: str = "smtp"  # smtp：寄到 SMTP_HOST；memory：只保存在記憶體（開發、測試用）
+    EMAIL_WORKERS: int = 2  # 背景寄信 worker 數，0 表示不寄送（信件仍會排入佇列）
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: int = 30  # 重試間隔為 base * 2^(attempts-1)
+    EMAIL_POLL_SECONDS: int = 10
+    
+    # Outbox 事件分派
+    OUTBOX_BATCH_SIZE: int = 200
+    OUTBOX_POLL_SECONDS: int = 5  # 未被喚醒時的最長等待時間（其他 worker 寫入的事件）
+    OUTBOX_SETTLE_SECONDS: int = 5  # 事件 ID 出現空缺時，等待較早交易提交的時間
+    OUTBOX_GAP_TIMEOUT_SECONDS: int = 600  # 越過空缺後持續檢查較晚提交的事件的時間，之後視為已 rollback
+    OUTBOX_RETENTION_HOURS: int = 72  # 所有訂閱者都處理過的事件保留時間
     
     # 管理員設定
     FIRST_SUPERUSER_EMAIL: Optional[str] = None
     FIRST_SUPERUSER_PASSWORD: Optional[str] = None
     
+    # 時區（課程日期與時間皆為此時區的當地時間）
+    TIMEZONE: str = "Asia/Taipei"
+    
+    # 課程狀態排程設定
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_LOCK_TTL_SECONDS: int = 60  # 領導者鎖的有效秒數
+    SCHEDULER_MAX_SLEEP_SECONDS: int = 300  # 兩次檢查之間最長休眠秒數
+    
+    # 名額核對（0 表示不定期執行，只能手動執行）
+    SEAT_RECONCILE_INTERVAL_SECONDS: int = 0
+    SEAT_RECONCILE_FIX: bool = True  # 定期執行時是否自動修正
+    
+    # 首頁資料快照（寫入時即失效；其他 worker 的寫入最晚在此秒數後反映）
+    HOME_SNAPSHOT_TTL_SECONDS: int = 60
+    
+    # 課程篩選計數（/courses/facets）快取：寫入時即失效，依篩選條件各保存一份
+    FACETS_CACHE_TTL_SECONDS: int = 60
+    FACETS_CACHE_MAX_ENTRIES: int = 256
+    FACETS_LOCATION_LIMIT: int = 20  # 地點只回傳課程數最多的前幾個
+    
+    # 名額即時推播（/courses/seats/stream）
+    SEAT_STREAM_COALESCE_SECONDS: float = 0.5  # 合併此期間內的異動後再查詢與推送
+    SEAT_STREAM_KEEPALIVE_SECONDS: int = 15
+    SEAT_STREAM_RETRY_MILLISECONDS: int = 3000  # 斷線後用戶端重新連線的等待時間
+    SEAT_STREAM_MAX_SUBSCRIBERS: int = 10000  # 每個 worker 的連線數上限
+    
+    # 增量同步（/changes）
+    CHANGES_PAGE_SIZE: int = 500  # 每次回傳的異動紀錄數預設值
+    CHANGES_LONG_POLL_MAX_SECONDS: int = 30  # wait 參數的上限
+    CHANGES_POLL_SECONDS: float = 1.0  # 長輪詢期間檢查其他 worker 寫入的間隔
+    CHANGES_SETTLE_SECONDS: int = 5  # 序號出現空缺時，等待較早交易提交的時間
+    CHANGES_COMPACT_AFTER_SECONDS: int = 300  # 被較新紀錄取代超過此秒數的紀錄才刪除
+    CHANGES_TOMBSTONE_RETENTION_DAYS: int = 30  # 刪除紀錄的保留天數，同步位置更早的用戶端需重新同步
+    CHANGES_COMPACT_INTERVAL_SECONDS: int = 600  # 排程器壓縮異動紀錄的間隔，0 表示只能手動執行
+    
+    # 公開目錄的靜態快照（由 nginx 或 CDN 直接提供）
+    CATALOG_PUBLISH_DIR: Optional[str] = None  # 輸出目錄，未設定時不發布
+    CATALOG_PUBLISH_DEBOUNCE_SECONDS: float = 2.0  # 此期間內沒有新異動才發布（也是檢查異動的間隔）
+    CATALOG_PUBLISH_MAX_DELAY_SECONDS: int = 30  # 持續有異動時最長的發布間隔
+    CATALOG_PUBLISH_KEEP_VERSIONS: int = 5  # 保留的版本數
+    
+    # 回應壓縮（brotli 需另外安裝 brotli 套件，未安裝時只使用 gzip）
+    COMPRESSION_MIN_SIZE: int = 1024  # 小於此位元組數的回應不壓縮
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    
+    # 圖片縮圖（需安裝 Pillow；未安裝時圖片端點直接回傳原圖）
+    IMAGE_SOURCE_DIR: str = "../eco-adventures-hub-main/public"  # image_url 對應的根目錄
+    IMAGE_CACHE_DIR: str = "./image_cache"
+    IMAGE_CACHE_MAX_MB: int = 512  # 超過時淘汰最久未使用的縮圖
+    IMAGE_WORKERS: int = 2  # 產生縮圖的子程序數
+    IMAGE_WIDTHS: List[int] = [320, 640, 960, 1280]
+    IMAGE_BASE_URL: str = ""  # srcset 網址的前綴（前端與 API 不同網域時設為 API 的網址）
+    
+    # 寫入 API 的速率限制
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_WRITES_PER_MINUTE: int = 60  # 每個 IP 的寫入請求
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_REGISTRATIONS_PER_HOUR: int = 10  # 每個 email 的報名請求
+    RATE_LIMIT_REGISTRATION_BURST: int = 5
+    RATE_LIMIT_MAX_CONCURRENT_WRITES: int = 0  # 每個 worker 同時處理的寫入請求上限，0 表示不限制
+    RATE_LIMIT_STORAGE_URL: Optional[str] = None  # redis://…，多個 worker 共用限制（需安裝 redis）
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # 位於反向代理之後時以 X-Forwarded-For 判斷 IP
+    
+    # 伺服器（python -m app.serve）
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 1  # worker 程序數，0 表示依 CPU 核心數
+    WEB_PRELOAD: bool = True  # 在 fork 前載入應用程式，worker 以 copy-on-write 共用記憶體
+    WEB_TIMEOUT_SECONDS: int = 60
+    
+    # 多個 worker 之間的程序內快取同步
+    CACHE_SYNC_ENABLED: bool = True
+    CACHE_SYNC_POLL_SECONDS: float = 1.0
+    CACHE_SYNC_SETTLE_SECONDS: int = 10  # 重新檢查此秒數內的通知，避免遺漏較晚提交的交易
+    CACHE_SYNC_RETENTION_MINUTES: int = 60
+    
+    # 已結束課程的封存（搬到 courses_archive / registrations_archive）
+    ARCHIVE_AFTER_DAYS: int = 365  # 結束或取消超過此天數的課程才封存
+    ARCHIVE_BATCH_SIZE: int = 200  # 每個交易搬移的課程數
+    ARCHIVE_BATCH_PAUSE_SECONDS: float = 0.2  # 批次之間的停頓，讓線上寫入取得鎖
+    ARCHIVE_INTERVAL_SECONDS: int = 86400  # 排程定期封存的間隔，0 表示只能手動執行
+    
+    # PostgreSQL 分割表（目前為 registrations，依建立時間每月分割；SQLite 不適用）
+    PARTITION_MONTHS_AHEAD: int = 3  # 預先建立未來幾個月的分割
+    PARTITION_RETENTION_MONTHS: int = 0  # 刪除早於此月數的空分割，0 表示全部保留
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 86400  # 排程器維護分割的間隔
+    
+    # 樂觀並行控制：沒有 If-Match 的更新遇到其他寫入時，重新讀取並重試的次數
+    VERSION_CONFLICT_RETRIES: int = 3
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
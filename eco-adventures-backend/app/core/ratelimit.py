@@ -0,0 +1,260 @@
+"""
+寫入 API 的速率限制與准入控制
+
+以 token bucket 依用戶端 IP（所有 POST/PUT/PATCH/DELETE）與 email（建立報名）限制請求頻率，
+超過時在開啟任何資料庫 session 之前回傳 429 與 Retry-After。預設計數保存在各 worker
+的記憶體中；設定 RATE_LIMIT_STORAGE_URL（redis://…）時改用 Redis，限制在多個 worker 間共用。
+另可限制同時處理中的寫入請求數，超過時回傳 503。
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # 未安裝 redis 時只能使用記憶體計數
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# 限制範圍
+SCOPE_WRITE_IP = "write_ip"
+SCOPE_REGISTRATION_EMAIL = "registration_email"
+
+
+@dataclass(frozen=True)
+class Limit:
+    """token bucket 參數：每秒補充 rate 個，最多累積 burst 個"""
+    rate: float
+    burst: int
+
+    @classmethod
+    def per_minute(cls, count: int, burst: int) -> "Limit":
+        return cls(rate=count / 60.0, burst=burst)
+
+    @classmethod
+    def per_hour(cls, count: int, burst: int) -> "Limit":
+        return cls(rate=count / 3600.0, burst=burst)
+
+
+class MemoryStore:
+    """單一 worker 內的 token bucket"""
+
+    # 超過此數量的鍵時清除已補滿（閒置）的 bucket
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 鍵 -> (剩餘 token, 更新時間, 補滿時間)；IP 與 email 的限制共用同一個 store，
+        # 補滿時間依各 bucket 自己的限制計算
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        """取得一個 token，成功回傳 0，否則回傳需等待的秒數"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (limit.burst, now, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float) -> None:
+        """清除已補滿的 bucket（之後再取用時與新的 bucket 相同）"""
+        self._buckets = {
+            k: v for k, v in self._buckets.items() if v[2] > now
+        }
+
+
+# 在 Redis 中以單一腳本原子地補充並取用 token
+_REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisStore:
+    """以 Redis 共用的 token bucket（所有 worker 共用同一組限制）"""
+
+    def __init__(self, url: str):
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+        self._fallback = MemoryStore()
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        try:
+            wait = await self._script(
+                keys=[f"ratelimit:{key}"], args=[limit.rate, limit.burst, time.time()]
+            )
+            return float(wait)
+        except Exception:
+            # Redis 無法使用時退回單一 worker 的限制，不讓寫入整個停擺
+            logger.warning("速率限制無法連線 Redis，暫時改用記憶體計數", exc_info=True)
+            return await self._fallback.acquire(key, limit)
+
+
+class RateLimiter:
+    """速率限制器（含監控用的計數）"""
+
+    def __init__(self):
+        self._store = None
+        self.allowed: Dict[str, int] = defaultdict(int)
+        self.limited: Dict[str, int] = defaultdict(int)
+        self.rejected_busy = 0
+
+    @property
+    def store(self):
+        if self._store is None:
+            url = settings.RATE_LIMIT_STORAGE_URL
+            if url and aioredis is not None:
+                self._store = RedisStore(url)
+            else:
+                if url:
+                    logger.warning("未安裝 redis 套件，速率限制改用記憶體計數")
+                self._store = MemoryStore()
+        return self._store
+
+    async def hit(self, scope: str, key: str, limit: Limit) -> float:
+        """記錄一次請求，允許時回傳 0，否則回傳 Retry-After 秒數"""
+        wait = await self.store.acquire(f"{scope}:{key}", limit)
+        if wait > 0:
+            self.limited[scope] += 1
+        else:
+            self.allowed[scope] += 1
+        return wait
+
+    def status(self) -> dict:
+        """計數（供監控使用）"""
+        return {
+            "enabled": settings.RATE_LIMIT_ENABLED,
+            "backend": type(self.store).__name__,
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+            "rejected_busy": self.rejected_busy,
+            "writes_in_flight": write_admission.in_flight,
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+def client_ip(scope: Scope) -> str:
+    """用戶端 IP（設定信任代理時取 X-Forwarded-For 的第一個位址）"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _too_many(wait: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
+
+
+class WriteAdmission:
+    """同時處理中的寫入請求數上限（0 表示不限制）"""
+
+    def __init__(self):
+        self.in_flight = 0
+
+    def try_enter(self) -> bool:
+        limit = settings.RATE_LIMIT_MAX_CONCURRENT_WRITES
+        if limit and self.in_flight >= limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self) -> None:
+        self.in_flight -= 1
+
+
+write_admission = WriteAdmission()
+
+
+class WriteRateLimitMiddleware:
+    """
+    寫入請求的速率限制與准入控制
+
+    在路由與相依項目（包含資料庫 session）之前執行，被拒絕的請求不會碰到資料庫
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in WRITE_METHODS
+            or not settings.RATE_LIMIT_ENABLED
+            or not scope["path"].startswith(settings.API_V1_STR)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limit = Limit.per_minute(settings.RATE_LIMIT_WRITES_PER_MINUTE, settings.RATE_LIMIT_WRITE_BURST)
+        wait = await rate_limiter.hit(SCOPE_WRITE_IP, client_ip(scope), limit)
+        if wait > 0:
+            response = JSONResponse(
+                {"detail": "請求過於頻繁，請稍後再試"}, status_code=429, headers=_too_many(wait)
+            )
+            await response(scope, receive, send)
+            return
+
+        if not write_admission.try_enter():
+            rate_limiter.rejected_busy += 1
+            response = JSONResponse(
+                {"detail": "系統忙碌中，請稍後再試"}, status_code=503, headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            write_admission.leave()
+
+
+async def limit_registration_email(email: str) -> None:
+    """同一個 email 的報名頻率限制（在路由的相依項目中、資料庫 session 之前呼叫）"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    limit = Limit.per_hour(settings.RATE_LIMIT_REGISTRATIONS_PER_HOUR, settings.RATE_LIMIT_REGISTRATION_BURST)
+    wait = await rate_limiter.hit(SCOPE_REGISTRATION_EMAIL, email.strip().lower(), limit)
+    if wait > 0:
+        raise HTTPException(
+            status_code=429, detail="此信箱報名次數過多，請稍後再試", headers=_too_many(wait)
+        )
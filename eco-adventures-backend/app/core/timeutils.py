@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+
+try:
+    from zoneinfo import ZoneInfo
+    _tz = ZoneInfo(settings.TIMEZONE)
+except Exception:  # 系統缺少 tzdata 時退回固定的 UTC+8
+    _tz = timezone(timedelta(hours=8))
+
+
+def local_now() -> datetime:
+    """取得設定時區的目前時間（不含時區資訊，與資料庫中的日期時間欄位一致）"""
+    return datetime.now(_tz).replace(tzinfo=None)
+
+
+def to_local(value: datetime) -> datetime:
+    """將資料庫中的 UTC 日期時間（不含時區資訊）轉為設定時區的時間（同樣不含時區資訊）"""
+    return value.replace(tzinfo=timezone.utc).astimezone(_tz).replace(tzinfo=None)
@@ -0,0 +1,46 @@
+"""
+封存已結束的舊課程與其報名記錄
+執行方式: python -m app.db.archive_courses [--days N] [--batch-size N] [--dry-run]
+"""
+
+import argparse
+
+from app.db.database import SessionLocal, engine, Base
+from app.services.archive_service import ArchiveService
+
+# 建立資料庫表格
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="封存已結束的舊課程")
+    parser.add_argument("--days", type=int, default=None, help="課程日期早於今天減去此天數才封存（預設 ARCHIVE_AFTER_DAYS）")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批搬移的課程數（預設 ARCHIVE_BATCH_SIZE）")
+    parser.add_argument("--dry-run", action="store_true", help="只計算數量，不搬移")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = ArchiveService.archive(
+            db, older_than_days=args.days, batch_size=args.batch_size, dry_run=args.dry_run
+        )
+        if args.dry_run:
+            print(
+                f"課程日期早於 {result['cutoff']} 的課程：{result['courses']} 門、"
+                f"報名 {result['registrations']} 筆，移除 --dry-run 參數即可封存"
+            )
+        else:
+            print(
+                f"✓ 已封存 {result['courses']} 門課程、{result['registrations']} 筆報名"
+                f"（{result['batches']} 批，課程日期早於 {result['cutoff']}）"
+            )
+    except Exception as e:
+        print(f"✗ 封存失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
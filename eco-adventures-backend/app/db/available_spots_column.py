@@ -0,0 +1,44 @@
+"""
+為既有資料庫的課程資料表新增剩餘名額欄位（courses.available_spots）與索引
+執行方式: python -m app.db.available_spots_column
+
+新建立的資料庫已包含，不需要執行。PostgreSQL 新增儲存的計算欄位會重寫整個資料表，
+請在離峰時段執行；SQLite 無法為既有資料表新增儲存的計算欄位，改為虛擬（VIRTUAL）計算欄位，
+查詢與索引的行為相同。
+"""
+
+from sqlalchemy import inspect, text
+
+from app.db.database import engine
+from app.models.models import Course
+
+
+def main():
+    """主函數"""
+    table = Course.__table__
+    column = table.c.available_spots
+    expression = column.computed.sqltext.text
+    storage = "STORED" if engine.dialect.name == "postgresql" else "VIRTUAL"
+
+    done = []
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            if column.name not in {c["name"] for c in inspector.get_columns(table.name)}:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} INTEGER "
+                    f"GENERATED ALWAYS AS ({expression}) {storage}"
+                ))
+                done.append(f"新增剩餘名額欄位（{storage}）")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.columns.contains_column(column) and index.name not in indexes:
+                    index.create(conn)
+                    done.append(f"建立索引 {index.name}")
+    except Exception as e:
+        print(f"✗ 更新失敗（已回復）: {e}")
+        return
+    print(f"✓ 已{'、'.join(done)}" if done else "✓ 剩餘名額欄位與索引已存在")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from typing import Dict, Type
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+
+
+def increment_row(
+    db: Session,
+    model: Type[Base],
+    keys: Dict[str, object],
+    deltas: Dict[str, int]
+) -> None:
+    """
+    以原子的 `col = col + delta` 更新計數列，不存在時建立
+
+    不會 commit，與呼叫端的資料異動在同一個交易內完成；
+    不會先讀取再寫回，因此並行的交易不會互相覆蓋計數。
+    """
+    deltas = {col: delta for col, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    stmt = update(model).where(
+        *[getattr(model, col) == value for col, value in keys.items()]
+    ).values(
+        {col: getattr(model, col) + delta for col, delta in deltas.items()}
+    ).execution_options(synchronize_session=False)
+
+    if db.execute(stmt).rowcount:
+        return
+
+    # 計數列尚不存在：在 savepoint 中建立，若其他交易搶先建立則改回更新
+    try:
+        with db.begin_nested():
+            db.add(model(**keys, **deltas))
+    except IntegrityError:
+        db.execute(stmt)
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -16,6 +16,13 @@ if DATABASE_URL.startswith('sqlite'):
         connect_args={"check_same_thread": False},  # SQLite 需要
         echo=settings.DEBUG
     )
+
+    @event.listens_for(engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        # SQLite 預設不檢查外鍵，需開啟才會執行 ON DELETE CASCADE / SET NULL
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 else:
     engine = create_engine(
         DATABASE_URL,
@@ -35,8 +42,11 @@ def get_db():
     """
     FastAPI 依賴注入函數
     用於在 API endpoint 中取得資料庫 session
+    
+    commit 後不讓物件過期：寫入路徑以 INSERT／UPDATE … RETURNING 取回新值，
+    回應直接由記憶體中的物件序列化，不會在 commit 後再查詢一次
     """
-    db = SessionLocal()
+    db = SessionLocal(expire_on_commit=False)
     try:
         yield db
     finally:
@@ -0,0 +1,63 @@
+"""
+為既有 PostgreSQL 資料庫的外鍵加上刪除動作
+執行方式: python -m app.db.foreign_key_actions
+
+新建立的資料庫已帶有 ON DELETE CASCADE（報名 → 課程）與 ON DELETE SET NULL（課程 → 講師），
+不需要執行。舊的外鍵沒有刪除動作時，刪除有報名的課程會違反外鍵限制。
+SQLite 無法修改既有的外鍵，請重新建立資料庫。
+"""
+
+from sqlalchemy import inspect, text
+
+from app.db.database import engine
+from app.models.models import Course, Registration
+
+
+def _with_actions(conn):
+    """重新建立缺少刪除動作的外鍵，回傳處理的限制名稱"""
+    changed = []
+    inspector = inspect(conn)
+    for model in (Registration, Course):
+        table = model.__table__
+        existing = {fk["name"]: fk for fk in inspector.get_foreign_keys(table.name)}
+        for constraint in table.foreign_key_constraints:
+            if not constraint.ondelete:
+                continue
+            columns = [column.name for column in constraint.columns]
+            target = constraint.referred_table.name
+            for name, fk in existing.items():
+                if fk["constrained_columns"] != columns or fk["referred_table"] != target:
+                    continue
+                if (fk.get("options") or {}).get("ondelete", "").upper() == constraint.ondelete.upper():
+                    continue
+                quote = conn.dialect.identifier_preparer.quote
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(name)}"))
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD CONSTRAINT {quote(name)} "
+                    f"FOREIGN KEY ({', '.join(quote(c) for c in columns)}) "
+                    f"REFERENCES {quote(target)} (id) ON DELETE {constraint.ondelete}"
+                ))
+                changed.append(name)
+    return changed
+
+
+def main():
+    """主函數"""
+    if engine.dialect.name != "postgresql":
+        print("✗ 只支援 PostgreSQL；SQLite 請重新建立資料庫")
+        return
+
+    try:
+        with engine.begin() as conn:
+            changed = _with_actions(conn)
+    except Exception as e:
+        print(f"✗ 更新失敗（已回復）: {e}")
+        return
+    if changed:
+        print(f"✓ 已更新外鍵：{', '.join(changed)}")
+    else:
+        print("✓ 外鍵已帶有刪除動作")
+
+
+if __name__ == "__main__":
+    main()
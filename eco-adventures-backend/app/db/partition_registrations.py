@@ -0,0 +1,39 @@
+"""
+將既有 PostgreSQL 資料庫的報名資料表轉為每月分割表
+執行方式: python -m app.db.partition_registrations [--keep-old]
+
+新建立的資料庫會直接以分割表建立，不需要執行；轉換期間報名資料表會被鎖定，請在離峰時段執行。
+"""
+
+import argparse
+
+from app.db import partitions
+from app.db.database import engine
+from app.models.models import Registration
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="將報名資料表轉為每月分割表")
+    parser.add_argument("--keep-old", action="store_true", help="保留原本的資料表（registrations_unpartitioned）")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("✗ 只有 PostgreSQL 支援分割表")
+        return
+
+    table = Registration.__table__
+    try:
+        with engine.begin() as conn:
+            if partitions.is_partitioned(conn, table):
+                print("✓ 報名資料表已經是分割表")
+                return
+            moved = partitions.convert_to_partitioned(conn, table, keep_old=args.keep_old)
+            names = [p["name"] for p in partitions.list_partitions(conn, table)]
+        print(f"✓ 已搬移 {moved} 筆報名到 {len(names)} 個分割")
+    except Exception as e:
+        print(f"✗ 轉換失敗（已回復）: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+PostgreSQL 的每月區間分割表
+
+在模型的 __table_args__ 最後加上 monthly_partitions("created_at")，資料表在 PostgreSQL 上會以
+PARTITION BY RANGE 建立：每月一個分割（<資料表>_pYYYYMM），另有一個 default 分割承接
+超出範圍的資料。PostgreSQL 要求主鍵包含分割鍵，建立資料表時會自動加上；ORM 仍以原本的主鍵
+識別資料列。
+
+- ensure_partitions()：建立到未來 PARTITION_MONTHS_AHEAD 個月的分割（排程器定期執行）
+- drop_expired()：卸離並刪除超過 PARTITION_RETENTION_MONTHS 個月的空分割
+- convert_to_partitioned()：將既有的一般資料表轉為分割表（python -m app.db.partition_registrations）
+
+SQLite 沒有分割表：資料表照常建立，上述函式都不做任何事，服務層的 API 不變。
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import PrimaryKeyConstraint, Table, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUFFIX = "_default"
+
+# (資料庫網址, 資料表名稱) -> 是否為分割表
+_partitioned: Dict[Tuple[str, str], bool] = {}
+
+
+def monthly_partitions(column: str) -> dict:
+    """__table_args__ 的資料表選項：在 PostgreSQL 上依 column 每月分割"""
+    return {
+        "postgresql_partition_by": f"RANGE ({column})",
+        "info": {"partition_key": column},
+    }
+
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    years, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + years, month + 1, 1)
+
+
+def partition_name(table: Table, month: date) -> str:
+    return f"{table.name}_p{month:%Y%m}"
+
+
+def _partition_month(table: Table, name: str) -> Optional[date]:
+    """由分割名稱取得月份（default 分割回傳 None）"""
+    suffix = name[len(table.name) + 2:] if name.startswith(f"{table.name}_p") else ""
+    if len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def _quote(conn: Connection, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _primary_key_with_partition_key(constraint, compiler, **kw):
+    # PostgreSQL 的分割表上，主鍵與唯一限制都必須包含分割鍵
+    key = constraint.table.info.get("partition_key")
+    if not key or key in constraint.columns.keys():
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [*constraint.columns.keys(), key]
+    prefix = ""
+    if constraint.name is not None:
+        prefix = f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} "
+    return prefix + "PRIMARY KEY (%s)" % ", ".join(compiler.preparer.quote(c) for c in columns)
+
+
+# ---------- 查詢 ----------
+
+def is_partitioned(conn: Connection, table: Table) -> bool:
+    """資料表在這個資料庫中是否為分割表（結果會快取）"""
+    if conn.dialect.name != "postgresql" or "partition_key" not in table.info:
+        return False
+    key = (str(conn.engine.url), table.name)
+    if key not in _partitioned:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+            {"name": table.name}
+        ).scalar()
+        _partitioned[key] = relkind == "p"
+    return _partitioned[key]
+
+
+def list_partitions(conn: Connection, table: Table) -> List[dict]:
+    """列出資料表的分割（名稱、月份、範圍與估計筆數）"""
+    if not is_partitioned(conn, table):
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": table.name}).all()
+    return [
+        {
+            "name": name,
+            "month": _partition_month(table, name),
+            "bound": bound,
+            "estimated_rows": max(int(tuples), 0),
+        }
+        for name, bound, tuples in rows
+    ]
+
+
+def status(conn: Connection, table: Table) -> dict:
+    """分割狀態（供監控使用）"""
+    return {
+        "dialect": conn.dialect.name,
+        "table": table.name,
+        "partitioned": is_partitioned(conn, table),
+        "partition_key": table.info.get("partition_key"),
+        "partitions": list_partitions(conn, table),
+    }
+
+
+# ---------- 維護 ----------
+
+def _create_month(conn: Connection, table: Table, name: str, month: date) -> None:
+    key = _quote(conn, table.info["partition_key"])
+    parent, partition = _quote(conn, table.name), _quote(conn, name)
+    default = _quote(conn, table.name + DEFAULT_SUFFIX)
+    lower, upper = month, _add_months(month, 1)
+    bounds = f"FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    in_range = f"{key} >= '{lower.isoformat()}' AND {key} < '{upper.isoformat()}'"
+
+    if conn.execute(text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1")).first() is None:
+        conn.execute(text(f"CREATE TABLE {partition} PARTITION OF {parent} FOR VALUES {bounds}"))
+        return
+
+    # default 分割中已有這個月的資料（例如排程停止過一段時間）：先建立獨立的表、搬移資料後再掛上
+    conn.execute(text(
+        f"CREATE TABLE {partition} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {partition} SELECT * FROM moved"
+    ))
+    conn.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {partition} FOR VALUES {bounds}"))
+
+
+def ensure_partitions(
+    conn: Connection,
+    table: Table,
+    start: Optional[date] = None,
+    months_ahead: Optional[int] = None
+) -> List[str]:
+    """
+    建立 start 所在月份（預設本月）到未來 months_ahead 個月之間缺少的分割，回傳新建的分割名稱
+
+    不會 commit；非分割表（包含 SQLite）不做任何事
+    """
+    if not is_partitioned(conn, table):
+        return []
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    this_month = _month_start(datetime.utcnow().date())
+    existing = {p["name"] for p in list_partitions(conn, table)}
+
+    created = []
+    default = table.name + DEFAULT_SUFFIX
+    if default not in existing:
+        conn.execute(text(
+            f"CREATE TABLE {_quote(conn, default)} PARTITION OF {_quote(conn, table.name)} DEFAULT"
+        ))
+        created.append(default)
+
+    month = _month_start(min(start, this_month)) if start else this_month
+    last = _add_months(this_month, months_ahead)
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            _create_month(conn, table, name, month)
+            created.append(name)
+        month = _add_months(month, 1)
+
+    if created:
+        logger.info("建立 %s 的分割：%s", table.name, ", ".join(created))
+    return created
+
+
+def drop_expired(
+    conn: Connection,
+    table: Table,
+    retention_months: Optional[int] = None
+) -> Dict[str, List[str]]:
+    """
+    卸離並刪除整個月份都早於保留期限的分割
+
+    只刪除空的分割；仍有資料的分割（尚未封存的報名）保留並回報在 kept。
+    不會 commit；retention_months 為 0 或非分割表時不做任何事
+    """
+    retention_months = settings.PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+    result: Dict[str, List[str]] = {"dropped": [], "kept": []}
+    if not retention_months or not is_partitioned(conn, table):
+        return result
+
+    cutoff = _add_months(_month_start(datetime.utcnow().date()), -retention_months)
+    parent = _quote(conn, table.name)
+    for partition in list_partitions(conn, table):
+        month = partition["month"]
+        if month is None or _add_months(month, 1) > cutoff:
+            continue
+        name = _quote(conn, partition["name"])
+        if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is not None:
+            result["kept"].append(partition["name"])
+            continue
+        conn.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        result["dropped"].append(partition["name"])
+
+    if result["dropped"]:
+        logger.info("刪除 %s 的過期分割：%s", table.name, ", ".join(result["dropped"]))
+    if result["kept"]:
+        logger.warning("%s 的過期分割仍有資料，未刪除：%s", table.name, ", ".join(result["kept"]))
+    return result
+
+
+def convert_to_partitioned(conn: Connection, table: Table, keep_old: bool = False) -> int:
+    """
+    將既有的一般資料表轉為分割表，回傳搬移的筆數
+
+    在呼叫端的交易中完成（PostgreSQL 的 DDL 可以回復）：舊表與其索引、序列改名後，
+    建立分割表與涵蓋所有舊資料的分割，複製資料並校正序列。keep_old 時保留舊表
+    （<資料表>_unpartitioned），否則刪除。轉換期間資料表會被完全鎖定。
+    """
+    if conn.dialect.name != "postgresql" or is_partitioned(conn, table):
+        return 0
+    key = table.info["partition_key"]
+    old = f"{table.name}_unpartitioned"
+    parent, old_q, key_q = _quote(conn, table.name), _quote(conn, old), _quote(conn, key)
+
+    serial = [
+        (column.name, conn.execute(
+            text("SELECT pg_get_serial_sequence(:table, :column)"),
+            {"table": table.name, "column": column.name}
+        ).scalar())
+        for column in table.primary_key.columns
+    ]
+    serial = [(column, sequence) for column, sequence in serial if sequence]
+
+    conn.execute(text(f"LOCK TABLE {parent} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {parent} RENAME TO {old_q}"))
+    indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": old}
+    ).scalars().all()
+    for index in indexes:
+        conn.execute(text(f"ALTER INDEX {_quote(conn, index)} RENAME TO {_quote(conn, index + '_old')}"))
+    for _, sequence in serial:
+        # pg_get_serial_sequence() 回傳含 schema、必要時加上引號的名稱
+        renamed = sequence.split(".")[-1].strip('"') + "_old"
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {_quote(conn, renamed)}"))
+
+    # 分割鍵不可為空值
+    conn.execute(text(
+        f"UPDATE {old_q} SET {key_q} = now() AT TIME ZONE 'utc' WHERE {key_q} IS NULL"
+    ))
+    earliest = conn.execute(text(f"SELECT min({key_q}) FROM {old_q}")).scalar()
+
+    _partitioned.pop((str(conn.engine.url), table.name), None)
+    table.create(conn)
+    ensure_partitions(conn, table, start=earliest.date() if earliest else None)
+
+    columns = ", ".join(_quote(conn, column.name) for column in table.columns)
+    moved = conn.execute(text(
+        f"INSERT INTO {parent} ({columns}) SELECT {columns} FROM {old_q}"
+    )).rowcount
+    for column, _ in serial:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence(:table, :column), "
+            f"coalesce(max({_quote(conn, column)}), 0) + 1, false) FROM {parent}"
+        ), {"table": table.name, "column": column})
+
+    if not keep_old:
+        conn.execute(text(f"DROP TABLE {old_q}"))
+    return moved
+
+
+@event.listens_for(Table, "after_create")
+def _create_initial_partitions(table: Table, connection: Connection, **kw) -> None:
+    # 新建立的分割表還沒有任何分割，必須先建立才能寫入
+    if "partition_key" in table.info and connection.dialect.name == "postgresql":
+        _partitioned.pop((str(connection.engine.url), table.name), None)
+        ensure_partitions(connection, table)
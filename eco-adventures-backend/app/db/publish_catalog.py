@@ -0,0 +1,39 @@
+"""
+立即發布公開目錄的靜態快照
+執行方式: python -m app.db.publish_catalog [--dir PATH]
+
+輸出到 CATALOG_PUBLISH_DIR（或 --dir 指定的目錄），即使沒有新的異動也會輸出新版本；
+可在部署後或由 cron 執行，再把目錄同步到 CDN。
+"""
+
+import argparse
+
+from app.core.config import settings
+from app.db.database import engine, Base
+from app.services.catalog_publisher import catalog_publisher
+
+# 建立資料庫表格
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="發布公開目錄的靜態快照")
+    parser.add_argument("--dir", default=None, help="輸出目錄（預設 CATALOG_PUBLISH_DIR）")
+    args = parser.parse_args()
+    if args.dir:
+        settings.CATALOG_PUBLISH_DIR = args.dir
+    if not settings.CATALOG_PUBLISH_DIR:
+        print("✗ 請設定 CATALOG_PUBLISH_DIR 或以 --dir 指定輸出目錄")
+        return
+
+    try:
+        version = catalog_publisher.publish(force=True)
+    except Exception as e:
+        print(f"✗ 發布失敗: {e}")
+        return
+    print(f"✓ 已發布版本 {version}（{settings.CATALOG_PUBLISH_DIR}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+重新計算統計與每月摘要
+執行方式: python -m app.db.rebuild_stats
+"""
+
+from app.db.database import SessionLocal, engine, Base
+from app.services.stats_service import StatsService
+from app.services.calendar_service import CalendarService
+
+# 建立資料庫表格
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    """主函數"""
+    print("開始重新計算統計資料...")
+    
+    db = SessionLocal()
+    try:
+        result = StatsService.rebuild(db)
+        print(f"✓ 報名統計：{result['course_stats']} 門課程、"
+              f"{result['category_stats']} 個類別、{result['daily_stats']} 天")
+        
+        months = CalendarService.rebuild(db)
+        print(f"✓ 每月課程摘要：{months} 筆")
+    except Exception as e:
+        print(f"✗ 重新計算失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+核對課程報名人數與額滿狀態
+執行方式: python -m app.db.reconcile_seats [--fix] [--batch-size N]
+"""
+
+import argparse
+
+from app.db.database import SessionLocal, engine, Base
+from app.services.reconcile_service import ReconcileService
+
+# 建立資料庫表格
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="核對課程報名人數")
+    parser.add_argument("--fix", action="store_true", help="修正有差異的課程")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批更新的課程數")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        result = ReconcileService.reconcile(db, fix=args.fix, batch_size=args.batch_size)
+        for item in result["courses"]:
+            print(
+                f"  課程 {item['course_id']}「{item['title']}」："
+                f"報名人數 {item['current_registrations']} → {item['actual_registrations']}，"
+                f"狀態 {item['status'].value} → {item['expected_status'].value}"
+            )
+        if not result["drifted"]:
+            print("✓ 所有課程的報名人數皆一致")
+        elif args.fix:
+            print(f"✓ 已修正 {result['fixed']} 門課程")
+            if result["skipped"]:
+                print(f"⚠ {result['skipped']} 門課程在核對期間有報名異動，已略過，請再執行一次")
+        else:
+            print(f"⚠ {result['drifted']} 門課程不一致，加上 --fix 參數即可修正")
+    except Exception as e:
+        print(f"✗ 核對失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+為既有資料庫的可修改資料表新增版本號欄位（version，樂觀並行控制用）
+執行方式: python -m app.db.version_columns
+
+新建立的資料庫已包含，不需要執行。既有的資料列版本號為 1；SQLite 與 PostgreSQL 11 以上
+新增帶預設值的欄位不會重寫資料表。未新增前應用程式啟動時會因缺少 version 欄位而失敗。
+"""
+
+from sqlalchemy import inspect, text
+
+from app.db.database import engine
+from app.models.models import Activity, Course, FAQ, Instructor, Registration
+
+
+def main():
+    """主函數"""
+    done = []
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            for model in (Course, Registration, Instructor, Activity, FAQ):
+                table = model.__table__
+                column = table.c.version
+                if not inspector.has_table(table.name):
+                    continue  # 尚未建立的資料表由應用程式啟動時建立
+                if column.name in {c["name"] for c in inspector.get_columns(table.name)}:
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} INTEGER NOT NULL "
+                    f"DEFAULT {column.server_default.arg}"
+                ))
+                done.append(table.name)
+    except Exception as e:
+        print(f"✗ 更新失敗（已回復）: {e}")
+        return
+    print(f"✓ 已為 {'、'.join(done)} 新增版本號欄位" if done else "✓ 版本號欄位已存在")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,86 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.core.config import settings
-from app.db.database import engine, Base
-from app.api import courses, registrations, others
+from app.core.compression import CompressionMiddleware
+from app.core.ratelimit import WriteRateLimitMiddleware
+from app.db.database import engine, Base, SessionLocal
+from app.api import courses, registrations, others, search, stats, system, home, images, archive, changes
+from app.services.search_index import suggestion_index
+from app.services.calendar_service import CalendarService
+from app.services.stats_service import StatsService
+from app.services.scheduler import lifecycle_scheduler
+from app.services.notification_service import notification_worker
+from app.services.outbox import outbox_dispatcher
+from app.services.image_service import image_service
+from app.services.cache_sync import cache_sync
+from app.services.seat_stream import seat_broadcaster
+from app.services.change_feed import ChangeFeedService, change_watcher
+from app.services.catalog_publisher import catalog_publisher
+from app.services.versioning import VersionConflict, etag
+from app.services.course_service import SeatsUnavailable
 
 # 建立資料庫表格
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用程式啟動與關閉時的處理"""
+    db = SessionLocal()
+    try:
+        # 建立自動完成索引
+        suggestion_index.rebuild(db)
+        # 補建每月課程摘要與統計表
+        CalendarService.ensure_built(db)
+        StatsService.ensure_built(db)
+        # 為既有資料補建增量同步的異動紀錄
+        ChangeFeedService.ensure_built(db)
+    finally:
+        db.close()
+    
+    # 啟動課程狀態排程
+    if settings.SCHEDULER_ENABLED:
+        await lifecycle_scheduler.start()
+    # 啟動通知信件 worker
+    await notification_worker.start()
+    # 啟動 outbox 事件分派
+    await outbox_dispatcher.start()
+    # 接收其他 worker 的快取失效通知
+    await cache_sync.start()
+    # 名額異動的即時推播
+    await seat_broadcaster.start()
+    # 增量同步的長輪詢
+    await change_watcher.start()
+    # 公開目錄的靜態快照（設定 CATALOG_PUBLISH_DIR 時）
+    await catalog_publisher.start()
+    yield
+    await catalog_publisher.stop()
+    await change_watcher.stop()
+    await seat_broadcaster.stop()
+    await cache_sync.stop()
+    await outbox_dispatcher.stop()
+    await notification_worker.stop()
+    await lifecycle_scheduler.stop()
+    image_service.shutdown()
+
+
 # 建立 FastAPI 應用程式
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",
     redoc_url=f"{settings.API_V1_STR}/redoc",
+    lifespan=lifespan,
 )
 
+# 寫入請求的速率限制與准入控制（在開啟資料庫 session 之前拒絕；
+# 先加入的 middleware 在內層，CORS 在外層才能為 429 回應加上 CORS 標頭）
+app.add_middleware(WriteRateLimitMiddleware)
+
 # 設定 CORS - 允許所有 localhost 端口
 app.add_middleware(
     CORSMiddleware,
@@ -32,8 +97,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # 前端更新時以 If-Match 帶回
 )
 
+# 回應壓縮（依 Accept-Encoding 使用 brotli 或 gzip）
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+
+@app.exception_handler(VersionConflict)
+async def version_conflict_handler(request: Request, exc: VersionConflict):
+    """If-Match 的版本與目前資料不同（或更新途中被其他人修改）時回傳 412"""
+    headers = {"ETag": etag(exc.current_version)} if exc.current_version is not None else None
+    return JSONResponse(status_code=412, content={"detail": str(exc)}, headers=headers)
+
+
+@app.exception_handler(SeatsUnavailable)
+async def seats_unavailable_handler(request: Request, exc: SeatsUnavailable):
+    """更新報名需要佔用名額、但課程已沒有足夠名額時回傳 409"""
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
 # 註冊路由
 app.include_router(
     courses.router,
@@ -60,6 +143,41 @@ app.include_router(
     prefix=f"{settings.API_V1_STR}/faqs",
     tags=["faqs"]
 )
+app.include_router(
+    home.router,
+    prefix=f"{settings.API_V1_STR}/home",
+    tags=["home"]
+)
+app.include_router(
+    changes.router,
+    prefix=f"{settings.API_V1_STR}/changes",
+    tags=["changes"]
+)
+app.include_router(
+    images.router,
+    prefix=f"{settings.API_V1_STR}/images",
+    tags=["images"]
+)
+app.include_router(
+    archive.router,
+    prefix=f"{settings.API_V1_STR}/archive",
+    tags=["archive"]
+)
+app.include_router(
+    search.router,
+    prefix=f"{settings.API_V1_STR}/search",
+    tags=["search"]
+)
+app.include_router(
+    stats.router,
+    prefix=f"{settings.API_V1_STR}/stats",
+    tags=["stats"]
+)
+app.include_router(
+    system.router,
+    prefix=f"{settings.API_V1_STR}/system",
+    tags=["system"]
+)
 
 
 @app.get("/")
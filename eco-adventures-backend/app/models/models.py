@@ -1,9 +1,10 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date, Time, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date, Time, Enum, Index, Computed
 from sqlalchemy.orm import relationship
 import enum
 
 from app.db.database import Base
+from app.db.partitions import monthly_partitions
 
 
 class CourseCategory(str, enum.Enum):
@@ -31,6 +32,14 @@ class RegistrationStatus(str, enum.Enum):
     WAITLIST = "候補中"
 
 
+class NotificationStatus(str, enum.Enum):
+    """通知信件狀態"""
+    PENDING = "待寄送"
+    SENDING = "寄送中"
+    SENT = "已寄送"
+    FAILED = "寄送失敗"
+
+
 class User(Base):
     """使用者模型"""
     __tablename__ = "users"
@@ -65,8 +74,12 @@ class Instructor(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # 關聯
-    courses = relationship("Course", back_populates="instructor")
+    # 樂觀鎖版本號（見 app/services/versioning.py）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+    
+    # 關聯（刪除講師時由資料庫將課程的 instructor_id 設為 NULL，不載入課程）
+    courses = relationship("Course", back_populates="instructor", passive_deletes=True)
 
 
 class Course(Base):
@@ -88,9 +101,13 @@ class Course(Base):
     # 名額管理
     max_spots = Column(Integer, default=30)
     current_registrations = Column(Integer, default=0)
+    # 剩餘名額：由資料庫依上面兩個欄位計算並儲存，所有寫入路徑（包含整批 UPDATE）都會自動更新
+    available_spots = Column(Integer, Computed(
+        "coalesce(max_spots, 0) - coalesce(current_registrations, 0)", persisted=True
+    ))
     
     # 講師
-    instructor_id = Column(Integer, ForeignKey("instructors.id"))
+    instructor_id = Column(Integer, ForeignKey("instructors.id", ondelete="SET NULL"))
     
     # 圖片與附加資訊
     image_url = Column(String(500))
@@ -101,9 +118,36 @@ class Course(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 樂觀鎖版本號（見 app/services/versioning.py）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # eager_defaults：INSERT／UPDATE 時以 RETURNING 一併取回剩餘名額，commit 後不需再查詢
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+    
     # 關聯
     instructor = relationship("Instructor", back_populates="courses")
-    registrations = relationship("Registration", back_populates="course")
+    # 刪除課程時由資料庫的 ON DELETE CASCADE 刪除報名，不載入報名記錄
+    registrations = relationship(
+        "Registration", back_populates="course",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+    
+    __table_args__ = (
+        # 行事曆依日期區間查詢
+        Index("ix_courses_date_start_time", "date", "start_time"),
+        # 依狀態篩選有名額的課程、依剩餘名額排序（has_spots、min_spots、sort=spots）
+        Index("ix_courses_status_available_spots_date", "status", "available_spots", "date"),
+    )
+
+
+class CourseMonthSummary(Base):
+    """每月課程摘要（依類別），由課程與報名的寫入路徑增量維護"""
+    __tablename__ = "course_month_summaries"
+    
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    category = Column(Enum(CourseCategory), primary_key=True)
+    course_count = Column(Integer, nullable=False, default=0)
+    total_spots = Column(Integer, nullable=False, default=0)
+    registered = Column(Integer, nullable=False, default=0)
 
 
 class Registration(Base):
@@ -113,7 +157,7 @@ class Registration(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # 課程與使用者
-    course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 允許訪客報名
     
     # 報名者資訊（訪客報名時使用）
@@ -132,9 +176,64 @@ class Registration(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 樂觀鎖版本號（見 app/services/versioning.py）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+    
     # 關聯
     course = relationship("Course", back_populates="registrations")
     user = relationship("User", back_populates="registrations")
+    
+    __table_args__ = (
+        # 依課程統計已確認人數（名額核對）時可只掃描索引
+        Index("ix_registrations_course_status", "course_id", "status", "participants"),
+        # 報名列表依建立時間排序
+        Index("ix_registrations_created_at", "created_at"),
+        # PostgreSQL 上依建立時間每月分割（見 app/db/partitions.py）
+        monthly_partitions("created_at"),
+    )
+
+
+class ArchivedCourse(Base):
+    """已封存的課程（結束超過 ARCHIVE_AFTER_DAYS 天後從 courses 搬移過來，欄位與 Course 相同）"""
+    __tablename__ = "courses_archive"
+    
+    id = Column(Integer, primary_key=True)  # 沿用原本的課程 ID
+    title = Column(String(200), nullable=False)
+    description = Column(Text)
+    category = Column(Enum(CourseCategory), default=CourseCategory.OTHER)
+    status = Column(Enum(CourseStatus), default=CourseStatus.COMPLETED)
+    date = Column(Date, nullable=False, index=True)
+    start_time = Column(Time)
+    end_time = Column(Time)
+    location = Column(String(200))
+    max_spots = Column(Integer, default=30)
+    current_registrations = Column(Integer, default=0)
+    instructor_id = Column(Integer, index=True)  # 講師之後可能被刪除，不設外鍵
+    image_url = Column(String(500))
+    requirements = Column(Text)
+    notes = Column(Text)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ArchivedRegistration(Base):
+    """已封存的報名記錄（隨課程一起搬移，欄位與 Registration 相同）"""
+    __tablename__ = "registrations_archive"
+    
+    id = Column(Integer, primary_key=True)  # 沿用原本的報名 ID
+    course_id = Column(Integer, nullable=False, index=True)  # 對應 courses_archive.id
+    user_id = Column(Integer, index=True)
+    name = Column(String(100), nullable=False)
+    email = Column(String(255), nullable=False, index=True)
+    phone = Column(String(20), nullable=False)
+    participants = Column(Integer, default=1)
+    status = Column(Enum(RegistrationStatus), default=RegistrationStatus.PENDING)
+    notes = Column(Text)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class Activity(Base):
@@ -157,6 +256,10 @@ class Activity(Base):
     # 時間戳記
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 樂觀鎖版本號（見 app/services/versioning.py）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
 
 class FAQ(Base):
@@ -173,3 +276,145 @@ class FAQ(Base):
     # 時間戳記
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 樂觀鎖版本號（見 app/services/versioning.py）
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
+
+class StatCounter(Base):
+    """全站統計計數（課程總數、報名總數等）"""
+    __tablename__ = "stat_counters"
+    
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class CourseRegistrationStat(Base):
+    """每門課程的報名統計"""
+    __tablename__ = "course_registration_stats"
+    
+    course_id = Column(Integer, primary_key=True)
+    registrations = Column(Integer, nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+
+
+class CategoryRegistrationStat(Base):
+    """各課程類別的報名統計"""
+    __tablename__ = "category_registration_stats"
+    
+    category = Column(Enum(CourseCategory), primary_key=True)
+    registrations = Column(Integer, nullable=False, default=0)
+    participants = Column(Integer, nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+
+
+class DailyRegistrationStat(Base):
+    """每日報名統計（依報名建立時間在 TIMEZONE 時區的日期）"""
+    __tablename__ = "daily_registration_stats"
+    
+    day = Column(Date, primary_key=True)
+    registrations = Column(Integer, nullable=False, default=0)
+    participants = Column(Integer, nullable=False, default=0)
+    cancellations = Column(Integer, nullable=False, default=0)
+
+
+class EmailNotification(Base):
+    """待寄送的通知信件（持久化佇列，由背景 worker 批次寄送）"""
+    __tablename__ = "email_notifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # 對應 app/templates/email/ 中的範本名稱
+    to_email = Column(String(255), nullable=False)
+    to_name = Column(String(100))
+    context = Column(Text)  # JSON 字串，範本變數
+    registration_id = Column(Integer)
+    
+    # 寄送狀態
+    status = Column(Enum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # 寄送中時為租約到期時間
+    claimed_by = Column(String(100))
+    last_error = Column(Text)
+    
+    # 時間戳記
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("ix_email_notifications_status_due", "status", "next_attempt_at"),
+    )
+
+
+class OutboxEvent(Base):
+    """領域事件 outbox（與資料異動在同一個交易中寫入，由背景 dispatcher 分派）"""
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(100), nullable=False)  # 例如 registration.confirmed
+    aggregate_id = Column(Integer)  # 事件所屬的課程或報名 ID
+    payload = Column(Text)  # JSON 字串
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class OutboxCheckpoint(Base):
+    """各 outbox 訂閱者已處理到的事件 ID"""
+    __tablename__ = "outbox_checkpoints"
+    
+    consumer = Column(String(100), primary_key=True)
+    last_event_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OutboxGap(Base):
+    """檢查點越過的事件 ID 空缺（較晚提交的事件仍會補送，超過 OUTBOX_GAP_TIMEOUT_SECONDS 後放棄）"""
+    __tablename__ = "outbox_gaps"
+    
+    consumer = Column(String(100), primary_key=True)
+    event_id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SchedulerLock(Base):
+    """背景排程的領導者鎖（多個 worker 之間只有一個執行排程）"""
+    __tablename__ = "scheduler_locks"
+    
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class CacheInvalidation(Base):
+    """程序內快取的失效通知（與資料異動在同一個交易中寫入，各 worker 輪詢後清除自己的快取）"""
+    __tablename__ = "cache_invalidations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String(50), nullable=False)  # 例如 home、search
+    key = Column(String(100))  # 失效的項目，例如 course:12；空值表示整個快取
+    origin = Column(String(200), nullable=False)  # 寫入的 worker，輪詢時略過自己的通知
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class ChangeLogEntry(Base):
+    """增量同步的異動紀錄（id 即異動序號；與資料異動在同一個交易中寫入）"""
+    __tablename__ = "change_log"
+    
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # course、instructor、activity、faq
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)  # upsert：新增或更新；delete：已刪除（tombstone）
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        # 壓縮時找出同一筆資料較新的紀錄
+        Index("ix_change_log_entity", "entity", "entity_id", "id"),
+    )
+
+
+class ChangeLogHorizon(Base):
+    """異動紀錄的清除範圍（序號不大於 pruned_through 的 tombstone 已刪除，只有一列）"""
+    __tablename__ = "change_log_horizon"
+    
+    id = Column(Integer, primary_key=True)
+    pruned_through = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
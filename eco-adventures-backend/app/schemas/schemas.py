@@ -1,7 +1,10 @@
+import datetime as dt
+import json
 from datetime import datetime, date, time
 from typing import Optional, List
 from pydantic import BaseModel, EmailStr, validator
 from app.models.models import CourseCategory, CourseStatus, RegistrationStatus
+from app.services.image_service import image_service
 
 
 # ============ Course Schemas ============
@@ -33,7 +36,7 @@ class CourseUpdate(BaseModel):
     description: Optional[str] = None
     category: Optional[CourseCategory] = None
     status: Optional[CourseStatus] = None
-    date: Optional[date] = None
+    date: Optional[dt.date] = None  # 欄位名稱與型別同名，需以模組路徑指定型別
     start_time: Optional[time] = None
     end_time: Optional[time] = None
     location: Optional[str] = None
@@ -51,6 +54,7 @@ class CourseInDB(CourseBase):
     current_registrations: int
     created_at: datetime
     updated_at: datetime
+    version: int  # 更新時以 If-Match 帶回
     
     class Config:
         from_attributes = True
@@ -60,10 +64,54 @@ class Course(CourseInDB):
     """課程回應 Schema（包含講師資訊）"""
     instructor: Optional['InstructorSimple'] = None
     available_spots: int = 0
+    image_srcset: Optional[str] = None
     
     @validator('available_spots', always=True)
     def calculate_available_spots(cls, v, values):
+        # 資料庫儲存的剩餘名額（courses.available_spots）與此計算結果相同
         return values.get('max_spots', 0) - values.get('current_registrations', 0)
+    
+    @validator('image_srcset', always=True)
+    def build_image_srcset(cls, v, values):
+        return image_service.srcset(values.get('image_url'))
+
+
+class CalendarDay(BaseModel):
+    """行事曆單日 Schema"""
+    date: date
+    total_spots: int
+    available_spots: int
+    courses: List[Course]
+
+
+class CategorySummary(BaseModel):
+    """每月摘要中的單一類別"""
+    category: CourseCategory
+    course_count: int
+    remaining_spots: int
+
+
+class MonthSummary(BaseModel):
+    """每月課程摘要 Schema"""
+    month: str
+    course_count: int
+    remaining_spots: int
+    categories: List[CategorySummary]
+
+
+class FacetCount(BaseModel):
+    """篩選條件的一個選項與符合的課程數"""
+    value: str
+    count: int
+
+
+class CourseFacets(BaseModel):
+    """課程列表篩選條件的計數（套用目前的篩選條件）"""
+    total: int
+    category: List[FacetCount]
+    status: List[FacetCount]
+    month: List[FacetCount]
+    location: List[FacetCount]
 
 
 # ============ Instructor Schemas ============
@@ -112,6 +160,17 @@ class Instructor(InstructorBase):
     id: int
     is_active: bool
     created_at: datetime
+    version: int
+    image_srcset: Optional[str] = None
+    
+    @validator('image_srcset', always=True)
+    def build_image_srcset(cls, v, values):
+        return image_service.srcset(values.get('image_url'))
+    
+    @validator('specialties', pre=True)
+    def parse_specialties(cls, v):
+        # 資料庫中以 JSON 字串保存
+        return json.loads(v) if isinstance(v, str) else v
     
     class Config:
         from_attributes = True
@@ -151,6 +210,7 @@ class Registration(RegistrationBase):
     course_id: int
     status: RegistrationStatus
     created_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -161,6 +221,86 @@ class RegistrationWithCourse(Registration):
     course: CourseInDB
 
 
+# ============ Bulk Schemas ============
+
+# 整批操作一次最多指定的 ID 數
+BULK_MAX_IDS = 1000
+
+
+class CourseBulkStatus(BaseModel):
+    """整批變更課程狀態 Schema"""
+    course_ids: List[int]
+    status: CourseStatus
+    
+    @validator('course_ids')
+    def validate_course_ids(cls, v):
+        if not v or len(v) > BULK_MAX_IDS:
+            raise ValueError(f'請指定 1-{BULK_MAX_IDS} 門課程')
+        return v
+
+
+class RegistrationBulkTarget(BaseModel):
+    """整批取消或刪除報名的對象（課程與報名 ID 至少指定一種，同時指定時需兩者皆符合）"""
+    course_ids: List[int] = []
+    registration_ids: List[int] = []
+    status: Optional[RegistrationStatus] = None  # 只處理此狀態的報名（選填）
+    
+    @validator('course_ids', 'registration_ids')
+    def validate_ids(cls, v):
+        if len(v) > BULK_MAX_IDS:
+            raise ValueError(f'一次最多指定 {BULK_MAX_IDS} 個 ID')
+        return v
+    
+    @validator('status', always=True)
+    def validate_target(cls, v, values):
+        if not values.get('course_ids') and not values.get('registration_ids'):
+            raise ValueError('請指定課程或報名 ID')
+        return v
+
+
+class CourseBulkResult(BaseModel):
+    """整批變更課程狀態結果 Schema"""
+    matched: int  # 符合條件的筆數
+    changed: int  # 實際變更的筆數
+    course_ids: List[int] = []  # 受影響的課程
+
+
+class BulkResult(CourseBulkResult):
+    """整批取消、刪除報名結果 Schema"""
+    released_spots: int = 0  # 釋放的名額
+
+# ============ Archive Schemas ============
+
+class ArchivedCourse(CourseBase):
+    """封存課程回應 Schema"""
+    id: int
+    status: CourseStatus
+    current_registrations: int = 0
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    archived_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class ArchivedRegistration(BaseModel):
+    """封存報名回應 Schema"""
+    id: int
+    course_id: int
+    name: str
+    email: str
+    phone: str
+    participants: int = 1
+    status: RegistrationStatus
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    archived_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
 # ============ Activity Schemas ============
 
 class ActivityBase(BaseModel):
@@ -168,7 +308,7 @@ class ActivityBase(BaseModel):
     title: str
     description: Optional[str] = None
     category: Optional[str] = None
-    date: Optional[date] = None
+    date: Optional[dt.date] = None  # 欄位名稱與型別同名，需以模組路徑指定型別
     location: Optional[str] = None
     image_url: Optional[str] = None
     participants_count: Optional[int] = None
@@ -186,7 +326,7 @@ class ActivityUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     category: Optional[str] = None
-    date: Optional[date] = None
+    date: Optional[dt.date] = None  # 欄位名稱與型別同名，需以模組路徑指定型別
     location: Optional[str] = None
     image_url: Optional[str] = None
     participants_count: Optional[int] = None
@@ -198,6 +338,17 @@ class Activity(ActivityBase):
     """活動回應 Schema"""
     id: int
     created_at: datetime
+    version: int
+    image_srcset: Optional[str] = None
+    
+    @validator('image_srcset', always=True)
+    def build_image_srcset(cls, v, values):
+        return image_service.srcset(values.get('image_url'))
+    
+    @validator('photos', pre=True)
+    def parse_photos(cls, v):
+        # 資料庫中以 JSON 字串保存
+        return json.loads(v) if isinstance(v, str) else v
     
     class Config:
         from_attributes = True
@@ -232,6 +383,7 @@ class FAQ(FAQBase):
     id: int
     is_active: bool
     created_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -270,6 +422,89 @@ class User(UserBase):
         from_attributes = True
 
 
+# ============ Search Schemas ============
+
+class SearchSuggestion(BaseModel):
+    """自動完成建議 Schema"""
+    type: str
+    id: Optional[int] = None
+    text: str
+    popularity: int = 0
+
+
+# ============ Stats Schemas ============
+
+class DashboardTotals(BaseModel):
+    """儀表板總數"""
+    courses: int
+    registrations: int
+    cancellations: int
+
+
+class CourseFillRate(BaseModel):
+    """課程填滿率"""
+    course_id: int
+    title: str
+    date: dt.date
+    status: CourseStatus
+    max_spots: int
+    current_registrations: int
+    fill_rate: float
+
+
+class CategoryRegistrationStats(BaseModel):
+    """各類別報名統計"""
+    category: CourseCategory
+    registrations: int
+    participants: int
+    cancellations: int
+
+
+class DailyRegistrationStats(BaseModel):
+    """每日報名統計"""
+    day: dt.date
+    registrations: int
+    participants: int
+    cancellations: int
+
+
+class Dashboard(BaseModel):
+    """管理後台儀表板 Schema"""
+    totals: DashboardTotals
+    fill_rates: List[CourseFillRate]
+    registrations_by_category: List[CategoryRegistrationStats]
+    registrations_by_day: List[DailyRegistrationStats]
+
+
+# ============ Home Schemas ============
+
+class HomeBundle(BaseModel):
+    """首頁資料 Schema（即將開始的課程、講師、活動與 FAQ）"""
+    upcoming_courses: List[Course]
+    instructors: List[Instructor]
+    activities: List[Activity]
+    faqs: List[FAQ]
+
+
+# ============ 增量同步 Schemas ============
+
+class ChangeRecord(BaseModel):
+    """一筆資料的最新異動（op 為 delete 時是 tombstone，沒有 data）"""
+    seq: int
+    entity: str  # course、instructor、activity、faq
+    id: int
+    op: str  # upsert、delete
+    data: Optional[dict] = None  # 與該資料 GET 端點相同的內容
+
+
+class ChangeFeed(BaseModel):
+    """增量同步的一頁異動"""
+    next: int  # 下次請求的 since
+    reset: bool = False  # 同步位置早於已清除的紀錄：需重新下載完整資料，再從 next 繼續
+    has_more: bool = False  # 還有下一頁，可立即以 next 再請求
+    changes: List[ChangeRecord]
+
+
 # ============ 通用回應 Schemas ============
 
 class Message(BaseModel):
@@ -288,3 +523,5 @@ class PaginatedResponse(BaseModel):
 
 # 更新 forward references
 Course.model_rebuild()
+CalendarDay.model_rebuild()
+HomeBundle.model_rebuild()
@@ -0,0 +1,68 @@
+"""
+多程序伺服器
+
+以 gunicorn 預先 fork 多個 uvicorn worker；WEB_PRELOAD 時在 master 載入應用程式後再 fork，
+各 worker 以 copy-on-write 共用已載入的模組。所有設定來自 Settings（WEB_*）。
+
+    python -m app.serve
+
+沒有 gunicorn 的環境（例如 Windows）改用 uvicorn 內建的多程序模式（不支援預先載入）。
+"""
+
+import os
+
+from app.core.config import settings
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def worker_count() -> int:
+    return settings.WEB_WORKERS or os.cpu_count() or 1
+
+
+def _post_fork(server, worker) -> None:
+    # 連線池不能跨程序共用：捨棄從 master 複製來的連線（不關閉，master 仍持有）
+    from app.db.database import engine
+    engine.dispose(close=False)
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """以程式設定的 gunicorn 應用程式"""
+
+        def load_config(self):
+            options = {
+                "bind": f"{settings.WEB_HOST}:{settings.WEB_PORT}",
+                "workers": worker_count(),
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": settings.WEB_PRELOAD,
+                "timeout": settings.WEB_TIMEOUT_SECONDS,
+                "post_fork": _post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.main import app
+            return app
+
+
+def main() -> None:
+    if BaseApplication is not None:
+        GunicornServer().run()
+        return
+
+    import uvicorn
+    uvicorn.run(
+        "app.main:app",
+        host=settings.WEB_HOST,
+        port=settings.WEB_PORT,
+        workers=worker_count(),
+    )
+
+
+if __name__ == "__main__":
+    main()
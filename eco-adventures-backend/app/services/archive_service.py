@@ -0,0 +1,219 @@
+"""
+已結束課程的封存
+
+結束或取消超過 ARCHIVE_AFTER_DAYS 天的課程與其報名記錄，以小批次從 courses／registrations
+搬到 courses_archive／registrations_archive：每批在一個短交易中以 INSERT … SELECT 複製後
+刪除原資料，只鎖定該批的資料列（PostgreSQL 略過正被其他交易鎖定的課程），批次之間稍作停頓，
+不會長時間阻擋線上的報名。線上資料表的大小因此只與近期的課程數量有關。
+
+封存的資料只能透過 /archive 端點查詢。每月摘要、課程與報名計數的處理與刪除課程相同；
+類別與每日報名統計保留（StatsService.rebuild() 也會計入封存的報名）。
+"""
+
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, and_, case, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.timeutils import local_now
+from app.models.models import (
+    Course, CourseCategory, CourseStatus, Registration, RegistrationStatus,
+    ArchivedCourse, ArchivedRegistration
+)
+from app.services import outbox
+from app.services.calendar_service import CalendarService
+from app.services.outbox import OutboxService
+from app.services.search_index import suggestion_index, publish_change, KIND_COURSE
+from app.services.seat_stream import publish_seats
+from app.services.change_feed import record_changes, ENTITY_COURSE, OP_DELETE
+from app.services.stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+
+# 可以封存的課程狀態
+ARCHIVABLE_STATUSES = (CourseStatus.COMPLETED, CourseStatus.CANCELLED)
+
+
+def _copy_select(source, archive, where, archived_at: datetime):
+    """從線上資料表複製到封存表的 INSERT … SELECT（欄位名稱相同，另加上封存時間）"""
+    names = [c.name for c in archive.__table__.columns if c.name != "archived_at"]
+    columns = [source.__table__.c[name] for name in names]
+    return insert(archive).from_select(
+        [*names, "archived_at"],
+        select(*columns, literal(archived_at, DateTime)).where(where)
+    )
+
+
+class ArchiveService:
+    """封存服務類別"""
+
+    @staticmethod
+    def cutoff(older_than_days: Optional[int] = None) -> date:
+        """課程日期早於此日期才會封存"""
+        days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        return local_now().date() - timedelta(days=days)
+
+    @staticmethod
+    def _eligible(cutoff: date):
+        return and_(Course.status.in_(ARCHIVABLE_STATUSES), Course.date < cutoff)
+
+    @staticmethod
+    def preview(db: Session, cutoff: date) -> Dict[str, int]:
+        """計算會被封存的課程與報名數（不異動資料）"""
+        eligible = ArchiveService._eligible(cutoff)
+        courses = db.query(func.count(Course.id)).filter(eligible).scalar()
+        registrations = db.query(func.count(Registration.id)).join(
+            Course, Course.id == Registration.course_id
+        ).filter(eligible).scalar()
+        return {"courses": courses, "registrations": registrations}
+
+    @staticmethod
+    def archive(
+        db: Session,
+        older_than_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        dry_run: bool = False
+    ) -> Dict:
+        """
+        封存已結束的課程
+
+        - **older_than_days**: 課程日期早於今天減去此天數才封存（預設 ARCHIVE_AFTER_DAYS）
+        - **batch_size**: 每批（每個交易）搬移的課程數（預設 ARCHIVE_BATCH_SIZE）
+        - **dry_run**: 只計算數量，不搬移
+        """
+        cutoff = ArchiveService.cutoff(older_than_days)
+        batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        if dry_run:
+            return {"cutoff": cutoff, "dry_run": True, "batches": 0, **ArchiveService.preview(db, cutoff)}
+
+        courses = registrations = batches = 0
+        after_id = 0
+        while True:
+            course_ids = db.execute(
+                select(Course.id)
+                .where(ArchiveService._eligible(cutoff), Course.id > after_id)
+                .order_by(Course.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not course_ids:
+                break
+            after_id = course_ids[-1]
+
+            moved_courses, moved_registrations = ArchiveService._archive_batch(db, course_ids, cutoff)
+            courses += moved_courses
+            registrations += moved_registrations
+            batches += 1
+            if len(course_ids) < batch_size:
+                break
+            if settings.ARCHIVE_BATCH_PAUSE_SECONDS > 0:
+                time.sleep(settings.ARCHIVE_BATCH_PAUSE_SECONDS)
+
+        if courses:
+            logger.info("封存 %d 門課程、%d 筆報名（課程日期早於 %s）", courses, registrations, cutoff)
+        return {
+            "cutoff": cutoff,
+            "dry_run": False,
+            "batches": batches,
+            "courses": courses,
+            "registrations": registrations,
+        }
+
+    @staticmethod
+    def _archive_batch(db: Session, course_ids: List[int], cutoff: date) -> Tuple[int, int]:
+        """在一個交易中搬移一批課程與其報名，回傳 (課程數, 報名數)"""
+        # 鎖定本批課程並重新確認條件；被鎖定的課程留到下次處理（SQLite 不支援，會忽略）
+        locked = db.query(Course).filter(
+            Course.id.in_(course_ids), ArchiveService._eligible(cutoff)
+        ).with_for_update(skip_locked=True).all()
+        if not locked:
+            db.rollback()
+            return 0, 0
+        ids = [course.id for course in locked]
+        now = datetime.utcnow()
+
+        registrations, cancellations = db.query(
+            func.count(Registration.id),
+            func.coalesce(func.sum(case(
+                (Registration.status == RegistrationStatus.CANCELLED, 1), else_=0
+            )), 0)
+        ).filter(Registration.course_id.in_(ids)).one()
+
+        db.execute(_copy_select(Course, ArchivedCourse, Course.id.in_(ids), now))
+        db.execute(_copy_select(Registration, ArchivedRegistration, Registration.course_id.in_(ids), now))
+        db.execute(
+            delete(Registration).where(Registration.course_id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(Course).where(Course.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        CalendarService.apply_many(db, [(CalendarService.contribution(course), None) for course in locked])
+        OutboxService.record_many(db, [(outbox.COURSE_ARCHIVED, course_id, None) for course_id in ids])
+        for course_id in ids:
+            publish_change(db, KIND_COURSE, course_id)
+        publish_seats(db, ids)
+        # 封存的課程不再出現在課程目錄，對同步的用戶端而言等同刪除
+        record_changes(db, ENTITY_COURSE, ids, OP_DELETE)
+        StatsService.courses_archived(db, ids, registrations, cancellations)
+        db.commit()
+        db.expunge_all()
+
+        for course_id in ids:
+            suggestion_index.remove_course(course_id)
+        return len(ids), registrations
+
+    # ---------- 查詢 ----------
+
+    @staticmethod
+    def get_courses(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        category: Optional[CourseCategory] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        keyword: Optional[str] = None
+    ) -> List[ArchivedCourse]:
+        """取得封存的課程（新到舊）"""
+        query = db.query(ArchivedCourse)
+        if category:
+            query = query.filter(ArchivedCourse.category == category)
+        if date_from:
+            query = query.filter(ArchivedCourse.date >= date_from)
+        if date_to:
+            query = query.filter(ArchivedCourse.date <= date_to)
+        if keyword:
+            pattern = f"%{keyword}%"
+            query = query.filter(or_(
+                ArchivedCourse.title.ilike(pattern), ArchivedCourse.location.ilike(pattern)
+            ))
+        return query.order_by(
+            ArchivedCourse.date.desc(), ArchivedCourse.id.desc()
+        ).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def get_course(db: Session, course_id: int) -> Optional[ArchivedCourse]:
+        """取得單一封存的課程"""
+        return db.get(ArchivedCourse, course_id)
+
+    @staticmethod
+    def get_registrations(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        course_id: Optional[int] = None,
+        email: Optional[str] = None
+    ) -> List[ArchivedRegistration]:
+        """取得封存的報名記錄（可依課程或 email 篩選）"""
+        query = db.query(ArchivedRegistration)
+        if course_id:
+            query = query.filter(ArchivedRegistration.course_id == course_id)
+        if email:
+            query = query.filter(ArchivedRegistration.email == email)
+        return query.order_by(ArchivedRegistration.id).offset(skip).limit(limit).all()
@@ -0,0 +1,278 @@
+"""
+多個 worker 之間的程序內快取同步
+
+首頁快照、搜尋自動完成索引等快取保存在各 worker 的記憶體中。寫入路徑以
+CacheSync.publish() 登記通知，commit 前以一個多列 INSERT 在資料異動的同一個交易中寫入 cache_invalidations，
+各 worker 的背景工作每 CACHE_SYNC_POLL_SECONDS 秒以一次索引查詢讀取新的通知，
+交給該頻道的訂閱者清除或更新自己的快取（自己寫入的通知已在 commit 後直接處理，會略過）。
+
+事件 ID 出現空缺（較早的交易尚未提交）時，最近 CACHE_SYNC_SETTLE_SECONDS 秒內
+的通知會重新檢查，晚提交的通知不會遺漏。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, func, insert, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import CacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+# 每次輪詢最多讀取的通知數
+POLL_BATCH_SIZE = 1000
+# 清除舊通知的間隔
+PRUNE_INTERVAL = timedelta(minutes=10)
+
+# handler(db, keys)：keys 為該頻道本次收到的項目，None 表示整個快取失效
+Handler = Callable[[Session, Set[Optional[str]]], None]
+
+
+class CacheSync:
+    """快取失效通知的寫入端"""
+
+    _origin: Optional[str] = None
+    _origin_pid: Optional[int] = None
+
+    @classmethod
+    def origin(cls) -> str:
+        """目前 worker 的識別碼（fork 之後重新產生）"""
+        if cls._origin_pid != os.getpid():
+            cls._origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            cls._origin_pid = os.getpid()
+        return cls._origin
+
+    @staticmethod
+    def publish(db: Session, channel: str, key: Optional[str] = None) -> None:
+        """
+        登記快取失效通知（不會 commit）
+
+        同一個交易中重複的通知只寫一次；所有通知在 commit 前以一個多列 INSERT 寫入，
+        與呼叫端的資料異動在同一個交易內完成（整批操作逐筆登記也只有一個語句）。
+        只修改 session.info，可以在 flush 相關的事件中呼叫。
+        """
+        db.info.setdefault("cache_published", {})[(channel, key)] = None
+
+
+class CacheSyncWorker:
+    """快取失效通知的輪詢端，由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.last_id = 0
+        self.received = 0
+        self.last_poll_at: Optional[datetime] = None
+        self.last_pruned_at: Optional[datetime] = None
+        # 最近 settle 期間內已處理過的 ID -> 建立時間
+        self._seen: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str):
+        """
+        註冊頻道的訂閱者（decorator）
+
+        handler(db, keys) 在輪詢的 session 中執行，只應讀取資料並更新程序內的快取
+        """
+        def decorator(handler: Handler) -> Handler:
+            self.handlers[channel].append(handler)
+            return handler
+        return decorator
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作（從目前最新的通知之後開始）"""
+        if self._task is not None or not settings.CACHE_SYNC_ENABLED:
+            return
+        await asyncio.to_thread(self._init_position)
+        self._task = asyncio.create_task(self._run(), name="cache-sync")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _init_position(self) -> None:
+        db = SessionLocal()
+        try:
+            self.last_id = db.query(func.coalesce(func.max(CacheInvalidation.id), 0)).scalar()
+        finally:
+            db.close()
+
+    # ---------- 主迴圈 ----------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception:
+                logger.exception("快取同步輪詢失敗")
+            await asyncio.sleep(settings.CACHE_SYNC_POLL_SECONDS)
+
+    def poll(self) -> int:
+        """讀取新的失效通知並交給訂閱者，回傳處理的通知數"""
+        now = datetime.utcnow()
+        settle_since = now - timedelta(seconds=settings.CACHE_SYNC_SETTLE_SECONDS)
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                CacheInvalidation.id, CacheInvalidation.channel,
+                CacheInvalidation.key, CacheInvalidation.origin,
+                CacheInvalidation.created_at
+            ).filter(
+                or_(CacheInvalidation.id > self.last_id,
+                    CacheInvalidation.created_at >= settle_since)
+            ).order_by(CacheInvalidation.id).limit(POLL_BATCH_SIZE).all()
+
+            origin = CacheSync.origin()
+            pending: Dict[str, Set[Optional[str]]] = defaultdict(set)
+            for row in rows:
+                self.last_id = max(self.last_id, row.id)
+                if row.id in self._seen:
+                    continue
+                self._seen[row.id] = row.created_at
+                if row.origin != origin:
+                    pending[row.channel].add(row.key)
+
+            for channel, keys in pending.items():
+                for handler in self.handlers.get(channel, []):
+                    try:
+                        handler(db, keys)
+                    except Exception:
+                        logger.exception("快取同步頻道 %s 處理失敗", channel)
+            db.rollback()
+
+            self._seen = {i: t for i, t in self._seen.items() if t >= settle_since}
+            if self.last_pruned_at is None or now - self.last_pruned_at >= PRUNE_INTERVAL:
+                self._prune(db, now)
+        finally:
+            db.close()
+
+        self.received += sum(len(keys) for keys in pending.values())
+        self.last_poll_at = now
+        return len(rows)
+
+    def _prune(self, db: Session, now: datetime) -> None:
+        """清除超過保留時間的通知（任何 worker 都可以執行，重複執行無害）"""
+        cutoff = now - timedelta(minutes=settings.CACHE_SYNC_RETENTION_MINUTES)
+        db.query(CacheInvalidation).filter(
+            CacheInvalidation.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        self.last_pruned_at = now
+
+    def status(self) -> dict:
+        """同步狀態（供監控使用）"""
+        return {
+            "enabled": settings.CACHE_SYNC_ENABLED,
+            "origin": CacheSync.origin(),
+            "channels": sorted(self.handlers),
+            "last_id": self.last_id,
+            "received": self.received,
+            "last_poll_at": self.last_poll_at,
+        }
+
+
+cache_sync = CacheSyncWorker()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _write_published_before_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # SAVEPOINT 的釋放也會觸發，等到最外層的交易 commit 時才寫入
+    # 先 flush：ORM 寫入在 flush 事件中登記的通知也要在這次 commit 中寫入
+    session.flush()
+    staged = session.info.pop("cache_published", None)
+    if not staged:
+        return
+    now = datetime.utcnow()
+    origin = CacheSync.origin()
+    session.execute(insert(CacheInvalidation.__table__), [
+        {"channel": channel, "key": key, "origin": origin, "created_at": now}
+        for channel, key in staged
+    ])
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _clear_published_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("cache_published", None)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _clear_published_after_rollback(session: Session) -> None:
+    # SAVEPOINT 回復（例如統計 upsert 的重試）不影響外層交易已登記的通知
+    if not session.in_nested_transaction():
+        session.info.pop("cache_published", None)
+
+
+def invalidate_on_write(channel: str, models: Iterable[type], invalidate: Callable[[], None]) -> None:
+    """
+    models 的資料有寫入並提交後呼叫 invalidate()，同時經由 channel 通知其他 worker
+
+    ORM 的寫入在 flush 時偵測；整批 UPDATE/DELETE（報名人數、排程狀態轉換、名額核對）不會經過
+    flush，改在執行時偵測，沒有更新到任何資料列時不算寫入。交易回復時不會失效。
+    """
+    models = tuple(models)
+    tables = {model.__table__ for model in models}
+    flag = f"dirty:{channel}"
+
+    def mark(session: Session) -> None:
+        if not session.info.get(flag):
+            session.info[flag] = True
+            CacheSync.publish(session, channel)
+
+    @cache_sync.subscribe(channel)
+    def _invalidate_from_other_worker(db: Session, keys) -> None:
+        invalidate()
+
+    @event.listens_for(SessionLocal, "after_flush")
+    def _mark_after_flush(session: Session, flush_context) -> None:
+        if session.info.get(flag):
+            return
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, models):
+                mark(session)
+                return
+
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def _mark_on_bulk_write(orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        if getattr(orm_execute_state.statement, "table", None) not in tables:
+            return
+        result = orm_execute_state.invoke_statement()
+        if not hasattr(result, "rowcount"):
+            # UPDATE … RETURNING 的結果沒有 rowcount：先取出資料列，再以相同內容回傳給呼叫端
+            frozen = result.freeze()
+            if frozen.data:
+                mark(orm_execute_state.session)
+            return frozen()
+        if result.rowcount:
+            mark(orm_execute_state.session)
+        return result
+
+    @event.listens_for(SessionLocal, "after_commit")
+    def _invalidate_after_commit(session: Session) -> None:
+        # SAVEPOINT 的釋放也會觸發，只在最外層的交易提交後失效
+        if not session.in_nested_transaction() and session.info.pop(flag, False):
+            invalidate()
+
+    @event.listens_for(SessionLocal, "after_rollback")
+    def _discard_after_rollback(session: Session) -> None:
+        if not session.in_nested_transaction():
+            session.info.pop(flag, None)
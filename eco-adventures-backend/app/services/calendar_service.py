@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from app.db.counters import increment_row
+from app.models.models import Course, CourseCategory, CourseStatus, CourseMonthSummary
+
+# 課程對每月摘要的貢獻：(月份, 類別, 總名額, 已報名人數)
+Contribution = Tuple[str, CourseCategory, int, int]
+
+
+def _month_key(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+class CalendarService:
+    """行事曆服務類別"""
+
+    @staticmethod
+    def contribution(course: Optional[Course]) -> Optional[Contribution]:
+        """
+        計算課程對每月摘要的貢獻
+
+        已取消的課程不計入；在寫入前後各呼叫一次，再交給 apply() 套用差異
+        """
+        if course is None or course.date is None or course.status == CourseStatus.CANCELLED:
+            return None
+        max_spots = course.max_spots if course.max_spots is not None else 30
+        return (
+            _month_key(course.date),
+            course.category or CourseCategory.OTHER,
+            max_spots,
+            course.current_registrations or 0,
+        )
+
+    @staticmethod
+    def apply(
+        db: Session,
+        before: Optional[Contribution],
+        after: Optional[Contribution]
+    ) -> None:
+        """
+        將課程異動前後的差異套用到每月摘要
+
+        不會 commit，與呼叫端的資料異動在同一個交易內完成
+        """
+        CalendarService.apply_many(db, [(before, after)])
+
+    @staticmethod
+    def apply_many(
+        db: Session,
+        changes: Iterable[Tuple[Optional[Contribution], Optional[Contribution]]]
+    ) -> None:
+        """
+        套用多門課程異動前後的差異（整批操作用），每個月份與類別只更新一次
+
+        不會 commit，與呼叫端的資料異動在同一個交易內完成
+        """
+        deltas: Dict[Tuple[str, CourseCategory], List[int]] = {}
+        for before, after in changes:
+            if before == after:
+                continue
+            for contrib, sign in ((before, -1), (after, 1)):
+                if contrib is None:
+                    continue
+                month, category, spots, registered = contrib
+                delta = deltas.setdefault((month, category), [0, 0, 0])
+                delta[0] += sign
+                delta[1] += sign * spots
+                delta[2] += sign * registered
+
+        for (month, category), (d_count, d_spots, d_registered) in deltas.items():
+            increment_row(
+                db, CourseMonthSummary,
+                keys={"month": month, "category": category},
+                deltas={
+                    "course_count": d_count,
+                    "total_spots": d_spots,
+                    "registered": d_registered,
+                }
+            )
+
+    @staticmethod
+    def get_range(db: Session, date_from: date, date_to: date) -> "OrderedDict[date, List[Course]]":
+        """取得日期區間內的課程，依日期分組（使用 date, start_time 索引做範圍掃描）"""
+        courses = db.query(Course).options(
+            selectinload(Course.instructor)
+        ).filter(
+            Course.date >= date_from,
+            Course.date <= date_to
+        ).order_by(Course.date, Course.start_time).all()
+
+        days: "OrderedDict[date, List[Course]]" = OrderedDict()
+        for course in courses:
+            days.setdefault(course.date, []).append(course)
+        return days
+
+    @staticmethod
+    def get_month_summaries(
+        db: Session,
+        from_month: str,
+        to_month: str
+    ) -> List[CourseMonthSummary]:
+        """取得每月摘要（依月份、類別排序）"""
+        return db.query(CourseMonthSummary).filter(
+            CourseMonthSummary.month >= from_month,
+            CourseMonthSummary.month <= to_month,
+            CourseMonthSummary.course_count > 0
+        ).order_by(CourseMonthSummary.month, CourseMonthSummary.category).all()
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """以分組查詢重新計算所有每月摘要，回傳摘要筆數"""
+        month = func.strftime("%Y-%m", Course.date) if db.bind.dialect.name == "sqlite" \
+            else func.to_char(Course.date, "YYYY-MM")
+        rows = db.query(
+            month.label("month"),
+            Course.category,
+            func.count(Course.id),
+            func.coalesce(func.sum(Course.max_spots), 0),
+            func.coalesce(func.sum(Course.current_registrations), 0)
+        ).filter(
+            Course.status != CourseStatus.CANCELLED
+        ).group_by(month, Course.category).all()
+
+        totals: Dict[Tuple[str, CourseCategory], List[int]] = {}
+        for month_key, category, count, spots, registered in rows:
+            total = totals.setdefault((month_key, category or CourseCategory.OTHER), [0, 0, 0])
+            total[0] += count
+            total[1] += spots
+            total[2] += registered
+
+        db.query(CourseMonthSummary).delete()
+        for (month_key, category), (count, spots, registered) in totals.items():
+            db.add(CourseMonthSummary(
+                month=month_key,
+                category=category,
+                course_count=count,
+                total_spots=spots,
+                registered=registered
+            ))
+        db.commit()
+        return len(totals)
+
+    @staticmethod
+    def ensure_built(db: Session) -> None:
+        """摘要表為空但已有課程時（例如既有資料庫或 init_data 直接寫入），重新計算一次"""
+        if db.query(CourseMonthSummary).first() is None and db.query(Course.id).first() is not None:
+            CalendarService.rebuild(db)
@@ -0,0 +1,317 @@
+"""
+公開目錄的靜態快照
+
+大部分流量是匿名讀取相同的課程、講師、活動與 FAQ。設定 CATALOG_PUBLISH_DIR 後，資料有異動時
+（以增量同步的異動序號判斷，經過 debounce）把公開目錄輸出成靜態 JSON 檔案，由 nginx 或 CDN
+直接提供，Python 應用程式只需處理寫入與個人化的讀取（例如依 email 查詢報名）：
+
+    <CATALOG_PUBLISH_DIR>/
+        v/<版本>/courses.json、instructors.json、activities.json、faqs.json、home.json、manifest.json
+                 （各檔案另有預先壓縮的 .gz 與 .br，內容不再變動，可長期快取）
+        latest -> v/<版本>       目前版本的符號連結
+        latest.json              目前版本的 manifest（版本、異動序號、各檔案路徑與雜湊）
+
+- 每個版本先寫入暫存目錄再改名，latest 與 latest.json 以 rename 原子替換，讀取端不會看到寫到一半的檔案
+- 發布前讀取已提交的異動序號（manifest 的 seq），用戶端可從快照開始，再以 /changes?since=<seq> 取得之後的異動
+- 連續寫入時等到 CATALOG_PUBLISH_DEBOUNCE_SECONDS 秒內沒有新異動才發布，但最多延遲
+  CATALOG_PUBLISH_MAX_DELAY_SECONDS 秒；其他 worker 的寫入同樣由異動序號發現
+- 同一台主機的多個 worker 以檔案鎖輪流發布，已發布的序號不會重複輸出；
+  保留最近 CATALOG_PUBLISH_KEEP_VERSIONS 個版本，讓正在下載舊版本的用戶端不會讀到 404
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import desc
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.compression import compress_variants
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import Activity, Course, FAQ, Instructor
+from app.schemas import schemas
+from app.services.change_feed import ChangeFeedService
+from app.services.home_service import HomeSnapshotCache
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台只能由單一程序發布
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = "v"
+LATEST_LINK = "latest"
+LATEST_MANIFEST = "latest.json"
+LOCK_FILE = ".publish.lock"
+
+# 壓縮版本的副檔名
+_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def _dump(schema, items) -> bytes:
+    """以回應 Schema 序列化 ORM 物件列表"""
+    adapter = TypeAdapter(List[schema])
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+
+
+def _write(path: Path, body: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_with_variants(path: Path, body: bytes) -> None:
+    """寫入檔案與預先壓縮的版本（內容太小不壓縮時移除舊的壓縮檔，避免伺服器送出過期內容）"""
+    variants = compress_variants(body)
+    for encoding, suffix in _SUFFIXES.items():
+        variant = path.with_name(path.name + suffix)
+        if encoding in variants:
+            _write(variant, variants[encoding])
+        else:
+            variant.unlink(missing_ok=True)
+    _write(path, body)
+
+
+def _replace_with_variants(path: Path, body: bytes) -> None:
+    """以 rename 原子替換檔案與其壓縮版本（先替換壓縮檔，任何時刻讀到的都是完整的舊版或新版）"""
+    variants = compress_variants(body)
+    for encoding, suffix in _SUFFIXES.items():
+        variant = path.with_name(path.name + suffix)
+        if encoding in variants:
+            tmp = variant.with_name(f".{variant.name}.{os.getpid()}.tmp")
+            _write(tmp, variants[encoding])
+            os.replace(tmp, variant)
+        else:
+            variant.unlink(missing_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    _write(tmp, body)
+    os.replace(tmp, path)
+
+
+class CatalogPublisher:
+    """公開目錄的靜態快照發布器，由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        # 已發布（或確認不需發布）的異動序號
+        self.published_seq: Optional[int] = None
+        self.published_version: Optional[str] = None
+        self.last_published_at: Optional[datetime] = None
+        self.last_duration_seconds: Optional[float] = None
+        self.publishes = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def root(self) -> Optional[Path]:
+        return Path(settings.CATALOG_PUBLISH_DIR) if settings.CATALOG_PUBLISH_DIR else None
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作（未設定 CATALOG_PUBLISH_DIR 時不啟動）"""
+        if self._task is not None or self.root is None:
+            return
+        self._task = asyncio.create_task(self._run(), name="catalog-publisher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        # 上次看到的異動序號，與第一次看到尚未發布的異動的時間
+        seen, pending_since = None, None
+        while True:
+            try:
+                head = await asyncio.to_thread(self._settled_head)
+                if self.published_seq is None:
+                    self.published_seq = await asyncio.to_thread(self.read_published_seq)
+                if self.published_seq is not None and head <= self.published_seq:
+                    pending_since = None
+                else:
+                    now = time.monotonic()
+                    pending_since = pending_since or now
+                    # debounce：兩次檢查之間沒有新異動，或已等待太久
+                    if head == seen or now - pending_since >= settings.CATALOG_PUBLISH_MAX_DELAY_SECONDS:
+                        await asyncio.to_thread(self.publish)
+                        pending_since = None
+                seen = head
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                logger.exception("發布靜態目錄失敗")
+            await asyncio.sleep(settings.CATALOG_PUBLISH_DEBOUNCE_SECONDS)
+
+    @staticmethod
+    def _settled_head() -> int:
+        db = SessionLocal()
+        try:
+            return ChangeFeedService.settled_head(db)
+        finally:
+            db.close()
+
+    # ---------- 發布（在 thread 中執行） ----------
+
+    def read_published_seq(self) -> Optional[int]:
+        """目前 latest.json 的異動序號（尚未發布過時為 None）"""
+        try:
+            manifest = json.loads((self.root / LATEST_MANIFEST).read_bytes())
+        except (OSError, ValueError):
+            return None
+        return manifest.get("seq")
+
+    @contextmanager
+    def _locked(self):
+        """同一台主機的 worker 之間一次只有一個發布"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(self.root / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def render(db: Session) -> Dict[str, bytes]:
+        """輸出公開目錄的各個檔案（內容與對應的 GET 端點相同）"""
+        courses = db.query(Course).options(selectinload(Course.instructor)).order_by(
+            desc(Course.date), Course.id
+        ).all()
+        instructors = db.query(Instructor).order_by(Instructor.id).all()
+        activities = db.query(Activity).order_by(desc(Activity.date), Activity.id).all()
+        faqs = db.query(FAQ).order_by(FAQ.order, FAQ.created_at).all()
+        return {
+            "courses.json": _dump(schemas.Course, courses),
+            "instructors.json": _dump(schemas.Instructor, instructors),
+            "activities.json": _dump(schemas.Activity, activities),
+            "faqs.json": _dump(schemas.FAQ, faqs),
+            "home.json": HomeSnapshotCache.build().body,
+        }
+
+    def publish(self, force: bool = False) -> Optional[str]:
+        """
+        輸出新版本並切換 latest，回傳版本名稱
+
+        已發布的序號不小於目前的異動序號時不輸出（force 時仍輸出）
+        """
+        root = self.root
+        if root is None:
+            raise RuntimeError("未設定 CATALOG_PUBLISH_DIR")
+
+        with self._locked():
+            started = time.monotonic()
+            db = SessionLocal()
+            try:
+                # 先取得序號再讀取資料：快照至少包含此序號之前的所有異動
+                seq = ChangeFeedService.settled_head(db)
+                published = self.read_published_seq()
+                if not force and published is not None and seq <= published:
+                    self.published_seq = published
+                    return None
+                files = self.render(db)
+            finally:
+                db.close()
+
+            digest = hashlib.sha256()
+            for name in sorted(files):
+                digest.update(name.encode())
+                digest.update(files[name])
+            version = f"{seq}-{digest.hexdigest()[:12]}"
+            versions = root / VERSIONS_DIR
+            versions.mkdir(exist_ok=True)
+            target = versions / version
+            if not target.exists():
+                tmp = versions / f".tmp-{version}-{os.getpid()}"
+                shutil.rmtree(tmp, ignore_errors=True)
+                tmp.mkdir()
+                manifest = {
+                    "version": version,
+                    "seq": seq,
+                    "generated_at": datetime.utcnow().isoformat() + "Z",
+                    "files": {
+                        name: {
+                            "path": f"{VERSIONS_DIR}/{version}/{name}",
+                            "size": len(body),
+                            "sha256": hashlib.sha256(body).hexdigest(),
+                        }
+                        for name, body in files.items()
+                    },
+                }
+                for name, body in files.items():
+                    _write_with_variants(tmp / name, body)
+                manifest_body = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+                _write_with_variants(tmp / "manifest.json", manifest_body)
+                os.rename(tmp, target)
+            else:
+                manifest_body = (target / "manifest.json").read_bytes()
+
+            # 切換 latest：先建立新的符號連結再以 rename 覆蓋
+            link_tmp = root / f".{LATEST_LINK}.{os.getpid()}.tmp"
+            link_tmp.unlink(missing_ok=True)
+            os.symlink(f"{VERSIONS_DIR}/{version}", link_tmp, target_is_directory=True)
+            os.replace(link_tmp, root / LATEST_LINK)
+            _replace_with_variants(root / LATEST_MANIFEST, manifest_body)
+
+            self._prune(versions, keep=version)
+
+        self.published_seq = seq
+        self.published_version = version
+        self.last_published_at = datetime.utcnow()
+        self.last_duration_seconds = round(time.monotonic() - started, 3)
+        self.publishes += 1
+        logger.info("已發布靜態目錄 %s（%.3f 秒）", version, self.last_duration_seconds)
+        return version
+
+    @staticmethod
+    def _prune(versions: Path, keep: str) -> List[str]:
+        """只保留最近 CATALOG_PUBLISH_KEEP_VERSIONS 個版本（不會刪除目前的版本）"""
+        existing = sorted(
+            (path for path in versions.iterdir() if path.is_dir() and not path.name.startswith(".")),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True
+        )
+        removed = []
+        for path in existing[max(settings.CATALOG_PUBLISH_KEEP_VERSIONS, 1):]:
+            if path.name != keep:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path.name)
+        return removed
+
+    def status(self) -> dict:
+        """發布狀態（供監控使用）"""
+        return {
+            "enabled": self.root is not None,
+            "running": self._task is not None,
+            "directory": str(self.root) if self.root else None,
+            "published_seq": self.published_seq,
+            "published_version": self.published_version,
+            "last_published_at": self.last_published_at,
+            "last_duration_seconds": self.last_duration_seconds,
+            "publishes": self.publishes,
+            "last_error": self.last_error,
+        }
+
+
+catalog_publisher = CatalogPublisher()
@@ -0,0 +1,433 @@
+"""
+增量同步的異動紀錄（/changes）
+
+前端與行動版保存課程、講師、活動與 FAQ 的本機副本，以 /changes?since=<序號> 只取得之後的異動：
+
+- 服務層的新增、更新與刪除（包含報名造成的名額變動、狀態排程、名額核對與封存）以
+  record_changes() 在交易中登記異動的資料，commit 前以一個多列 INSERT 寫入 change_log；
+  資料表遞增的 ID 就是異動序號
+- 讀取時依序號取出一批紀錄，同一筆資料只回傳最後一次異動：仍存在的資料附上目前的內容（upsert），
+  已刪除的資料回傳 tombstone（delete）。序號出現空缺且之後的紀錄還很新時（較早的交易可能尚未提交），
+  停在空缺前，用戶端不會跳過較晚提交的異動
+- 沒有新異動時可長輪詢：本 worker 的寫入 commit 後立即喚醒等待中的請求；其他 worker 的寫入
+  由每 CHANGES_POLL_SECONDS 秒一次的序號查詢發現（不論等待中的請求有多少都只查一次）
+- 壓縮：被同一筆資料較新紀錄取代的紀錄會刪除，紀錄數只與資料筆數成正比，since=0 即可取得完整資料；
+  超過 CHANGES_TOMBSTONE_RETENTION_DAYS 天的 tombstone 也會刪除並記錄清除到的序號，
+  同步位置早於此序號的用戶端會收到 reset，需重新下載完整資料
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session, aliased, selectinload
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import (
+    Activity, ChangeLogEntry, ChangeLogHorizon, Course, FAQ, Instructor
+)
+from app.schemas import schemas
+
+logger = logging.getLogger(__name__)
+
+# 資料種類
+ENTITY_COURSE = "course"
+ENTITY_INSTRUCTOR = "instructor"
+ENTITY_ACTIVITY = "activity"
+ENTITY_FAQ = "faq"
+
+# 異動類型
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+
+# 資料種類 -> (模型, 回應 Schema)
+ENTITIES = {
+    ENTITY_COURSE: (Course, schemas.Course),
+    ENTITY_INSTRUCTOR: (Instructor, schemas.Instructor),
+    ENTITY_ACTIVITY: (Activity, schemas.Activity),
+    ENTITY_FAQ: (FAQ, schemas.FAQ),
+}
+
+# 每次查詢的資料筆數上限
+LOAD_CHUNK_SIZE = 500
+# change_log_horizon 唯一一列的 ID
+HORIZON_ID = 1
+
+
+def record_changes(db: Session, entity: str, ids: Iterable[int], op: str = OP_UPSERT) -> None:
+    """
+    登記異動的資料（不會 commit）
+
+    同一個交易中同一筆資料只寫入一筆紀錄（以最後一次登記的異動類型為準）；
+    新增的資料需先 flush 取得 ID
+    """
+    staged = db.info.setdefault("change_feed", {})
+    for entity_id in ids:
+        key = (entity, entity_id)
+        # 重新插入讓紀錄依最後一次登記的順序寫入
+        staged.pop(key, None)
+        staged[key] = op
+
+
+class ChangeFeedService:
+    """增量同步服務類別"""
+
+    @staticmethod
+    def head(db: Session) -> int:
+        """目前最新的異動序號"""
+        return db.scalar(select(func.max(ChangeLogEntry.id))) or 0
+
+    @staticmethod
+    def settled_head(db: Session, window: int = 1000) -> int:
+        """
+        之前的交易都已提交（或已視為 rollback）的最新序號
+
+        只檢查最新的 window 筆紀錄：序號空缺且之後的紀錄還很新時停在空缺前，與 read() 相同
+        """
+        rows = db.execute(
+            select(ChangeLogEntry.id, ChangeLogEntry.created_at)
+            .order_by(ChangeLogEntry.id.desc())
+            .limit(window)
+        ).all()
+        if not rows:
+            return 0
+        settled_before = datetime.utcnow() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+        rows.reverse()
+        last = rows[0].id
+        for row in rows[1:]:
+            if row.id != last + 1 and row.created_at > settled_before:
+                break
+            last = row.id
+        return last
+
+    @staticmethod
+    def horizon(db: Session) -> int:
+        """已清除的 tombstone 中最大的序號"""
+        return db.scalar(
+            select(ChangeLogHorizon.pruned_through).where(ChangeLogHorizon.id == HORIZON_ID)
+        ) or 0
+
+    @staticmethod
+    def read(
+        db: Session,
+        since: int,
+        limit: int,
+        entities: Optional[Set[str]] = None
+    ) -> Tuple[schemas.ChangeFeed, Optional[float]]:
+        """
+        讀取序號大於 since 的一頁異動
+
+        回傳 (異動, 需等待較早交易提交的秒數)；entities 只回傳指定種類的資料
+        （序號仍會前進到本頁最後一筆紀錄）
+        """
+        head = ChangeFeedService.head(db)
+        if since > head or 0 < since < ChangeFeedService.horizon(db):
+            return schemas.ChangeFeed(next=head, reset=True, changes=[]), None
+
+        rows = db.execute(
+            select(ChangeLogEntry.id, ChangeLogEntry.entity, ChangeLogEntry.entity_id,
+                   ChangeLogEntry.op, ChangeLogEntry.created_at)
+            .where(ChangeLogEntry.id > since)
+            .order_by(ChangeLogEntry.id)
+            .limit(limit)
+        ).all()
+
+        settled_before = datetime.utcnow() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+        latest: "OrderedDict[Tuple[str, int], Tuple[int, str]]" = OrderedDict()
+        last, wait = since, None
+        for row in rows:
+            # 序號空缺且之後的紀錄還很新：較早的交易可能尚未提交，先停在空缺前
+            if row.id != last + 1 and row.created_at > settled_before:
+                wait = (row.created_at - settled_before).total_seconds()
+                break
+            last = row.id
+            if entities and row.entity not in entities:
+                continue
+            key = (row.entity, row.entity_id)
+            latest.pop(key, None)
+            latest[key] = (row.id, row.op)
+
+        data = ChangeFeedService._load(db, [
+            key for key, (_, op) in latest.items() if op == OP_UPSERT
+        ])
+        changes = []
+        for (entity, entity_id), (seq, op) in latest.items():
+            item = data.get((entity, entity_id)) if op == OP_UPSERT else None
+            # 之後才刪除的資料（tombstone 在下一頁）先以 tombstone 回傳
+            changes.append(schemas.ChangeRecord(
+                seq=seq, entity=entity, id=entity_id,
+                op=OP_UPSERT if item is not None else OP_DELETE, data=item
+            ))
+        return schemas.ChangeFeed(
+            next=last,
+            has_more=wait is None and len(rows) >= limit,
+            changes=changes,
+        ), wait
+
+    @staticmethod
+    def _load(db: Session, keys: List[Tuple[str, int]]) -> Dict[Tuple[str, int], dict]:
+        """依種類批次讀取資料目前的內容，以回應 Schema 序列化"""
+        by_entity: Dict[str, List[int]] = {}
+        for entity, entity_id in keys:
+            by_entity.setdefault(entity, []).append(entity_id)
+
+        data = {}
+        for entity, ids in by_entity.items():
+            model, schema = ENTITIES[entity]
+            query = db.query(model)
+            if model is Course:
+                query = query.options(selectinload(Course.instructor))
+            for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+                for obj in query.filter(model.id.in_(ids[start:start + LOAD_CHUNK_SIZE])):
+                    data[(entity, obj.id)] = schema.model_validate(obj).model_dump(mode="json")
+        return data
+
+    @staticmethod
+    def ensure_built(db: Session) -> int:
+        """
+        異動紀錄為空（新建立的資料表）時為所有現有資料寫入 upsert 紀錄，回傳寫入筆數
+
+        讓 since=0 的完整同步也包含啟用增量同步之前建立的資料
+        """
+        if db.scalar(select(ChangeLogEntry.id).limit(1)) is not None \
+                or ChangeFeedService.horizon(db):
+            return 0
+        now = datetime.utcnow()
+        written = 0
+        for entity, (model, _) in ENTITIES.items():
+            written += db.execute(
+                insert(ChangeLogEntry).from_select(
+                    ["entity", "entity_id", "op", "created_at"],
+                    select(literal(entity), model.id, literal(OP_UPSERT), literal(now))
+                    .order_by(model.id)
+                )
+            ).rowcount
+        db.commit()
+        return written
+
+    @staticmethod
+    def compact(db: Session) -> Dict[str, int]:
+        """
+        壓縮異動紀錄（會 commit）
+
+        - 刪除被同一筆資料較新紀錄取代、且超過 CHANGES_COMPACT_AFTER_SECONDS 秒的紀錄
+        - 刪除超過 CHANGES_TOMBSTONE_RETENTION_DAYS 天的 tombstone，並推進清除範圍
+          （最新的一筆紀錄不會刪除，SQLite 才不會重複使用序號）
+        """
+        now = datetime.utcnow()
+        newer = aliased(ChangeLogEntry)
+        superseded = db.execute(
+            delete(ChangeLogEntry)
+            .where(
+                ChangeLogEntry.created_at < now - timedelta(seconds=settings.CHANGES_COMPACT_AFTER_SECONDS),
+                exists().where(
+                    newer.entity == ChangeLogEntry.entity,
+                    newer.entity_id == ChangeLogEntry.entity_id,
+                    newer.id > ChangeLogEntry.id
+                )
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        head = ChangeFeedService.head(db)
+        expired = (
+            ChangeLogEntry.op == OP_DELETE,
+            ChangeLogEntry.created_at < now - timedelta(days=settings.CHANGES_TOMBSTONE_RETENTION_DAYS),
+            ChangeLogEntry.id < head,
+        )
+        pruned_through = db.scalar(select(func.max(ChangeLogEntry.id)).where(*expired))
+        tombstones = 0
+        if pruned_through:
+            tombstones = db.execute(
+                delete(ChangeLogEntry).where(*expired)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            advanced = db.execute(
+                update(ChangeLogHorizon)
+                .where(
+                    ChangeLogHorizon.id == HORIZON_ID,
+                    ChangeLogHorizon.pruned_through < pruned_through
+                )
+                .values(pruned_through=pruned_through, updated_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not advanced and db.get(ChangeLogHorizon, HORIZON_ID) is None:
+                db.add(ChangeLogHorizon(id=HORIZON_ID, pruned_through=pruned_through, updated_at=now))
+        db.commit()
+        if superseded or tombstones:
+            logger.info("異動紀錄壓縮：刪除 %d 筆被取代的紀錄、%d 筆過期的 tombstone", superseded, tombstones)
+        return {"superseded": superseded, "tombstones": tombstones}
+
+    @staticmethod
+    def get_status(db: Session) -> dict:
+        """異動紀錄的序號範圍與筆數"""
+        return {
+            "head": ChangeFeedService.head(db),
+            "horizon": ChangeFeedService.horizon(db),
+            "entries": db.scalar(select(func.count(ChangeLogEntry.id))),
+            "tombstones": db.scalar(
+                select(func.count(ChangeLogEntry.id)).where(ChangeLogEntry.op == OP_DELETE)
+            ),
+        }
+
+
+class ChangeWatcher:
+    """長輪詢的喚醒（每個 worker 一份），由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._head = 0
+        self.waiters = 0
+        self.wakeups = 0
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="change-watcher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+
+    # ---------- 喚醒 ----------
+
+    def notify(self) -> None:
+        """有新的異動已提交（可在任何執行緒呼叫）"""
+        if self._loop is None or not self.waiters:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:  # 事件迴圈已關閉
+            pass
+
+    def _wake(self) -> None:
+        self._event.set()
+        self._event = asyncio.Event()
+        self.wakeups += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CHANGES_POLL_SECONDS)
+            if not self.waiters:
+                continue
+            # 其他 worker 寫入的異動：一次查詢最新序號，有變化時喚醒所有等待中的請求
+            try:
+                head = await asyncio.to_thread(self._load_head)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("讀取異動序號失敗")
+                continue
+            if head != self._head:
+                self._head = head
+                self._wake()
+
+    @staticmethod
+    def _load_head() -> int:
+        db = SessionLocal()
+        try:
+            return ChangeFeedService.head(db)
+        finally:
+            db.close()
+
+    # ---------- 讀取 ----------
+
+    @staticmethod
+    def _read(since: int, limit: int, entities: Optional[Set[str]]):
+        db = SessionLocal()
+        try:
+            return ChangeFeedService.read(db, since, limit, entities)
+        finally:
+            db.close()
+
+    async def poll(
+        self,
+        since: int,
+        limit: int,
+        entities: Optional[Set[str]] = None,
+        wait: float = 0
+    ) -> schemas.ChangeFeed:
+        """
+        讀取異動；沒有新的紀錄時最多等待 wait 秒
+
+        背景工作未啟動（例如測試或未經 lifespan）時只以 CHANGES_POLL_SECONDS 的間隔重新讀取
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        # 讀取前就計入等待中的請求，讀取期間提交的異動也會喚醒
+        self.waiters += 1
+        try:
+            while True:
+                wakeup = self._event
+                feed, settle = await asyncio.to_thread(self._read, since, limit, entities)
+                remaining = deadline - loop.time()
+                if feed.changes or feed.reset or feed.next != since or remaining <= 0:
+                    return feed
+                timeout = min(remaining, settle) if settle is not None else remaining
+                if wakeup is None:
+                    await asyncio.sleep(min(timeout, settings.CHANGES_POLL_SECONDS))
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=max(timeout, 0.05))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.waiters -= 1
+
+    def status(self) -> dict:
+        """長輪詢狀態（供監控使用）"""
+        return {
+            "running": self._task is not None,
+            "waiters": self.waiters,
+            "wakeups": self.wakeups,
+        }
+
+
+change_watcher = ChangeWatcher()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _write_staged_changes(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # SAVEPOINT 的釋放也會觸發，等到最外層的交易 commit 時才寫入
+    staged = session.info.pop("change_feed", None)
+    if not staged:
+        return
+    now = datetime.utcnow()
+    session.execute(insert(ChangeLogEntry), [
+        {"entity": entity, "entity_id": entity_id, "op": op, "created_at": now}
+        for (entity, entity_id), op in staged.items()
+    ])
+    session.info["change_feed_written"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction() and session.info.pop("change_feed_written", None):
+        change_watcher.notify()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # SAVEPOINT 回復（例如統計 upsert 的重試）不影響外層交易已登記的變更
+    session.info.pop("change_feed", None)
+    session.info.pop("change_feed_written", None)
@@ -1,9 +1,36 @@
-from typing import List, Optional
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import desc, update, case, and_, literal
 
 from app.models.models import Course, CourseStatus
 from app.schemas.schemas import CourseCreate, CourseUpdate
+from app.services.search_index import suggestion_index, publish_change, KIND_COURSE
+from app.services.seat_stream import publish_seats
+from app.services.change_feed import record_changes, ENTITY_COURSE, OP_DELETE
+from app.services.calendar_service import CalendarService
+from app.services.scheduler import lifecycle_scheduler
+from app.services.stats_service import StatsService
+from app.services import outbox
+from app.services.outbox import OutboxService
+from app.services.projection import course_projection
+from app.services.versioning import check_version, retry_on_conflict
+
+# 計算每月摘要貢獻所需的欄位
+_CALENDAR_COLUMNS = (
+    Course.id, Course.date, Course.category, Course.max_spots,
+    Course.status, Course.current_registrations
+)
+
+
+class SeatsUnavailable(Exception):
+    """課程剩餘名額不足（例如候補轉正取時名額已被其他報名佔用）"""
+
+    def __init__(self, course_id: int):
+        super().__init__("課程名額不足")
+        self.course_id = course_id
 
 
 class CourseService:
@@ -14,28 +41,68 @@ class CourseService:
         """取得單一課程"""
         return db.query(Course).filter(Course.id == course_id).first()
     
+    @staticmethod
+    def filters(
+        status: Optional[CourseStatus] = None,
+        category: Optional[str] = None,
+        has_spots: Optional[bool] = None,
+        min_spots: Optional[int] = None
+    ) -> list:
+        """課程列表篩選條件的 WHERE 子句（列表與篩選計數共用）"""
+        conditions = []
+        if status:
+            conditions.append(Course.status == status)
+        if category:
+            conditions.append(Course.category == category)
+        if has_spots is False:
+            conditions.append(Course.available_spots <= 0)
+        lowest = max(min_spots or 0, 1 if has_spots else 0)
+        if lowest:
+            conditions.append(Course.available_spots >= lowest)
+        return conditions
+    
     @staticmethod
     def get_multi(
         db: Session,
         skip: int = 0,
         limit: int = 100,
         status: Optional[CourseStatus] = None,
-        category: Optional[str] = None
+        category: Optional[str] = None,
+        ids: Optional[List[int]] = None,
+        fields: Optional[List[str]] = None,
+        has_spots: Optional[bool] = None,
+        min_spots: Optional[int] = None,
+        sort: str = "date"
     ) -> List[Course]:
-        """取得課程列表"""
-        query = db.query(Course)
+        """
+        取得課程列表（ids：只取指定的課程；fields：只載入指定的欄位）
         
-        if status:
-            query = query.filter(Course.status == status)
-        if category:
-            query = query.filter(Course.category == category)
+        - **has_spots**: True 只取還有名額的課程，False 只取沒有名額的課程
+        - **min_spots**: 剩餘名額至少幾個
+        - **sort**: date（日期新到舊）或 spots（剩餘名額多到少）
         
-        return query.order_by(desc(Course.date)).offset(skip).limit(limit).all()
+        剩餘名額是資料庫儲存的欄位，篩選與排序都由 (status, available_spots, date) 索引處理
+        """
+        query = db.query(Course).options(*course_projection.query_options(fields))
+        
+        if ids:
+            query = query.filter(Course.id.in_(ids))
+        query = query.filter(*CourseService.filters(status, category, has_spots, min_spots))
+        
+        if sort == "spots":
+            query = query.order_by(desc(Course.available_spots), desc(Course.date))
+        else:
+            query = query.order_by(desc(Course.date))
+        return query.offset(skip).limit(limit).all()
     
     @staticmethod
-    def get_upcoming(db: Session, limit: int = 10) -> List[Course]:
+    def get_upcoming(
+        db: Session,
+        limit: int = 10,
+        fields: Optional[List[str]] = None
+    ) -> List[Course]:
         """取得即將開始的課程"""
-        return db.query(Course).filter(
+        return db.query(Course).options(*course_projection.query_options(fields)).filter(
             Course.status.in_([CourseStatus.UPCOMING, CourseStatus.ONGOING])
         ).order_by(Course.date).limit(limit).all()
     
@@ -44,72 +111,220 @@ class CourseService:
         """建立課程"""
         course = Course(**course_in.model_dump())
         db.add(course)
+        CalendarService.apply(db, None, CalendarService.contribution(course))
+        StatsService.course_added(db)
+        db.flush()
+        OutboxService.record(db, outbox.COURSE_CREATED, course.id, {"status": course.status.name})
+        record_changes(db, ENTITY_COURSE, [course.id])
+        lifecycle_scheduler.notify(db)
         db.commit()
-        db.refresh(course)
+        suggestion_index.index_course(course)
         return course
     
     @staticmethod
-    def update(db: Session, course_id: int, course_in: CourseUpdate) -> Optional[Course]:
-        """更新課程"""
+    @retry_on_conflict
+    def update(
+        db: Session,
+        course_id: int,
+        course_in: CourseUpdate,
+        expected_version: Optional[int] = None
+    ) -> Optional[Course]:
+        """
+        更新課程
+        
+        - **expected_version**: If-Match 指定的版本號，與目前版本不同時引發 VersionConflict
+        """
         course = db.query(Course).filter(Course.id == course_id).first()
         if not course:
             return None
+        check_version(course, expected_version)
         
+        before = CalendarService.contribution(course)
+        old_category = course.category
         update_data = course_in.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(course, field, value)
+        CalendarService.apply(db, before, CalendarService.contribution(course))
+        StatsService.course_category_changed(db, course.id, old_category, course.category)
+        OutboxService.record(db, outbox.COURSE_UPDATED, course.id, {
+            "fields": sorted(update_data), "status": course.status.name
+        })
+        publish_seats(db, [course.id])
+        record_changes(db, ENTITY_COURSE, [course.id])
+        lifecycle_scheduler.notify(db)
         
         db.commit()
-        db.refresh(course)
+        suggestion_index.index_course(course)
         return course
     
     @staticmethod
+    @retry_on_conflict
     def delete(db: Session, course_id: int) -> bool:
-        """刪除課程"""
+        """
+        刪除課程
+        
+        報名記錄由資料庫的 ON DELETE CASCADE 刪除，不會載入記憶體；統計以分組查詢扣除。
+        刪除時比對版本號，期間有新的報名（名額變動）時重新讀取後再刪除
+        """
         course = db.query(Course).filter(Course.id == course_id).first()
         if not course:
             return False
         
+        CalendarService.apply(db, CalendarService.contribution(course), None)
+        registrations = StatsService.course_removed(db, course_id, course.category)
+        OutboxService.record(db, outbox.COURSE_DELETED, course_id, {"registrations": registrations})
+        publish_seats(db, [course_id])
+        record_changes(db, ENTITY_COURSE, [course_id], OP_DELETE)
         db.delete(course)
         db.commit()
+        suggestion_index.remove_course(course_id)
         return True
     
     @staticmethod
-    def increment_registration(db: Session, course_id: int) -> Optional[Course]:
-        """增加報名人數"""
-        course = db.query(Course).filter(Course.id == course_id).first()
-        if not course:
+    def _seat_values(delta) -> dict:
+        """以 delta（數字或 SQL 運算式）加減報名人數並重新判斷是否額滿的 UPDATE 欄位"""
+        new_count = case(
+            (Course.current_registrations + delta < 0, 0),
+            else_=Course.current_registrations + delta
+        )
+        return {
+            "current_registrations": new_count,
+            "version": Course.version + 1,
+            "status": case(
+                # 額滿，或原本額滿、現在有名額了
+                (and_(Course.status.in_([CourseStatus.UPCOMING, CourseStatus.ONGOING]),
+                      new_count >= Course.max_spots), literal(CourseStatus.FULL, Course.status.type)),
+                (and_(Course.status == CourseStatus.FULL,
+                      new_count < Course.max_spots), literal(CourseStatus.ONGOING, Course.status.type)),
+                else_=Course.status
+            ),
+        }
+    
+    @staticmethod
+    def adjust_registrations(db: Session, course_id: int, delta: int) -> Optional[Course]:
+        """
+        調整報名人數並重新判斷是否額滿（不 commit，由呼叫端在同一個交易中提交）
+        
+        以單一 UPDATE 在資料庫端加減，不會覆蓋並行交易的變動；新的人數與狀態以 RETURNING 取回。
+        增加人數時 UPDATE 附帶剩餘名額的條件，名額不足（包含並行的報名先佔用）時不更新並回傳 None
+        """
+        course = db.get(Course, course_id)
+        if not course or not delta:
+            return course
+        
+        statement = update(Course).where(Course.id == course_id)
+        if delta > 0:
+            # 以資料庫中目前的剩餘名額判斷，不依賴先前讀到的人數，並行的報名不會超額
+            statement = statement.where(Course.available_spots >= delta)
+        row = db.execute(
+            statement
+            .values(**CourseService._seat_values(delta))
+            .returning(Course.current_registrations, Course.available_spots, Course.status, Course.version)
+            .execution_options(synchronize_session=False)
+        ).one_or_none()
+        if row is None:
             return None
+        # 異動前的人數以更新後的值推算（先前讀到的值可能已被並行的交易改變）
+        set_committed_value(course, "current_registrations", max(row.current_registrations - delta, 0))
+        before = CalendarService.contribution(course)
+        for key, value in row._mapping.items():
+            set_committed_value(course, key, value)
+        CalendarService.apply(db, before, CalendarService.contribution(course))
+        suggestion_index.set_course_popularity(course.id, course.current_registrations)
+        publish_change(db, KIND_COURSE, course.id)
+        publish_seats(db, [course.id])
+        record_changes(db, ENTITY_COURSE, [course.id])
+        return course
+    
+    @staticmethod
+    def adjust_registrations_many(db: Session, deltas: Dict[int, int]) -> None:
+        """
+        一次調整多門課程的報名人數（課程 ID -> 增減人數），不 commit
+        
+        所有課程以單一 UPDATE 在資料庫端加減（CASE 依課程 ID 取增減值），更新後的值以 RETURNING
+        取回，每月摘要依月份與類別分組更新
+        """
+        deltas = {course_id: delta for course_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
         
-        course.current_registrations += 1
+        ids = sorted(deltas)
+        before = {
+            row.id: CalendarService.contribution(row)
+            for row in db.query(*_CALENDAR_COLUMNS).filter(Course.id.in_(ids))
+        }
+        after = db.execute(
+            update(Course)
+            .where(Course.id.in_(ids))
+            .values(**CourseService._seat_values(case(deltas, value=Course.id, else_=0)))
+            .returning(*_CALENDAR_COLUMNS)
+            .execution_options(synchronize_session=False)
+        ).all()
+        CalendarService.apply_many(
+            db, [(before.get(row.id), CalendarService.contribution(row)) for row in after]
+        )
+        for row in after:
+            suggestion_index.set_course_popularity(row.id, row.current_registrations)
+            publish_change(db, KIND_COURSE, row.id)
+        publish_seats(db, [row.id for row in after])
+        record_changes(db, ENTITY_COURSE, [row.id for row in after])
+    
+    @staticmethod
+    def bulk_set_status(db: Session, course_ids: List[int], status: CourseStatus) -> dict:
+        """
+        整批變更課程狀態（例如一次關閉多門課程的報名）
         
-        # 檢查是否額滿
-        if course.current_registrations >= course.max_spots:
-            course.status = CourseStatus.FULL
+        以單一 UPDATE 變更所有狀態不同的課程，每月摘要與 outbox 事件整批寫入，在同一個交易中提交
+        """
+        rows = db.query(*_CALENDAR_COLUMNS).filter(
+            Course.id.in_(course_ids)
+        ).order_by(Course.id).with_for_update().all()
+        changed = [row for row in rows if row.status != status]
+        ids = [row.id for row in changed]
         
+        if changed:
+            db.execute(
+                update(Course)
+                .where(Course.id.in_(ids))
+                .values(status=status, updated_at=datetime.utcnow(), version=Course.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            CalendarService.apply_many(db, [
+                (CalendarService.contribution(row),
+                 CalendarService.contribution(SimpleNamespace(**{**row._asdict(), "status": status})))
+                for row in changed
+            ])
+            OutboxService.record_many(db, [
+                (outbox.COURSE_UPDATED, row.id, {"fields": ["status"], "status": status.name})
+                for row in changed
+            ])
+            for course_id in ids:
+                publish_change(db, KIND_COURSE, course_id)
+            publish_seats(db, ids)
+            record_changes(db, ENTITY_COURSE, ids)
+            lifecycle_scheduler.notify(db)
+        db.commit()
+        return {"matched": len(rows), "changed": len(ids), "course_ids": ids}
+    
+    @staticmethod
+    def increment_registration(db: Session, course_id: int) -> Optional[Course]:
+        """增加報名人數"""
+        course = CourseService.adjust_registrations(db, course_id, 1)
+        if not course:
+            return None
         db.commit()
-        db.refresh(course)
         return course
     
     @staticmethod
     def decrement_registration(db: Session, course_id: int) -> Optional[Course]:
         """減少報名人數"""
-        course = db.query(Course).filter(Course.id == course_id).first()
+        course = CourseService.adjust_registrations(db, course_id, -1)
         if not course:
             return None
-        
-        if course.current_registrations > 0:
-            course.current_registrations -= 1
-            
-            # 如果原本額滿，現在有名額了
-            if course.status == CourseStatus.FULL:
-                course.status = CourseStatus.ONGOING
-        
         db.commit()
-        db.refresh(course)
         return course
     
     @staticmethod
     def get_count(db: Session) -> int:
-        """取得課程總數"""
-        return db.query(Course).count()
+        """取得課程總數（讀取統計計數）"""
+        return StatsService.get_counter(db, "courses")
@@ -0,0 +1,199 @@
+"""
+報名名冊匯出
+
+以伺服器端游標（yield_per / stream_results）分批讀取，逐批產生 CSV 或 XLSX
+內容交給 StreamingResponse，記憶體用量與匯出筆數無關。
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date
+from typing import Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from app.db.database import SessionLocal
+from app.models.models import Course, Registration, RegistrationStatus
+
+# 每批從資料庫讀取與輸出的筆數
+EXPORT_BATCH_SIZE = 2000
+
+COLUMNS = [
+    "報名ID", "課程ID", "課程名稱", "課程日期", "開始時間",
+    "姓名", "Email", "電話", "人數", "狀態", "備註", "報名時間",
+]
+
+# XML 1.0 不允許的控制字元
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _format_row(row) -> list:
+    return [
+        row.id,
+        row.course_id,
+        row.title,
+        row.date.isoformat() if row.date else "",
+        row.start_time.strftime("%H:%M") if row.start_time else "",
+        row.name,
+        row.email,
+        row.phone,
+        row.participants,
+        row.status.value if row.status else "",
+        row.notes or "",
+        row.created_at.strftime("%Y-%m-%d %H:%M:%S") if row.created_at else "",
+    ]
+
+
+class _ChunkBuffer:
+    """只能寫入的緩衝區，供 zipfile 串流寫入後分段取出"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="報名名冊" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value) -> str:
+    if isinstance(value, int):
+        return f"<c t=\"n\"><v>{value}</v></c>"
+    text = escape(_INVALID_XML_CHARS.sub("", str(value)))
+    return f"<c t=\"inlineStr\"><is><t xml:space=\"preserve\">{text}</t></is></c>"
+
+
+def _xlsx_row(values) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+class RegistrationExportService:
+    """報名名冊匯出服務類別"""
+
+    @staticmethod
+    def build_query(
+        course_id: Optional[int] = None,
+        status: Optional[RegistrationStatus] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None
+    ):
+        """名冊查詢（依課程日期、課程、報名順序排序）"""
+        stmt = select(
+            Registration.id, Registration.course_id, Course.title, Course.date,
+            Course.start_time, Registration.name, Registration.email, Registration.phone,
+            Registration.participants, Registration.status, Registration.notes,
+            Registration.created_at
+        ).join(Course, Course.id == Registration.course_id)
+
+        if course_id:
+            stmt = stmt.where(Registration.course_id == course_id)
+        if status:
+            stmt = stmt.where(Registration.status == status)
+        if date_from:
+            stmt = stmt.where(Course.date >= date_from)
+        if date_to:
+            stmt = stmt.where(Course.date <= date_to)
+        return stmt.order_by(Course.date, Registration.course_id, Registration.id)
+
+    @staticmethod
+    def iter_batches(stmt) -> Iterator[list]:
+        """
+        以伺服器端游標分批讀取
+
+        使用獨立的 session：StreamingResponse 在請求的相依項目結束後才開始讀取
+        """
+        db = SessionLocal()
+        try:
+            result = db.execute(stmt, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+            for rows in result.partitions():
+                yield [_format_row(row) for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def stream_csv(stmt) -> Iterator[bytes]:
+        """產生 CSV（UTF-8 BOM，Excel 可直接開啟中文）"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+        for batch in RegistrationExportService.iter_batches(stmt):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(batch)
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def stream_xlsx(stmt) -> Iterator[bytes]:
+        """
+        產生 XLSX
+
+        以 zipfile 寫入不可 seek 的緩衝區（使用 data descriptor），每批資料列寫入後
+        即取出已壓縮的內容輸出；儲存格使用 inline string，不需要共用字串表。
+        """
+        buffer = _ChunkBuffer()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            for name, content in _XLSX_STATIC_PARTS.items():
+                zf.writestr(name, content)
+            yield buffer.drain()
+
+            with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+                sheet.write((
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    '<sheetData>' + _xlsx_row(COLUMNS)
+                ).encode("utf-8"))
+                for batch in RegistrationExportService.iter_batches(stmt):
+                    sheet.write("".join(_xlsx_row(row) for row in batch).encode("utf-8"))
+                    yield buffer.drain()
+                sheet.write(b"</sheetData></worksheet>")
+        yield buffer.drain()
@@ -0,0 +1,177 @@
+"""
+課程列表的篩選計數（facets）
+
+前端的篩選標籤需要各類別、狀態、月份與地點的課程數。所有計數以一個分組查詢取得：
+PostgreSQL 使用 GROUPING SETS（掃描一次課程資料表），SQLite 以 UNION ALL 合併各維度的分組查詢。
+結果依篩選條件快取在記憶體中；課程有寫入（包含報名造成的名額變動）並提交時整個快取失效，
+其他 worker 經由 cache_sync 收到通知後也會清除。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import String, cast, func, literal, literal_column, select, union_all
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Course, CourseCategory, CourseStatus
+from app.schemas.schemas import CourseFacets, FacetCount
+from app.services.cache_sync import invalidate_on_write
+from app.services.course_service import CourseService
+
+# 快取同步頻道
+FACETS_CHANNEL = "facets"
+
+FACETS = ("category", "status", "month", "location")
+
+FacetKey = Tuple[Optional[CourseStatus], Optional[CourseCategory], Optional[bool], Optional[int]]
+
+
+def _month(db: Session):
+    # 以字面值指定格式，GROUPING SETS 與 SELECT 中的運算式才會完全相同
+    if db.bind.dialect.name == "sqlite":
+        return func.strftime(literal_column("'%Y-%m'"), Course.date)
+    return func.to_char(Course.date, literal_column("'YYYY-MM'"))
+
+
+def _enum_value(enum_cls, value) -> Optional[str]:
+    """資料庫中的列舉（PostgreSQL 為列舉物件，SQLite 為名稱字串）轉為 API 使用的值"""
+    if value is None:
+        return None
+    if not isinstance(value, enum_cls):
+        value = enum_cls[value]
+    return value.value
+
+
+class FacetService:
+    """課程篩選計數服務類別"""
+
+    @staticmethod
+    def _grouped_rows(db: Session, conditions: list) -> List[Tuple[str, object, int]]:
+        """以一個查詢取得各維度的 (維度, 值, 課程數)"""
+        month = _month(db)
+        columns = {
+            "category": Course.category,
+            "status": Course.status,
+            "month": month,
+            "location": Course.location,
+        }
+
+        if db.bind.dialect.name == "postgresql":
+            stmt = select(
+                *(func.grouping(column) for column in columns.values()),
+                *columns.values(),
+                func.count(Course.id)
+            ).where(*conditions).group_by(
+                func.grouping_sets(*columns.values())
+            )
+            rows = []
+            for row in db.execute(stmt):
+                # GROUPING() 為 0 的欄位就是這一列分組的維度
+                index = list(row[:len(FACETS)]).index(0)
+                rows.append((FACETS[index], row[len(FACETS) + index], row[-1]))
+            return rows
+
+        stmt = union_all(*(
+            select(
+                literal(facet).label("facet"),
+                cast(column, String).label("value"),
+                func.count(Course.id).label("count")
+            ).where(*conditions).group_by(column)
+            for facet, column in columns.items()
+        ))
+        return [tuple(row) for row in db.execute(stmt)]
+
+    @staticmethod
+    def compute(
+        db: Session,
+        status: Optional[CourseStatus] = None,
+        category: Optional[CourseCategory] = None,
+        has_spots: Optional[bool] = None,
+        min_spots: Optional[int] = None
+    ) -> CourseFacets:
+        """計算套用篩選條件後各維度的課程數（不使用快取）"""
+        conditions = CourseService.filters(status, category, has_spots, min_spots)
+        counts: Dict[str, List[FacetCount]] = {facet: [] for facet in FACETS}
+        total = 0
+        for facet, value, count in FacetService._grouped_rows(db, conditions):
+            if facet == "category":
+                total += count
+                value = _enum_value(CourseCategory, value)
+            elif facet == "status":
+                value = _enum_value(CourseStatus, value)
+            if value is not None:
+                counts[facet].append(FacetCount(value=str(value), count=count))
+
+        order = {
+            "category": [c.value for c in CourseCategory],
+            "status": [s.value for s in CourseStatus],
+        }
+        for facet, values in order.items():
+            counts[facet].sort(key=lambda f: values.index(f.value))
+        counts["month"].sort(key=lambda f: f.value)
+        counts["location"].sort(key=lambda f: (-f.count, f.value))
+        del counts["location"][settings.FACETS_LOCATION_LIMIT:]
+        return CourseFacets(total=total, **counts)
+
+
+class FacetCache:
+    """依篩選條件快取的課程篩選計數（每個 worker 一份）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[FacetKey, Tuple[CourseFacets, float]]" = OrderedDict()
+        # 每次失效加一；計算期間若有失效，算好的結果不保存
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        """讓所有快取的計數失效"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get(
+        self,
+        db: Session,
+        status: Optional[CourseStatus] = None,
+        category: Optional[CourseCategory] = None,
+        has_spots: Optional[bool] = None,
+        min_spots: Optional[int] = None
+    ) -> CourseFacets:
+        """取得篩選計數，沒有快取或已過期時重新計算"""
+        key = (status, category, has_spots, min_spots)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < settings.FACETS_CACHE_TTL_SECONDS:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            generation = self._generation
+            self.misses += 1
+
+        facets = FacetService.compute(db, status, category, has_spots, min_spots)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (facets, now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > settings.FACETS_CACHE_MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+        return facets
+
+    def status(self) -> dict:
+        """快取狀態（供監控使用）"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+course_facets = FacetCache()
+
+invalidate_on_write(FACETS_CHANNEL, (Course,), course_facets.invalidate)
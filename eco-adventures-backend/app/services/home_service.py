@@ -0,0 +1,149 @@
+"""
+首頁資料快照
+
+首頁需要的即將開始課程、講師、活動與 FAQ 在同一個 session 中一次讀取，
+序列化成 JSON 並預先壓縮（brotli、gzip）後保存在記憶體中；課程、講師、活動或 FAQ
+有寫入並提交時快照即失效，下一個請求再重新建立；其他 worker 經由
+cache_sync 收到失效通知後也會清除自己的快照。
+"""
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.compression import compress_variants
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import Course, Instructor, Activity, FAQ
+from app.schemas.schemas import HomeBundle
+from app.services.course_service import CourseService
+from app.services.other_services import InstructorService, ActivityService, FAQService
+from app.services.cache_sync import invalidate_on_write
+
+# 首頁各區塊的筆數
+UPCOMING_COURSES_LIMIT = 10
+INSTRUCTORS_LIMIT = 100
+ACTIVITIES_LIMIT = 12
+FAQS_LIMIT = 100
+
+# 快取同步頻道
+HOME_CHANNEL = "home"
+
+# 異動後會讓快照失效的模型
+_TRACKED_MODELS = (Course, Instructor, Activity, FAQ)
+
+
+@dataclass
+class HomeSnapshot:
+    """一份已序列化的首頁資料"""
+    body: bytes
+    encoded: Dict[str, bytes]  # 編碼 -> 預先壓縮的內容
+    etag: str
+    built_at: float
+
+
+class HomeSnapshotCache:
+    """首頁資料快照（每個 worker 一份）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 同一時間只由一個執行緒建立快照
+        self._build_lock = threading.Lock()
+        self._snapshot: Optional[HomeSnapshot] = None
+        # 每次失效加一；建立期間若有失效，建好的快照不保存
+        self._generation = 0
+        self.builds = 0
+        self.stale_served = 0
+
+    def invalidate(self) -> None:
+        """讓目前的快照失效"""
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    @staticmethod
+    def _fresh(snapshot: Optional[HomeSnapshot]) -> bool:
+        return snapshot is not None and \
+            time.monotonic() - snapshot.built_at < settings.HOME_SNAPSHOT_TTL_SECONDS
+
+    def get(self) -> HomeSnapshot:
+        """
+        取得快照，失效或過期時重新建立
+
+        同一時間只有一個執行緒重建：快照只是過期時，其他執行緒繼續回傳舊的快照；
+        快照已失效（有寫入）時則等待重建完成後直接使用，不各自再讀一次資料庫
+        """
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        if snapshot is not None and not self._build_lock.acquire(blocking=False):
+            self.stale_served += 1
+            return snapshot
+        if snapshot is None:
+            self._build_lock.acquire()
+        try:
+            current = self._snapshot
+            if self._fresh(current):
+                return current  # 等待期間其他執行緒已經建好
+
+            with self._lock:
+                generation = self._generation
+            snapshot = self.build()
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshot = snapshot
+                self.builds += 1
+            return snapshot
+        finally:
+            self._build_lock.release()
+
+    @staticmethod
+    def build() -> HomeSnapshot:
+        """
+        以單一 session 讀取首頁所需的所有資料
+
+        同步 driver 的單一連線不能同時執行多個查詢，因此依序讀取；
+        快照只在失效後重建一次，讀取成本由之後的請求分攤。
+        """
+        db = SessionLocal()
+        try:
+            bundle = HomeBundle(
+                upcoming_courses=CourseService.get_upcoming(db, limit=UPCOMING_COURSES_LIMIT),
+                instructors=InstructorService.get_multi(db, limit=INSTRUCTORS_LIMIT, is_active=True),
+                activities=ActivityService.get_multi(db, limit=ACTIVITIES_LIMIT),
+                faqs=FAQService.get_multi(db, limit=FAQS_LIMIT, is_active=True),
+            )
+        finally:
+            db.close()
+
+        body = bundle.model_dump_json().encode("utf-8")
+        return HomeSnapshot(
+            body=body,
+            encoded=compress_variants(body),
+            etag='"%s"' % hashlib.sha1(body).hexdigest()[:20],
+            built_at=time.monotonic(),
+        )
+
+    def status(self) -> dict:
+        """快照狀態（供監控使用）"""
+        snapshot = self._snapshot
+        return {
+            "cached": snapshot is not None,
+            "age_seconds": round(time.monotonic() - snapshot.built_at, 1) if snapshot else None,
+            "size": len(snapshot.body) if snapshot else None,
+            "encoded_sizes": (
+                {encoding: len(data) for encoding, data in snapshot.encoded.items()}
+                if snapshot else None
+            ),
+            "building": self._build_lock.locked(),
+            "builds": self.builds,
+            "stale_served": self.stale_served,
+        }
+
+
+home_snapshot = HomeSnapshotCache()
+
+
+invalidate_on_write(HOME_CHANNEL, _TRACKED_MODELS, home_snapshot.invalidate)
@@ -0,0 +1,241 @@
+"""
+圖片縮圖服務
+
+課程、活動與講師的 image_url 指向前端 public 目錄下的原始 JPEG/PNG。
+此服務依請求的寬度與格式（WebP／AVIF／JPEG）在 process pool 中產生縮圖，
+以「原圖內容雜湊 + 寬度 + 格式」為鍵存放在磁碟快取，總大小超過上限時
+淘汰最久未使用的檔案。API 回應中的 image_srcset 使用帶版本（雜湊）的網址，
+因此縮圖可以設定為長期、不可變的快取。
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    from PIL import Image, features
+except ImportError:  # 未安裝 Pillow 時直接回傳原圖
+    Image = None
+
+# 支援的輸出格式：格式 -> (Pillow 格式名稱, Content-Type)
+FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+_SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def available_formats() -> Tuple[str, ...]:
+    """此環境的 Pillow 能輸出的格式（依偏好順序）"""
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in FORMATS if fmt == "jpeg" or features.check(fmt))
+
+
+def _render(source: str, dest: str, width: int, fmt: str) -> int:
+    """
+    在子程序中產生縮圖並寫入 dest，回傳檔案大小
+
+    先寫入暫存檔再改名，其他程序不會讀到寫到一半的檔案
+    """
+    with Image.open(source) as img:
+        img.draft("RGB", (width, 1))  # JPEG 可直接以較低解析度解碼
+        if img.width > width:
+            img.thumbnail((width, img.height), Image.LANCZOS)
+        has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+        if fmt == "jpeg" or not has_alpha:
+            img = img.convert("RGB")
+        elif img.mode != "RGBA":
+            img = img.convert("RGBA")
+
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        if fmt == "jpeg":
+            img.save(tmp, "JPEG", quality=80, optimize=True, progressive=True)
+        elif fmt == "webp":
+            img.save(tmp, "WEBP", quality=78, method=4)
+        else:
+            img.save(tmp, "AVIF", quality=60, speed=6)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+class ImageService:
+    """縮圖產生與磁碟快取"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # 原圖路徑 -> (mtime, 大小, 內容雜湊)，避免每次請求都重新計算雜湊
+        self._digests: Dict[str, Tuple[float, int, str]] = {}
+        # 產生中的縮圖，同一張縮圖的並行請求只產生一次
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._cache_bytes: Optional[int] = None
+        self.hits = 0
+        self.renders = 0
+        self.evictions = 0
+
+    @property
+    def source_dir(self) -> Path:
+        return Path(settings.IMAGE_SOURCE_DIR).resolve()
+
+    @property
+    def cache_dir(self) -> Path:
+        return Path(settings.IMAGE_CACHE_DIR).resolve()
+
+    # ---------- 原圖 ----------
+
+    def resolve_source(self, image_url: str) -> Optional[Path]:
+        """將 image_url（例如 /images/courses/a.jpg）對應到原圖檔案，不允許跳出來源目錄"""
+        if not image_url or "://" in image_url:
+            return None
+        root = self.source_dir
+        path = (root / image_url.lstrip("/")).resolve()
+        if root not in path.parents or path.suffix.lower() not in _SOURCE_SUFFIXES:
+            return None
+        return path if path.is_file() else None
+
+    def digest(self, path: Path) -> str:
+        """原圖內容雜湊（以 mtime 與大小判斷是否需要重新計算）"""
+        stat = path.stat()
+        key = str(path)
+        cached = self._digests.get(key)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        value = h.hexdigest()
+        self._digests[key] = (stat.st_mtime, stat.st_size, value)
+        return value
+
+    def srcset(self, image_url: Optional[str]) -> Optional[str]:
+        """產生 srcset 字串；原圖不存在（或是外部網址）時回傳 None"""
+        path = self.resolve_source(image_url)
+        if path is None:
+            return None
+        version = self.digest(path)[:16]
+        base = f"{settings.IMAGE_BASE_URL}{settings.API_V1_STR}/images/{image_url.lstrip('/')}"
+        return ", ".join(f"{base}?w={w}&v={version} {w}w" for w in settings.IMAGE_WIDTHS)
+
+    # ---------- 縮圖 ----------
+
+    async def get_variant(self, source: Path, width: int, fmt: str) -> Path:
+        """
+        取得縮圖檔案路徑，快取中沒有時在 process pool 中產生
+
+        計算雜湊、檢查快取與淘汰都會讀寫磁碟，在 thread 中執行，不阻塞事件迴圈
+        """
+        dest, cached = await asyncio.to_thread(self._cached_variant, source, width, fmt)
+        if cached:
+            self.hits += 1
+            return dest
+
+        key = str(dest)
+        inflight = self._inflight.get(key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), _render, str(source), str(dest), width, fmt
+            )
+            self.renders += 1
+            await asyncio.to_thread(self._account, size)
+            future.set_result(dest)
+            return dest
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 沒有其他等待者時避免「未取得的例外」警告
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _cached_variant(self, source: Path, width: int, fmt: str) -> Tuple[Path, bool]:
+        """
+        縮圖的快取路徑與是否已存在
+
+        已存在時更新 mtime 作為最近使用時間，否則先建立目錄
+        """
+        digest = self.digest(source)
+        dest = self.cache_dir / digest[:2] / f"{digest[:32]}-{width}.{fmt}"
+        try:
+            os.utime(dest)
+            return dest, True
+        except FileNotFoundError:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            return dest, False
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    # ---------- LRU 淘汰 ----------
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _account(self, added: int) -> None:
+        """累計快取大小，超過上限時淘汰最久未使用的檔案直到低於上限的 90%"""
+        limit = settings.IMAGE_CACHE_MAX_MB * 1024 * 1024
+        with self._lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(size for _, _, size in self._scan())
+            else:
+                self._cache_bytes += added
+            if self._cache_bytes <= limit:
+                return
+
+            entries = sorted(self._scan(), key=lambda e: e[1])
+            total = sum(size for _, _, size in entries)
+            target = int(limit * 0.9)
+            for path, _, size in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+            self._cache_bytes = total
+
+    def status(self) -> dict:
+        """快取狀態（供監控使用）"""
+        return {
+            "formats": list(available_formats()),
+            "cache_bytes": self._cache_bytes,
+            "hits": self.hits,
+            "renders": self.renders,
+            "evictions": self.evictions,
+        }
+
+
+image_service = ImageService()
@@ -0,0 +1,107 @@
+"""
+本機 SMTP 替身伺服器（開發與測試用）
+
+只實作寄信所需的最小指令集（EHLO/HELO、MAIL、RCPT、DATA、RSET、NOOP、QUIT），
+收到的信件保存在 `messages` 中，不會真的寄出。
+執行方式: python -m app.services.local_smtp [--port 1025]
+"""
+
+import argparse
+import asyncio
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+
+class LocalSMTPServer:
+    """在 asyncio 事件迴圈上執行的 SMTP 替身"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.messages: List[Tuple[str, List[str], EmailMessage]] = []
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        sender, recipients = None, []
+        await reply("220 localhost ESMTP stand-in")
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                command = raw.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    writer.write(b"250-localhost\r\n250-8BITMIME\r\n250-SMTPUTF8\r\n")
+                    await reply("250 OK")
+                elif verb == "HELO":
+                    await reply("250 localhost")
+                elif verb == "MAIL":
+                    sender, recipients = command.split(":", 1)[1].split()[0].strip("<>"), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].split()[0].strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        line = await reader.readline()
+                        if line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(line[1:] if line.startswith(b"..") else line)
+                    message = message_from_bytes(b"".join(lines), policy=policy.default)
+                    self.messages.append((sender, recipients, message))
+                    sender, recipients = None, []
+                    await reply("250 OK: queued")
+                elif verb == "RSET":
+                    sender, recipients = None, []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+
+async def _serve(port: int) -> None:
+    server = LocalSMTPServer(port=port)
+    await server.start()
+    print(f"本機 SMTP 替身已啟動：127.0.0.1:{server.port}（Ctrl+C 停止）")
+    seen = 0
+    while True:
+        await asyncio.sleep(1)
+        for sender, recipients, message in server.messages[seen:]:
+            print(f"— {sender} → {', '.join(recipients)}：{message['Subject']}")
+        seen = len(server.messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機 SMTP 替身伺服器")
+    parser.add_argument("--port", type=int, default=1025)
+    try:
+        asyncio.run(_serve(parser.parse_args().port))
+    except KeyboardInterrupt:
+        pass
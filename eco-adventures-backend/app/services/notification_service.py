@@ -0,0 +1,424 @@
+"""
+通知信件
+
+報名相關的 outbox 事件由訂閱者轉成 email_notifications 記錄，寫入路徑不會連線 SMTP；
+背景 worker 批次領取到期的信件，重複使用 SMTP 連線寄送，失敗時以指數退避重試。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import EmailNotification, NotificationStatus, Registration, Course
+from app.services import outbox
+from app.services.outbox import outbox_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# 通知類型
+REGISTRATION_CONFIRMED = "registration_confirmed"
+REGISTRATION_WAITLISTED = "registration_waitlisted"
+REGISTRATION_CANCELLED = "registration_cancelled"
+
+SUBJECTS = {
+    REGISTRATION_CONFIRMED: "【新竹縣環境教育網】報名成功：{{ course_title }}",
+    REGISTRATION_WAITLISTED: "【新竹縣環境教育網】候補登記：{{ course_title }}",
+    REGISTRATION_CANCELLED: "【新竹縣環境教育網】取消報名：{{ course_title }}",
+}
+
+# outbox 事件對應的通知類型
+EVENT_KINDS = {
+    outbox.REGISTRATION_CONFIRMED: REGISTRATION_CONFIRMED,
+    outbox.REGISTRATION_WAITLISTED: REGISTRATION_WAITLISTED,
+    outbox.REGISTRATION_CANCELLED: REGISTRATION_CANCELLED,
+}
+
+# 寄送中的租約時間，worker 中斷時信件會在租約到期後重新被領取
+SENDING_LEASE = timedelta(minutes=5)
+
+_env = Environment(
+    loader=FileSystemLoader(Path(__file__).resolve().parent.parent / "templates" / "email"),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+)
+# 啟動時即編譯所有範本，寄送時不需再解析
+_templates = {kind: _env.get_template(f"{kind}.html") for kind in SUBJECTS}
+# 主旨是純文字，不做 HTML 跳脫
+_subjects = {
+    kind: Environment(autoescape=False).from_string(subject)
+    for kind, subject in SUBJECTS.items()
+}
+
+
+def render(kind: str, context: dict) -> tuple:
+    """產生信件主旨與 HTML 內容"""
+    subject = _subjects[kind].render(**context)
+    return subject, _templates[kind].render(subject=subject, **context)
+
+
+class NotificationService:
+    """通知服務類別"""
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        kind: str,
+        to_email: str,
+        context: dict,
+        to_name: Optional[str] = None,
+        registration_id: Optional[int] = None
+    ) -> EmailNotification:
+        """
+        將通知信件排入佇列
+
+        不會 commit，與呼叫端的資料異動在同一個交易內完成
+        """
+        notification = EmailNotification(
+            kind=kind,
+            to_email=to_email,
+            to_name=to_name,
+            context=json.dumps(context, ensure_ascii=False, default=str),
+            registration_id=registration_id,
+        )
+        db.add(notification)
+        # 交易 commit 後才喚醒 worker，避免 worker 在資料寫入前領取
+        db.info["email_enqueued"] = True
+        return notification
+
+    @staticmethod
+    def enqueue_registration(db: Session, kind: str, registration: Registration,
+                             course: Course) -> EmailNotification:
+        """依報名記錄排入通知信件"""
+        context = {
+            "name": registration.name,
+            "registration_id": registration.id,
+            "participants": registration.participants,
+            "course_title": course.title,
+            "course_date": course.date,
+            "start_time": course.start_time.strftime("%H:%M") if course.start_time else None,
+            "end_time": course.end_time.strftime("%H:%M") if course.end_time else None,
+            "location": course.location,
+            "notes": course.notes,
+        }
+        return NotificationService.enqueue(
+            db, kind, registration.email, context,
+            to_name=registration.name, registration_id=registration.id
+        )
+
+    @staticmethod
+    def get_queue_stats(db: Session) -> Dict[str, int]:
+        """各狀態的信件數"""
+        rows = db.query(
+            EmailNotification.status, func.count(EmailNotification.id)
+        ).group_by(EmailNotification.status).all()
+        return {status.name.lower(): count for status, count in rows}
+
+
+@outbox_dispatcher.subscribe("email_notifications", EVENT_KINDS)
+def _enqueue_registration_emails(db: Session, events: List[outbox.DomainEvent]) -> None:
+    """報名確認、候補、取消事件排入通知信件（與檢查點在同一個交易中提交）"""
+    ids = {e.aggregate_id for e in events}
+    registrations = {
+        r.id: r for r in db.query(Registration).options(
+            joinedload(Registration.course)
+        ).filter(Registration.id.in_(ids))
+    }
+    for e in events:
+        registration = registrations.get(e.aggregate_id)
+        if registration is None or registration.course is None:
+            continue  # 報名已被刪除
+        NotificationService.enqueue_registration(
+            db, EVENT_KINDS[e.event_type], registration, registration.course
+        )
+
+
+# ============ 寄送方式 ============
+
+class SMTPTransport:
+    """透過 aiosmtplib 寄送，連線在多個批次之間重複使用"""
+
+    def __init__(self, hostname: str, port: int, username: Optional[str] = None,
+                 password: Optional[str] = None):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self._client = None
+
+    async def _connect(self):
+        import aiosmtplib
+
+        client = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, timeout=30)
+        await client.connect()
+        if self.username and self.password:
+            await client.login(self.username, self.password)
+        return client
+
+    async def send(self, message: EmailMessage) -> None:
+        import aiosmtplib
+
+        if self._client is None or not self._client.is_connected:
+            self._client = await self._connect()
+        try:
+            await self._client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # 伺服器關閉了閒置連線：重新連線後再試一次
+            self._client = await self._connect()
+            await self._client.send_message(message)
+
+    async def close(self) -> None:
+        if self._client is not None and self._client.is_connected:
+            try:
+                await self._client.quit()
+            except Exception:
+                self._client.close()
+        self._client = None
+
+
+class MemoryTransport:
+    """只保存在記憶體的寄送方式（開發、測試用）"""
+
+    def __init__(self):
+        self.outbox: List[EmailMessage] = []
+
+    async def send(self, message: EmailMessage) -> None:
+        self.outbox.append(message)
+
+    async def close(self) -> None:
+        pass
+
+
+def create_transport():
+    """依設定建立寄送方式"""
+    if settings.EMAIL_BACKEND == "memory":
+        return MemoryTransport()
+    return SMTPTransport(
+        hostname=settings.SMTP_HOST,
+        port=settings.SMTP_PORT or 587,
+        username=settings.SMTP_USER,
+        password=settings.SMTP_PASSWORD,
+    )
+
+
+# ============ 背景寄送 ============
+
+class NotificationWorker:
+    """背景寄信 worker 池，由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.transport_factory = create_transport
+        self.transports: list = []
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EMAIL_WORKERS > 0 and (
+            settings.EMAIL_BACKEND == "memory" or bool(settings.SMTP_HOST)
+        )
+
+    async def start(self) -> None:
+        """啟動 worker"""
+        if self._tasks or not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        for i in range(settings.EMAIL_WORKERS):
+            transport = self.transport_factory()
+            self.transports.append(transport)
+            self._tasks.append(asyncio.create_task(
+                self._run(transport), name=f"email-worker-{i}"
+            ))
+
+    async def stop(self) -> None:
+        """停止 worker 並關閉 SMTP 連線（寄送中的信件會在租約到期後重新寄送）"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for transport in self.transports:
+            await transport.close()
+        self._tasks = []
+        self.transports = []
+
+    def notify(self) -> None:
+        """有新信件時喚醒 worker（可在任何執行緒呼叫）"""
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:  # 事件迴圈已關閉
+                pass
+
+    async def _run(self, transport) -> None:
+        owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        while True:
+            try:
+                batch = await asyncio.to_thread(self._claim, owner)
+                if batch:
+                    results = await self._send_batch(transport, batch)
+                    await asyncio.to_thread(self._record, results)
+                    # 佇列可能還有信件，馬上再領取下一批
+                    if len(batch) >= settings.EMAIL_BATCH_SIZE:
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("通知信件寄送失敗")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _claim(owner: str) -> List[dict]:
+        """領取一批到期的信件（以條件式 UPDATE 標記，多個 worker 不會領到同一封）"""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            ids = [row.id for row in db.query(EmailNotification.id).filter(
+                EmailNotification.status.in_([NotificationStatus.PENDING, NotificationStatus.SENDING]),
+                EmailNotification.next_attempt_at <= now
+            ).order_by(EmailNotification.next_attempt_at).limit(settings.EMAIL_BATCH_SIZE)]
+            if not ids:
+                return []
+
+            db.execute(
+                update(EmailNotification)
+                .where(
+                    EmailNotification.id.in_(ids),
+                    EmailNotification.status.in_([NotificationStatus.PENDING, NotificationStatus.SENDING]),
+                    EmailNotification.next_attempt_at <= now
+                )
+                .values(
+                    status=NotificationStatus.SENDING,
+                    claimed_by=owner,
+                    next_attempt_at=now + SENDING_LEASE,
+                    attempts=EmailNotification.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+
+            rows = db.query(EmailNotification).filter(
+                EmailNotification.id.in_(ids),
+                EmailNotification.claimed_by == owner,
+                EmailNotification.status == NotificationStatus.SENDING
+            ).all()
+            return [
+                {
+                    "id": row.id,
+                    "kind": row.kind,
+                    "to_email": row.to_email,
+                    "to_name": row.to_name,
+                    "context": json.loads(row.context or "{}"),
+                    "attempts": row.attempts,
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    async def _send_batch(self, transport, batch: List[dict]) -> List[tuple]:
+        results = []
+        sender = formataddr((
+            settings.EMAILS_FROM_NAME or settings.PROJECT_NAME,
+            settings.EMAILS_FROM_EMAIL or settings.SMTP_USER or "noreply@localhost"
+        ))
+        for item in batch:
+            try:
+                subject, html = render(item["kind"], item["context"])
+                message = EmailMessage()
+                message["From"] = sender
+                message["To"] = formataddr((item["to_name"] or "", item["to_email"]))
+                message["Subject"] = subject
+                message.set_content("請使用支援 HTML 的郵件軟體檢視此信件。")
+                message.add_alternative(html, subtype="html")
+                await transport.send(message)
+                results.append((item, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                results.append((item, str(e) or e.__class__.__name__))
+        return results
+
+    def _record(self, results: List[tuple]) -> None:
+        """寫回寄送結果"""
+        now = datetime.utcnow()
+        sent_ids = [item["id"] for item, error in results if error is None]
+        db = SessionLocal()
+        try:
+            if sent_ids:
+                db.execute(
+                    update(EmailNotification)
+                    .where(EmailNotification.id.in_(sent_ids))
+                    .values(status=NotificationStatus.SENT, sent_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            for item, error in results:
+                if error is None:
+                    continue
+                give_up = item["attempts"] >= settings.EMAIL_MAX_ATTEMPTS
+                delay = settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (item["attempts"] - 1)
+                db.execute(
+                    update(EmailNotification)
+                    .where(EmailNotification.id == item["id"])
+                    .values(
+                        status=NotificationStatus.FAILED if give_up else NotificationStatus.PENDING,
+                        next_attempt_at=now + timedelta(seconds=delay),
+                        last_error=error[:1000]
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if give_up:
+                    self.failed += 1
+                    logger.warning("通知信件 %s 寄送失敗，已放棄：%s", item["id"], error)
+            db.commit()
+        finally:
+            db.close()
+        self.sent += len(sent_ids)
+
+    def status(self) -> dict:
+        """worker 狀態（供監控使用）"""
+        return {
+            "enabled": self.enabled,
+            "backend": settings.EMAIL_BACKEND,
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+notification_worker = NotificationWorker()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_worker_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction() and session.info.pop("email_enqueued", False):
+        notification_worker.notify()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("email_enqueued", None)
@@ -1,14 +1,24 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, update
 import json
 
-from app.models.models import Instructor, Activity, FAQ
+from app.models.models import Course, Instructor, Activity, FAQ
 from app.schemas.schemas import (
     InstructorCreate, InstructorUpdate,
     ActivityCreate, ActivityUpdate,
     FAQCreate, FAQUpdate
 )
+from app.services.search_index import (
+    suggestion_index, publish_change, KIND_INSTRUCTOR, KIND_FAQ
+)
+from app.services.projection import (
+    instructor_projection, activity_projection, faq_projection
+)
+from app.services.versioning import update_returning
+from app.services.change_feed import (
+    record_changes, ENTITY_COURSE, ENTITY_INSTRUCTOR, ENTITY_ACTIVITY, ENTITY_FAQ, OP_DELETE
+)
 
 
 class InstructorService:
@@ -24,11 +34,15 @@ class InstructorService:
         db: Session,
         skip: int = 0,
         limit: int = 100,
-        is_active: Optional[bool] = None
+        is_active: Optional[bool] = None,
+        ids: Optional[List[int]] = None,
+        fields: Optional[List[str]] = None
     ) -> List[Instructor]:
-        """取得講師列表"""
-        query = db.query(Instructor)
+        """取得講師列表（ids：只取指定的講師；fields：只載入指定的欄位）"""
+        query = db.query(Instructor).options(*instructor_projection.query_options(fields))
         
+        if ids:
+            query = query.filter(Instructor.id.in_(ids))
         if is_active is not None:
             query = query.filter(Instructor.is_active == is_active)
         
@@ -46,21 +60,20 @@ class InstructorService:
         
         instructor = Instructor(**instructor_data)
         db.add(instructor)
+        db.flush()
+        record_changes(db, ENTITY_INSTRUCTOR, [instructor.id])
         db.commit()
-        db.refresh(instructor)
+        suggestion_index.index_instructor(instructor)
         return instructor
     
     @staticmethod
     def update(
         db: Session,
         instructor_id: int,
-        instructor_in: InstructorUpdate
+        instructor_in: InstructorUpdate,
+        expected_version: Optional[int] = None
     ) -> Optional[Instructor]:
-        """更新講師"""
-        instructor = db.query(Instructor).filter(Instructor.id == instructor_id).first()
-        if not instructor:
-            return None
-        
+        """更新講師（expected_version：If-Match 指定的版本號）"""
         update_data = instructor_in.model_dump(exclude_unset=True)
         # 將專長列表轉換為 JSON 字串
         if 'specialties' in update_data:
@@ -68,22 +81,40 @@ class InstructorService:
                 update_data['specialties'], ensure_ascii=False
             )
         
-        for field, value in update_data.items():
-            setattr(instructor, field, value)
-        
+        instructor = update_returning(db, Instructor, instructor_id, update_data, expected_version)
+        if not instructor:
+            return None
+        # UPDATE … RETURNING 不經過 flush，需自行通知其他 worker 更新索引
+        publish_change(db, KIND_INSTRUCTOR, instructor.id)
+        record_changes(db, ENTITY_INSTRUCTOR, [instructor.id])
         db.commit()
-        db.refresh(instructor)
+        suggestion_index.index_instructor(instructor)
         return instructor
     
     @staticmethod
     def delete(db: Session, instructor_id: int) -> bool:
-        """刪除講師"""
+        """
+        刪除講師
+        
+        課程的 instructor_id 以一個 UPDATE 清除（同時讓課程的版本號加一），不載入課程；
+        資料庫的 ON DELETE SET NULL 確保其他途徑刪除講師時也不會留下失效的參照
+        """
         instructor = db.query(Instructor).filter(Instructor.id == instructor_id).first()
         if not instructor:
             return False
         
+        course_ids = db.execute(
+            update(Course)
+            .where(Course.instructor_id == instructor_id)
+            .values(instructor_id=None, version=Course.version + 1)
+            .returning(Course.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        record_changes(db, ENTITY_COURSE, course_ids)
+        record_changes(db, ENTITY_INSTRUCTOR, [instructor_id], OP_DELETE)
         db.delete(instructor)
         db.commit()
+        suggestion_index.remove_instructor(instructor_id)
         return True
 
 
@@ -100,11 +131,15 @@ class ActivityService:
         db: Session,
         skip: int = 0,
         limit: int = 100,
-        category: Optional[str] = None
+        category: Optional[str] = None,
+        ids: Optional[List[int]] = None,
+        fields: Optional[List[str]] = None
     ) -> List[Activity]:
-        """取得活動列表"""
-        query = db.query(Activity)
+        """取得活動列表（ids：只取指定的活動；fields：只載入指定的欄位）"""
+        query = db.query(Activity).options(*activity_projection.query_options(fields))
         
+        if ids:
+            query = query.filter(Activity.id.in_(ids))
         if category:
             query = query.filter(Activity.category == category)
         
@@ -122,21 +157,19 @@ class ActivityService:
         
         activity = Activity(**activity_data)
         db.add(activity)
+        db.flush()
+        record_changes(db, ENTITY_ACTIVITY, [activity.id])
         db.commit()
-        db.refresh(activity)
         return activity
     
     @staticmethod
     def update(
         db: Session,
         activity_id: int,
-        activity_in: ActivityUpdate
+        activity_in: ActivityUpdate,
+        expected_version: Optional[int] = None
     ) -> Optional[Activity]:
-        """更新活動"""
-        activity = db.query(Activity).filter(Activity.id == activity_id).first()
-        if not activity:
-            return None
-        
+        """更新活動（expected_version：If-Match 指定的版本號）"""
         update_data = activity_in.model_dump(exclude_unset=True)
         # 將照片列表轉換為 JSON 字串
         if 'photos' in update_data:
@@ -144,11 +177,11 @@ class ActivityService:
                 update_data['photos'], ensure_ascii=False
             )
         
-        for field, value in update_data.items():
-            setattr(activity, field, value)
-        
+        activity = update_returning(db, Activity, activity_id, update_data, expected_version)
+        if not activity:
+            return None
+        record_changes(db, ENTITY_ACTIVITY, [activity.id])
         db.commit()
-        db.refresh(activity)
         return activity
     
     @staticmethod
@@ -158,6 +191,7 @@ class ActivityService:
         if not activity:
             return False
         
+        record_changes(db, ENTITY_ACTIVITY, [activity_id], OP_DELETE)
         db.delete(activity)
         db.commit()
         return True
@@ -177,11 +211,15 @@ class FAQService:
         skip: int = 0,
         limit: int = 100,
         is_active: Optional[bool] = None,
-        category: Optional[str] = None
+        category: Optional[str] = None,
+        ids: Optional[List[int]] = None,
+        fields: Optional[List[str]] = None
     ) -> List[FAQ]:
-        """取得 FAQ 列表"""
-        query = db.query(FAQ)
+        """取得 FAQ 列表（ids：只取指定的 FAQ；fields：只載入指定的欄位）"""
+        query = db.query(FAQ).options(*faq_projection.query_options(fields))
         
+        if ids:
+            query = query.filter(FAQ.id.in_(ids))
         if is_active is not None:
             query = query.filter(FAQ.is_active == is_active)
         if category:
@@ -194,23 +232,29 @@ class FAQService:
         """建立 FAQ"""
         faq = FAQ(**faq_in.model_dump())
         db.add(faq)
+        db.flush()
+        record_changes(db, ENTITY_FAQ, [faq.id])
         db.commit()
-        db.refresh(faq)
+        suggestion_index.index_faq(faq)
         return faq
     
     @staticmethod
-    def update(db: Session, faq_id: int, faq_in: FAQUpdate) -> Optional[FAQ]:
-        """更新 FAQ"""
-        faq = db.query(FAQ).filter(FAQ.id == faq_id).first()
+    def update(
+        db: Session,
+        faq_id: int,
+        faq_in: FAQUpdate,
+        expected_version: Optional[int] = None
+    ) -> Optional[FAQ]:
+        """更新 FAQ（expected_version：If-Match 指定的版本號）"""
+        faq = update_returning(
+            db, FAQ, faq_id, faq_in.model_dump(exclude_unset=True), expected_version
+        )
         if not faq:
             return None
-        
-        update_data = faq_in.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(faq, field, value)
-        
+        publish_change(db, KIND_FAQ, faq.id)
+        record_changes(db, ENTITY_FAQ, [faq.id])
         db.commit()
-        db.refresh(faq)
+        suggestion_index.index_faq(faq)
         return faq
     
     @staticmethod
@@ -220,6 +264,8 @@ class FAQService:
         if not faq:
             return False
         
+        record_changes(db, ENTITY_FAQ, [faq_id], OP_DELETE)
         db.delete(faq)
         db.commit()
+        suggestion_index.remove_faq(faq_id)
         return True
@@ -0,0 +1,417 @@
+"""
+領域事件 outbox
+
+服務層在資料異動的同一個交易中以 OutboxService.record() 寫入事件，交易 commit
+後事件才會存在；背景 dispatcher 依 ID 順序批次讀取事件並分派給程序內的訂閱者。
+
+- 每個訂閱者在 outbox_checkpoints 各有一個檢查點，訂閱者的資料庫寫入與檢查點
+  推進在同一個交易中提交；處理失敗時整批重試（至少一次送達）。
+- 多個 worker 同時分派時，以條件式 UPDATE 推進檢查點，只有一個會成功提交。
+- 事件 ID 出現空缺（較早的交易尚未提交）時，最多等待 OUTBOX_SETTLE_SECONDS，之後
+  檢查點越過空缺並記錄在 outbox_gaps；空缺的事件較晚提交時仍會補送（順序在較新的事件之後），
+  超過 OUTBOX_GAP_TIMEOUT_SECONDS 仍未出現才視為已 rollback。
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import OutboxEvent, OutboxCheckpoint, OutboxGap
+
+logger = logging.getLogger(__name__)
+
+# 事件類型
+COURSE_CREATED = "course.created"
+COURSE_UPDATED = "course.updated"
+COURSE_DELETED = "course.deleted"
+COURSE_ARCHIVED = "course.archived"
+REGISTRATION_CONFIRMED = "registration.confirmed"
+REGISTRATION_WAITLISTED = "registration.waitlisted"
+REGISTRATION_UPDATED = "registration.updated"
+REGISTRATION_CANCELLED = "registration.cancelled"
+REGISTRATION_DELETED = "registration.deleted"
+
+# 處理失敗後的最長重試間隔
+MAX_RETRY_SECONDS = 300
+# 清除舊事件的間隔
+PRUNE_INTERVAL = timedelta(minutes=10)
+
+
+class DomainEvent(NamedTuple):
+    """分派給訂閱者的事件"""
+    id: int
+    event_type: str
+    aggregate_id: Optional[int]
+    payload: dict
+    created_at: datetime
+
+
+Handler = Callable[[Session, List[DomainEvent]], None]
+
+
+def _to_domain_event(row: OutboxEvent) -> DomainEvent:
+    return DomainEvent(
+        id=row.id,
+        event_type=row.event_type,
+        aggregate_id=row.aggregate_id,
+        payload=json.loads(row.payload or "{}"),
+        created_at=row.created_at,
+    )
+
+
+class OutboxService:
+    """Outbox 服務類別"""
+
+    @staticmethod
+    def record(
+        db: Session,
+        event_type: str,
+        aggregate_id: Optional[int] = None,
+        payload: Optional[dict] = None
+    ) -> OutboxEvent:
+        """
+        寫入領域事件
+
+        不會 commit，與呼叫端的資料異動在同一個交易內完成
+        """
+        outbox_event = OutboxEvent(
+            event_type=event_type,
+            aggregate_id=aggregate_id,
+            payload=json.dumps(payload or {}, ensure_ascii=False, default=str),
+        )
+        db.add(outbox_event)
+        # 交易 commit 後才喚醒 dispatcher
+        db.info["outbox_recorded"] = True
+        return outbox_event
+
+    @staticmethod
+    def record_many(
+        db: Session,
+        events: Iterable[Tuple[str, Optional[int], Optional[dict]]]
+    ) -> int:
+        """
+        以一個多列 INSERT 寫入多筆領域事件（整批操作用），回傳事件數
+
+        events 為 (事件類型, aggregate_id, payload)；不會 commit
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                "event_type": event_type,
+                "aggregate_id": aggregate_id,
+                "payload": json.dumps(payload or {}, ensure_ascii=False, default=str),
+                "created_at": now,
+            }
+            for event_type, aggregate_id, payload in events
+        ]
+        if rows:
+            db.execute(insert(OutboxEvent), rows)
+            db.info["outbox_recorded"] = True
+        return len(rows)
+
+    @staticmethod
+    def get_status(db: Session) -> dict:
+        """各訂閱者的檢查點與延遲"""
+        head = db.query(func.max(OutboxEvent.id)).scalar() or 0
+        now = datetime.utcnow()
+        consumers = {}
+        for checkpoint in db.query(OutboxCheckpoint).order_by(OutboxCheckpoint.consumer):
+            oldest = db.query(func.min(OutboxEvent.created_at)).filter(
+                OutboxEvent.id > checkpoint.last_event_id
+            ).scalar()
+            consumers[checkpoint.consumer] = {
+                "last_event_id": checkpoint.last_event_id,
+                "pending": max(head - checkpoint.last_event_id, 0),
+                "lag_seconds": (now - oldest).total_seconds() if oldest else 0,
+                # 越過後仍在等待較晚提交的事件 ID 數
+                "gaps": db.query(func.count(OutboxGap.event_id)).filter(
+                    OutboxGap.consumer == checkpoint.consumer
+                ).scalar(),
+            }
+        return {"head_event_id": head, "consumers": consumers}
+
+
+class Subscriber:
+    """outbox 訂閱者"""
+
+    def __init__(self, name: str, event_types: Optional[Iterable[str]], handler: Handler):
+        self.name = name
+        self.event_types = set(event_types) if event_types is not None else None
+        self.handler = handler
+        self.delivered = 0
+        self.failures = 0
+        self.retry_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def accepts(self, event_type: str) -> bool:
+        return self.event_types is None or event_type in self.event_types
+
+
+class OutboxDispatcher:
+    """outbox 分派器，由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Subscriber] = {}
+        self.last_pruned_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def subscribe(self, name: str, event_types: Optional[Iterable[str]] = None):
+        """
+        註冊訂閱者（decorator）
+
+        handler(db, events) 在分派器的交易中執行，不可自行 commit；
+        同一批事件可能被重送，外部副作用需自行處理重複。
+        """
+        def decorator(handler: Handler) -> Handler:
+            self.subscribers[name] = Subscriber(name, event_types, handler)
+            return handler
+        return decorator
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._ensure_checkpoints)
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    async def stop(self) -> None:
+        """停止背景工作（未處理的事件留待下次啟動）"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """有新事件時喚醒分派器（可在任何執行緒呼叫）"""
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:  # 事件迴圈已關閉
+                pass
+
+    # ---------- 主迴圈 ----------
+
+    async def _run(self) -> None:
+        while True:
+            sleep_for = float(settings.OUTBOX_POLL_SECONDS)
+            self._wakeup.clear()
+            for subscriber in list(self.subscribers.values()):
+                now = datetime.utcnow()
+                if subscriber.retry_at and subscriber.retry_at > now:
+                    sleep_for = min(sleep_for, (subscriber.retry_at - now).total_seconds())
+                    continue
+                try:
+                    # 還有下一批時立即繼續處理，讓延遲維持在批次處理時間內
+                    while True:
+                        more, wait = await asyncio.to_thread(self._dispatch, subscriber)
+                        if not more:
+                            break
+                    subscriber.failures = 0
+                    subscriber.retry_at = None
+                    if wait is not None:
+                        sleep_for = min(sleep_for, wait)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    subscriber.failures += 1
+                    subscriber.last_error = str(e) or e.__class__.__name__
+                    delay = min(2 ** subscriber.failures, MAX_RETRY_SECONDS)
+                    subscriber.retry_at = datetime.utcnow() + timedelta(seconds=delay)
+                    sleep_for = min(sleep_for, delay)
+                    logger.exception("outbox 訂閱者 %s 處理失敗", subscriber.name)
+
+            if self.last_pruned_at is None or \
+                    datetime.utcnow() - self.last_pruned_at >= PRUNE_INTERVAL:
+                try:
+                    await asyncio.to_thread(self.prune)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("清除 outbox 事件失敗")
+                self.last_pruned_at = datetime.utcnow()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(sleep_for, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- 資料庫操作（在 thread 中執行） ----------
+
+    def _ensure_checkpoints(self) -> None:
+        """為新的訂閱者建立檢查點（從目前最新的事件開始，不重播歷史事件）"""
+        db = SessionLocal()
+        try:
+            existing = {row.consumer for row in db.query(OutboxCheckpoint.consumer)}
+            missing = [name for name in self.subscribers if name not in existing]
+            if not missing:
+                return
+            head = db.query(func.max(OutboxEvent.id)).scalar() or 0
+            for name in missing:
+                try:
+                    with db.begin_nested():
+                        db.add(OutboxCheckpoint(consumer=name, last_event_id=head))
+                except IntegrityError:  # 其他 worker 同時建立了檢查點
+                    pass
+            db.commit()
+        finally:
+            db.close()
+
+    def _dispatch(self, subscriber: Subscriber) -> Tuple[bool, Optional[float]]:
+        """
+        分派一批事件給訂閱者
+
+        回傳 (是否還有下一批, 需等待較早交易提交的秒數)
+        """
+        db = SessionLocal()
+        try:
+            last = db.query(OutboxCheckpoint.last_event_id).filter(
+                OutboxCheckpoint.consumer == subscriber.name
+            ).scalar()
+            if last is None:
+                # 啟動後才註冊的訂閱者：建立檢查點後於下一輪處理
+                self._ensure_checkpoints()
+                return False, 0
+
+            now = datetime.utcnow()
+            # 先前越過的空缺：已提交的事件補送，超過時限仍未出現的放棄
+            gaps = db.query(OutboxGap.event_id, OutboxGap.created_at).filter(
+                OutboxGap.consumer == subscriber.name
+            ).order_by(OutboxGap.event_id).limit(settings.OUTBOX_BATCH_SIZE).all()
+            late = []
+            if gaps:
+                late = db.query(OutboxEvent).filter(
+                    OutboxEvent.id.in_([gap.event_id for gap in gaps])
+                ).order_by(OutboxEvent.id).all()
+            found = {row.id for row in late}
+            gave_up_before = now - timedelta(seconds=settings.OUTBOX_GAP_TIMEOUT_SECONDS)
+            resolved = [
+                gap.event_id for gap in gaps
+                if gap.event_id in found or gap.created_at < gave_up_before
+            ]
+
+            rows = db.query(OutboxEvent).filter(
+                OutboxEvent.id > last
+            ).order_by(OutboxEvent.id).limit(settings.OUTBOX_BATCH_SIZE).all()
+
+            settled_before = now - timedelta(seconds=settings.OUTBOX_SETTLE_SECONDS)
+            new_last, wait, skipped = last, None, []
+            for row in rows:
+                if row.id != new_last + 1:
+                    # ID 空缺且之後的事件還很新：較早的交易可能尚未提交，先停在空缺前
+                    if row.created_at > settled_before:
+                        wait = (row.created_at - settled_before).total_seconds()
+                        break
+                    # 等待已超過 settle 時間：記錄空缺後越過，較晚提交時由上方補送
+                    skipped.extend(range(new_last + 1, row.id))
+                new_last = row.id
+            if new_last == last and not resolved:
+                return False, wait
+
+            events = [
+                _to_domain_event(row)
+                for row in [*late, *(row for row in rows if row.id <= new_last)]
+                if subscriber.accepts(row.event_type)
+            ]
+            if events:
+                subscriber.handler(db, events)
+
+            # 條件式推進檢查點：其他 worker 已處理過這一批時放棄本次結果
+            advanced = db.execute(
+                update(OutboxCheckpoint)
+                .where(
+                    OutboxCheckpoint.consumer == subscriber.name,
+                    OutboxCheckpoint.last_event_id == last
+                )
+                .values(last_event_id=new_last, updated_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if advanced and resolved:
+                # 其他 worker 已補送同一個空缺時刪除的筆數會不足，同樣放棄本次結果
+                advanced = db.query(OutboxGap).filter(
+                    OutboxGap.consumer == subscriber.name,
+                    OutboxGap.event_id.in_(resolved)
+                ).delete(synchronize_session=False) == len(resolved)
+            if not advanced:
+                db.rollback()
+                return False, None
+            if skipped:
+                db.execute(insert(OutboxGap), [
+                    {"consumer": subscriber.name, "event_id": event_id, "created_at": now}
+                    for event_id in skipped
+                ])
+            db.commit()
+            subscriber.delivered += len(events)
+            return wait is None and len(rows) >= settings.OUTBOX_BATCH_SIZE, wait
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def prune(self) -> int:
+        """刪除所有訂閱者都已處理、且超過保留時間的事件，回傳刪除筆數"""
+        db = SessionLocal()
+        try:
+            processed = db.query(func.min(OutboxCheckpoint.last_event_id)).scalar()
+            if processed is None:
+                return 0
+            cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+            deleted = db.query(OutboxEvent).filter(
+                OutboxEvent.id <= processed,
+                OutboxEvent.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    # ---------- 狀態 ----------
+
+    def status(self) -> dict:
+        """分派器狀態（供監控使用）"""
+        return {
+            "running": self._task is not None,
+            "subscribers": {
+                name: {
+                    "event_types": sorted(s.event_types) if s.event_types is not None else None,
+                    "delivered": s.delivered,
+                    "failures": s.failures,
+                    "retry_at": s.retry_at,
+                    "last_error": s.last_error,
+                }
+                for name, s in self.subscribers.items()
+            },
+        }
+
+
+outbox_dispatcher = OutboxDispatcher()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_dispatcher_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction() and session.info.pop("outbox_recorded", False):
+        outbox_dispatcher.notify()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("outbox_recorded", None)
@@ -0,0 +1,124 @@
+"""
+回應欄位投影（sparse fieldsets）
+
+列表 API 的 `fields=` 參數指定要回傳的欄位：查詢只以 load_only 載入需要的欄位，
+回應也只包含要求的欄位。衍生欄位（例如 image_srcset）會自動載入計算所需的欄位。
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import load_only, selectinload
+
+from app.models import models
+from app.schemas import schemas
+from app.services.image_service import image_service
+
+# 衍生欄位：欄位名稱 -> (需要載入的欄位, 取值函式)
+Derived = Dict[str, Tuple[Sequence[str], Callable[[Any], Any]]]
+
+
+def _json_list(value):
+    # 資料庫中以 JSON 字串保存的列表
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class Projection:
+    """單一資源的欄位投影規則"""
+
+    def __init__(
+        self,
+        model,
+        schema,
+        derived: Optional[Derived] = None,
+        relationships: Optional[Dict[str, Tuple[str, Any]]] = None
+    ):
+        self.model = model
+        self.schema = schema
+        self.derived = derived or {}
+        # 關聯欄位：欄位名稱 -> (外鍵欄位, 回應 Schema)
+        self.relationships = relationships or {}
+        self.allowed = list(schema.model_fields)
+
+    def parse(self, fields: Optional[str]) -> Optional[List[str]]:
+        """
+        解析 `fields=` 參數（以逗號分隔），未指定時回傳 None
+
+        `id` 一定會包含在內；不存在的欄位會引發 ValueError
+        """
+        if not fields:
+            return None
+        selected = ["id"]
+        for name in (part.strip() for part in fields.split(",")):
+            if not name or name in selected:
+                continue
+            if name not in self.allowed:
+                raise ValueError(f"不支援的欄位：{name}")
+            selected.append(name)
+        return selected
+
+    def query_options(self, fields: Optional[List[str]]) -> list:
+        """查詢選項：只載入要求的欄位與衍生欄位需要的欄位"""
+        if not fields:
+            return []
+        columns = set()
+        options = []
+        for name in fields:
+            if name in self.derived:
+                columns.update(self.derived[name][0])
+            elif name in self.relationships:
+                columns.add(self.relationships[name][0])
+                options.append(selectinload(getattr(self.model, name)))
+            else:
+                columns.add(name)
+        return [load_only(*(getattr(self.model, c) for c in sorted(columns))), *options]
+
+    def dump(self, obj, fields: List[str]) -> dict:
+        """將 ORM 物件轉為只包含要求欄位的 dict"""
+        data = {}
+        for name in fields:
+            if name in self.derived:
+                data[name] = self.derived[name][1](obj)
+            elif name in self.relationships:
+                related = getattr(obj, name)
+                schema = self.relationships[name][1]
+                data[name] = schema.model_validate(related) if related is not None else None
+            else:
+                data[name] = getattr(obj, name)
+        return jsonable_encoder(data)
+
+    def dump_many(self, objs, fields: List[str]) -> List[dict]:
+        return [self.dump(obj, fields) for obj in objs]
+
+
+course_projection = Projection(
+    models.Course,
+    schemas.Course,
+    derived={
+        "image_srcset": (("image_url",), lambda c: image_service.srcset(c.image_url)),
+    },
+    relationships={"instructor": ("instructor_id", schemas.InstructorSimple)},
+)
+
+registration_projection = Projection(models.Registration, schemas.Registration)
+
+instructor_projection = Projection(
+    models.Instructor,
+    schemas.Instructor,
+    derived={
+        "specialties": (("specialties",), lambda i: _json_list(i.specialties)),
+        "image_srcset": (("image_url",), lambda i: image_service.srcset(i.image_url)),
+    },
+)
+
+activity_projection = Projection(
+    models.Activity,
+    schemas.Activity,
+    derived={
+        "photos": (("photos",), lambda a: _json_list(a.photos)),
+        "image_srcset": (("image_url",), lambda a: image_service.srcset(a.image_url)),
+    },
+)
+
+faq_projection = Projection(models.FAQ, schemas.FAQ)
@@ -0,0 +1,146 @@
+from types import SimpleNamespace
+from typing import Dict, List
+
+from sqlalchemy import and_, case, func, literal, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.models import Course, CourseStatus, Registration, RegistrationStatus
+from app.services.calendar_service import CalendarService
+from app.services.search_index import suggestion_index, publish_change, KIND_COURSE
+from app.services.seat_stream import publish_seats
+from app.services.change_feed import record_changes, ENTITY_COURSE
+
+
+class ReconcileService:
+    """名額核對服務類別"""
+    
+    @staticmethod
+    def find_drift(db: Session) -> List[dict]:
+        """
+        找出報名人數或額滿狀態與實際報名不一致的課程
+        
+        以單一分組查詢計算每門課程已確認的參加人數，只回傳有差異的課程
+        """
+        confirmed = select(
+            Registration.course_id,
+            func.sum(Registration.participants).label("seats")
+        ).where(
+            Registration.status == RegistrationStatus.CONFIRMED
+        ).group_by(Registration.course_id).subquery()
+        
+        actual = func.coalesce(confirmed.c.seats, 0)
+        expected_status = case(
+            (and_(Course.status.in_([CourseStatus.UPCOMING, CourseStatus.ONGOING]),
+                  actual >= Course.max_spots), literal(CourseStatus.FULL, Course.status.type)),
+            (and_(Course.status == CourseStatus.FULL,
+                  actual < Course.max_spots), literal(CourseStatus.ONGOING, Course.status.type)),
+            else_=Course.status
+        )
+        
+        rows = db.execute(
+            select(
+                Course.id, Course.title, Course.date, Course.category,
+                Course.max_spots, Course.status, Course.current_registrations, Course.version,
+                actual.label("actual"), expected_status.label("expected_status")
+            )
+            .outerjoin(confirmed, confirmed.c.course_id == Course.id)
+            .where(or_(
+                func.coalesce(Course.current_registrations, 0) != actual,
+                Course.status != expected_status
+            ))
+            .order_by(Course.id)
+        ).all()
+        
+        return [
+            {
+                "course_id": row.id,
+                "title": row.title,
+                "date": row.date,
+                "category": row.category,
+                "max_spots": row.max_spots,
+                "status": row.status,
+                "expected_status": row.expected_status,
+                "current_registrations": row.current_registrations,
+                "actual_registrations": row.actual,
+                "version": row.version,
+            }
+            for row in rows
+        ]
+    
+    @staticmethod
+    def reconcile(db: Session, fix: bool = False, batch_size: int = 500) -> Dict:
+        """
+        核對所有課程的報名人數
+        
+        - **fix**: 是否修正差異（以批次 UPDATE 寫回，每批一個交易）
+        - **batch_size**: 每批更新的課程數
+        
+        核對時沒有鎖定課程，寫回時只更新版本號與核對時相同的課程；期間有報名或取消
+        （版本號已改變）的課程略過，不會以過期的人數覆蓋，留待下次核對
+        """
+        drift = ReconcileService.find_drift(db)
+        fixed = 0
+        skipped = 0
+        
+        if fix and drift:
+            for start in range(0, len(drift), batch_size):
+                batch = drift[start:start + batch_size]
+                matched = set(db.execute(
+                    update(Course)
+                    .where(tuple_(Course.id, Course.version).in_(
+                        [(item["course_id"], item["version"]) for item in batch]
+                    ))
+                    .values(
+                        current_registrations=case(
+                            {item["course_id"]: item["actual_registrations"] for item in batch},
+                            value=Course.id, else_=Course.current_registrations
+                        ),
+                        status=case(
+                            {item["course_id"]: literal(item["expected_status"], Course.status.type)
+                             for item in batch},
+                            # else_ 讓 PostgreSQL 以欄位的列舉型別解讀 CASE 的結果
+                            value=Course.id, else_=Course.status
+                        ),
+                        version=Course.version + 1
+                    )
+                    .returning(Course.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars())
+                batch = [item for item in batch if item["course_id"] in matched]
+                skipped += len(drift[start:start + batch_size]) - len(batch)
+                if not batch:
+                    db.rollback()
+                    continue
+                # 同步修正每月摘要中的已報名人數（只計入實際更新的課程）
+                for item in batch:
+                    before = SimpleNamespace(
+                        date=item["date"], category=item["category"],
+                        max_spots=item["max_spots"], status=item["status"],
+                        current_registrations=item["current_registrations"]
+                    )
+                    after = SimpleNamespace(
+                        **{**vars(before),
+                           "status": item["expected_status"],
+                           "current_registrations": item["actual_registrations"]}
+                    )
+                    CalendarService.apply(
+                        db,
+                        CalendarService.contribution(before),
+                        CalendarService.contribution(after)
+                    )
+                    publish_change(db, KIND_COURSE, item["course_id"])
+                publish_seats(db, [item["course_id"] for item in batch])
+                record_changes(db, ENTITY_COURSE, [item["course_id"] for item in batch])
+                db.commit()
+                fixed += len(batch)
+                for item in batch:
+                    suggestion_index.set_course_popularity(
+                        item["course_id"], item["actual_registrations"]
+                    )
+        
+        return {
+            "drifted": len(drift),
+            "fixed": fixed,
+            "skipped": skipped,
+            "courses": drift,
+        }
@@ -1,10 +1,18 @@
-from typing import List, Optional
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import delete, desc, update
 
-from app.models.models import Registration, RegistrationStatus, CourseStatus
+from app.db import partitions
+from app.models.models import Course, Registration, RegistrationStatus, CourseStatus
 from app.schemas.schemas import RegistrationCreate, RegistrationUpdate
-from app.services.course_service import CourseService
+from app.services.course_service import CourseService, SeatsUnavailable
+from app.services.stats_service import StatsService
+from app.services import outbox
+from app.services.outbox import OutboxService
+from app.services.projection import registration_projection
+from app.services.versioning import check_version, retry_on_conflict
 
 
 class RegistrationService:
@@ -22,13 +30,20 @@ class RegistrationService:
         limit: int = 100,
         course_id: Optional[int] = None,
         user_id: Optional[int] = None,
-        status: Optional[RegistrationStatus] = None
+        status: Optional[RegistrationStatus] = None,
+        ids: Optional[List[int]] = None,
+        fields: Optional[List[str]] = None
     ) -> List[Registration]:
-        """取得報名列表"""
-        query = db.query(Registration)
+        """取得報名列表（ids：只取指定的報名；fields：只載入指定的欄位）"""
+        query = db.query(Registration).options(*registration_projection.query_options(fields))
         
+        if ids:
+            query = query.filter(Registration.id.in_(ids))
         if course_id:
-            query = query.filter(Registration.course_id == course_id)
+            query = query.filter(
+                Registration.course_id == course_id,
+                *RegistrationService._partition_bounds(db, course_id)
+            )
         if user_id:
             query = query.filter(Registration.user_id == user_id)
         if status:
@@ -36,6 +51,19 @@ class RegistrationService:
         
         return query.order_by(desc(Registration.created_at)).offset(skip).limit(limit).all()
     
+    @staticmethod
+    def _partition_bounds(db: Session, course_id: int) -> list:
+        """
+        分割表上依課程查詢時額外的 created_at 下限
+        
+        課程的報名不會早於課程建立的時間，加上這個條件後 PostgreSQL 只需掃描
+        課程建立之後的分割；非分割表（SQLite）不需要
+        """
+        if not partitions.is_partitioned(db.connection(), Registration.__table__):
+            return []
+        created_at = db.query(Course.created_at).filter(Course.id == course_id).scalar()
+        return [Registration.created_at >= created_at] if created_at else []
+    
     @staticmethod
     def get_by_email(db: Session, email: str) -> List[Registration]:
         """根據 email 取得報名記錄"""
@@ -49,57 +77,96 @@ class RegistrationService:
         if not course:
             return None
         
-        # 檢查課程狀態
-        if course.status == CourseStatus.FULL:
+        # 以條件式 UPDATE 佔用名額：剩餘名額以資料庫中目前的值判斷，並行的報名不會超額
+        confirmed = course.status != CourseStatus.FULL and CourseService.adjust_registrations(
+            db, course.id, registration_in.participants
+        ) is not None
+        if not confirmed:
+            if course.status != CourseStatus.FULL:
+                # 名額不足：重新讀取課程，若已被其他報名佔滿則加入候補
+                db.refresh(course)
+            if course.status != CourseStatus.FULL:
+                db.rollback()
+                return None  # 名額不足
             # 如果課程已額滿，加入候補
             registration_in_dict = registration_in.model_dump()
             registration = Registration(**registration_in_dict)
             registration.status = RegistrationStatus.WAITLIST
             db.add(registration)
+            StatsService.registration_changed(db, registration, course.category)
+            db.flush()
+            RegistrationService._record_event(db, outbox.REGISTRATION_WAITLISTED, registration)
             db.commit()
-            db.refresh(registration)
             return registration
         
-        # 檢查名額
-        available_spots = course.max_spots - course.current_registrations
-        if available_spots < registration_in.participants:
-            return None  # 名額不足
-        
         # 建立報名記錄
         registration_in_dict = registration_in.model_dump()
         registration = Registration(**registration_in_dict)
         registration.status = RegistrationStatus.CONFIRMED
         
         db.add(registration)
+        StatsService.registration_changed(db, registration, course.category)
+        db.flush()
+        RegistrationService._record_event(db, outbox.REGISTRATION_CONFIRMED, registration)
         db.commit()
-        
-        # 更新課程報名人數（根據參加人數增加）
-        for _ in range(registration_in.participants):
-            CourseService.increment_registration(db, registration_in.course_id)
-        
-        db.refresh(registration)
         return registration
     
     @staticmethod
+    @retry_on_conflict
     def update(
         db: Session,
         registration_id: int,
-        registration_in: RegistrationUpdate
+        registration_in: RegistrationUpdate,
+        expected_version: Optional[int] = None
     ) -> Optional[Registration]:
-        """更新報名記錄"""
+        """
+        更新報名記錄
+        
+        - **expected_version**: If-Match 指定的版本號，與目前版本不同時引發 VersionConflict
+        """
         registration = db.query(Registration).filter(
             Registration.id == registration_id
         ).first()
         
         if not registration:
             return None
+        check_version(registration, expected_version)
         
+        old_status = registration.status
+        was_cancelled = old_status == RegistrationStatus.CANCELLED
         update_data = registration_in.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(registration, field, value)
         
+        # 狀態進出「已確認」時同步調整課程報名人數
+        was_confirmed = old_status == RegistrationStatus.CONFIRMED
+        is_confirmed = registration.status == RegistrationStatus.CONFIRMED
+        if was_confirmed != is_confirmed:
+            adjusted = CourseService.adjust_registrations(
+                db, registration.course_id,
+                registration.participants if is_confirmed else -registration.participants
+            )
+            if adjusted is None:
+                raise SeatsUnavailable(registration.course_id)
+        
+        is_cancelled = registration.status == RegistrationStatus.CANCELLED
+        if was_cancelled != is_cancelled:
+            StatsService.registration_cancelled(
+                db, registration, registration.course.category,
+                delta=1 if is_cancelled else -1
+            )
+        
+        if is_cancelled and not was_cancelled:
+            event_type = outbox.REGISTRATION_CANCELLED
+        elif is_confirmed and not was_confirmed:
+            event_type = outbox.REGISTRATION_CONFIRMED  # 例如候補轉正取
+        else:
+            event_type = outbox.REGISTRATION_UPDATED
+        RegistrationService._record_event(
+            db, event_type, registration, previous_status=old_status.name
+        )
+        
         db.commit()
-        db.refresh(registration)
         return registration
     
     @staticmethod
@@ -114,13 +181,19 @@ class RegistrationService:
         
         # 如果是已確認的報名，需要釋放名額
         if registration.status == RegistrationStatus.CONFIRMED:
-            for _ in range(registration.participants):
-                CourseService.decrement_registration(db, registration.course_id)
+            CourseService.adjust_registrations(
+                db, registration.course_id, -registration.participants
+            )
         
-        registration.status = RegistrationStatus.CANCELLED
+        if registration.status != RegistrationStatus.CANCELLED:
+            StatsService.registration_cancelled(db, registration, registration.course.category)
+            previous_status = registration.status
+            registration.status = RegistrationStatus.CANCELLED
+            RegistrationService._record_event(
+                db, outbox.REGISTRATION_CANCELLED, registration,
+                previous_status=previous_status.name
+            )
         db.commit()
-        db.refresh(registration)
-        
         return registration
     
     @staticmethod
@@ -135,20 +208,158 @@ class RegistrationService:
         
         # 如果是已確認的報名，需要釋放名額
         if registration.status == RegistrationStatus.CONFIRMED:
-            for _ in range(registration.participants):
-                CourseService.decrement_registration(db, registration.course_id)
+            CourseService.adjust_registrations(
+                db, registration.course_id, -registration.participants
+            )
         
+        StatsService.registration_changed(
+            db, registration, registration.course.category, sign=-1,
+            cancelled=registration.status == RegistrationStatus.CANCELLED
+        )
+        RegistrationService._record_event(db, outbox.REGISTRATION_DELETED, registration)
         db.delete(registration)
         db.commit()
         return True
     
+    @staticmethod
+    def _bulk_targets(
+        db: Session,
+        course_ids: Optional[List[int]] = None,
+        registration_ids: Optional[List[int]] = None,
+        status: Optional[RegistrationStatus] = None,
+        exclude_cancelled: bool = False
+    ) -> list:
+        """整批操作的目標報名（鎖定到交易結束），附帶課程類別供統計使用"""
+        query = db.query(
+            Registration.id, Registration.course_id, Registration.participants,
+            Registration.status, Registration.created_at, Course.category
+        ).join(Course, Course.id == Registration.course_id)
+        if course_ids:
+            query = query.filter(Registration.course_id.in_(course_ids))
+        if registration_ids:
+            query = query.filter(Registration.id.in_(registration_ids))
+        if status:
+            query = query.filter(Registration.status == status)
+        if exclude_cancelled:
+            query = query.filter(Registration.status != RegistrationStatus.CANCELLED)
+        return query.order_by(Registration.id).with_for_update(of=Registration).all()
+    
+    @staticmethod
+    def _released_seats(rows) -> Dict[int, int]:
+        """已確認的報名依課程加總參加人數（取消或刪除後要釋放的名額）"""
+        seats: Dict[int, int] = defaultdict(int)
+        for row in rows:
+            if row.status == RegistrationStatus.CONFIRMED:
+                seats[row.course_id] += row.participants or 1
+        return seats
+    
+    @staticmethod
+    def _event_payload(row, status: RegistrationStatus, previous_status: Optional[str] = None) -> dict:
+        payload = {"course_id": row.course_id, "participants": row.participants, "status": status.name}
+        if previous_status is not None:
+            payload["previous_status"] = previous_status
+        return payload
+    
+    @staticmethod
+    def bulk_cancel(
+        db: Session,
+        course_ids: Optional[List[int]] = None,
+        registration_ids: Optional[List[int]] = None,
+        status: Optional[RegistrationStatus] = None
+    ) -> dict:
+        """
+        整批取消報名（例如課程因天候停辦時取消該課程的所有報名）
+        
+        以單一 UPDATE 取消所有目標報名；釋放的名額以一個 UPDATE 依課程加減，
+        統計依課程、類別、日期分組更新，outbox 事件以一個 INSERT 寫入，全部在同一個交易中提交
+        """
+        rows = RegistrationService._bulk_targets(
+            db, course_ids, registration_ids, status, exclude_cancelled=True
+        )
+        seats = RegistrationService._released_seats(rows)
+        if rows:
+            db.execute(
+                update(Registration)
+                .where(Registration.id.in_([row.id for row in rows]))
+                .values(
+                    status=RegistrationStatus.CANCELLED,
+                    updated_at=datetime.utcnow(),
+                    version=Registration.version + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            CourseService.adjust_registrations_many(
+                db, {course_id: -count for course_id, count in seats.items()}
+            )
+            StatsService.registrations_cancelled_many(db, rows)
+            OutboxService.record_many(db, [
+                (outbox.REGISTRATION_CANCELLED, row.id, RegistrationService._event_payload(
+                    row, RegistrationStatus.CANCELLED, previous_status=row.status.name
+                ))
+                for row in rows
+            ])
+        db.commit()
+        return {
+            "matched": len(rows),
+            "changed": len(rows),
+            "released_spots": sum(seats.values()),
+            "course_ids": sorted({row.course_id for row in rows}),
+        }
+    
+    @staticmethod
+    def bulk_delete(
+        db: Session,
+        course_ids: Optional[List[int]] = None,
+        registration_ids: Optional[List[int]] = None,
+        status: Optional[RegistrationStatus] = None
+    ) -> dict:
+        """
+        整批刪除報名
+        
+        以單一 DELETE 刪除所有目標報名，名額、統計與 outbox 事件的處理與 bulk_cancel() 相同
+        """
+        rows = RegistrationService._bulk_targets(db, course_ids, registration_ids, status)
+        seats = RegistrationService._released_seats(rows)
+        if rows:
+            db.execute(
+                delete(Registration)
+                .where(Registration.id.in_([row.id for row in rows]))
+                .execution_options(synchronize_session=False)
+            )
+            CourseService.adjust_registrations_many(
+                db, {course_id: -count for course_id, count in seats.items()}
+            )
+            StatsService.registrations_removed_many(db, rows)
+            OutboxService.record_many(db, [
+                (outbox.REGISTRATION_DELETED, row.id, RegistrationService._event_payload(row, row.status))
+                for row in rows
+            ])
+        db.commit()
+        return {
+            "matched": len(rows),
+            "changed": len(rows),
+            "released_spots": sum(seats.values()),
+            "course_ids": sorted({row.course_id for row in rows}),
+        }
+    
+    @staticmethod
+    def _record_event(
+        db: Session,
+        event_type: str,
+        registration: Registration,
+        previous_status: Optional[str] = None
+    ) -> None:
+        """寫入報名的 outbox 事件（與報名異動在同一個交易中）"""
+        OutboxService.record(db, event_type, registration.id, RegistrationService._event_payload(
+            registration, registration.status, previous_status
+        ))
+    
     @staticmethod
     def get_count(db: Session, course_id: Optional[int] = None) -> int:
-        """取得報名總數"""
-        query = db.query(Registration)
+        """取得報名總數（讀取統計計數）"""
         if course_id:
-            query = query.filter(Registration.course_id == course_id)
-        return query.count()
+            return StatsService.get_course_registration_count(db, course_id)
+        return StatsService.get_counter(db, "registrations")
     
     @staticmethod
     def check_duplicate(db: Session, email: str, course_id: int) -> bool:
@@ -156,6 +367,7 @@ class RegistrationService:
         existing = db.query(Registration).filter(
             Registration.email == email,
             Registration.course_id == course_id,
-            Registration.status != RegistrationStatus.CANCELLED
+            Registration.status != RegistrationStatus.CANCELLED,
+            *RegistrationService._partition_bounds(db, course_id)
         ).first()
         return existing is not None
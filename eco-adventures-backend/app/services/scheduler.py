@@ -0,0 +1,443 @@
+"""
+課程狀態背景排程
+
+依課程日期與時間自動套用狀態轉換：
+- 即將開始（UPCOMING）→ 報名中（ONGOING）：課程開始時間到達
+- 即將開始／報名中／已額滿 → 已結束（COMPLETED）：課程結束時間到達
+
+排程以最小堆積記錄下一個到期時間，睡到該時間才醒來，不做輪詢；
+多個 worker 之間透過 scheduler_locks 資料表的鎖定列選出唯一的領導者；
+其他 worker 新增課程或異動日期、狀態時經由 cache_sync 通知領導者重新載入到期時間。
+若設定 SEAT_RECONCILE_INTERVAL_SECONDS，領導者也會定期核對課程報名人數；
+若設定 ARCHIVE_INTERVAL_SECONDS，領導者也會定期封存已結束的舊課程；
+PostgreSQL 上領導者也會每 PARTITION_MAINTENANCE_INTERVAL_SECONDS 秒建立與清除分割；
+若設定 CHANGES_COMPACT_INTERVAL_SECONDS，領導者也會定期壓縮增量同步的異動紀錄。
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, event, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.timeutils import local_now
+from app.db.database import SessionLocal
+from app.models.models import Course, CourseStatus, SchedulerLock
+from app.services.cache_sync import CacheSync, cache_sync
+from app.services.seat_stream import publish_seats
+from app.services.change_feed import record_changes, ENTITY_COURSE
+
+logger = logging.getLogger(__name__)
+
+# 尚未結束、仍需排程處理的課程狀態
+ACTIVE_STATUSES = (CourseStatus.UPCOMING, CourseStatus.ONGOING, CourseStatus.FULL)
+
+SCHEDULE_CHANNEL = "schedule"
+
+
+def course_start(course_date, start_time: Optional[time]) -> datetime:
+    """課程開始時間（未設定時間時視為當天 00:00）"""
+    return datetime.combine(course_date, start_time or time.min)
+
+
+def course_end(course_date, end_time: Optional[time]) -> datetime:
+    """課程結束時間（未設定時間時視為當天結束）"""
+    if end_time is None:
+        return datetime.combine(course_date + timedelta(days=1), time.min)
+    return datetime.combine(course_date, end_time)
+
+
+class CourseLifecycleScheduler:
+    """課程狀態排程器，由應用程式 lifespan 啟動與停止"""
+
+    lock_name = "course_lifecycle"
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.last_run_at: Optional[datetime] = None
+        self.last_lag_seconds: Optional[float] = None
+        self.last_transitions: Dict[str, int] = {}
+        self.last_reconcile_at: Optional[datetime] = None
+        self.last_reconcile: Dict[str, int] = {}
+        self.last_archive_at: Optional[datetime] = None
+        self.last_archive: Dict[str, int] = {}
+        self.last_partition_at: Optional[datetime] = None
+        self.last_partition: Dict[str, List[str]] = {}
+        self.last_compact_at: Optional[datetime] = None
+        self.last_compact: Dict[str, int] = {}
+        self._heap: List[Tuple[datetime, int]] = []
+        self._dirty = True
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作"""
+        if self._task is not None:
+            return
+        # 預先載入應用程式（preload）後 fork 的 worker 會複製同一個 owner，需在各自啟動時重新產生
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="course-lifecycle-scheduler")
+
+    async def stop(self) -> None:
+        """停止背景工作並釋放領導者鎖"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.is_leader:
+            await asyncio.to_thread(self._release_lock)
+            self.is_leader = False
+
+    def notify(self, db: Session) -> None:
+        """
+        課程新增或日期、狀態異動時在 commit 前呼叫，讓排程重新載入到期時間
+
+        不會 commit：commit 後喚醒本 worker 的排程，並寫入 cache_sync 通知，
+        讓其他 worker 上的領導者也重新載入；交易回復時不會喚醒
+        """
+        if not db.info.get("schedule_changed"):
+            db.info["schedule_changed"] = True
+            CacheSync.publish(db, SCHEDULE_CHANNEL)
+
+    def wake(self) -> None:
+        """
+        標記到期時間需要重新載入並喚醒主迴圈
+
+        可在任何執行緒呼叫（commit 事件與 cache_sync 的輪詢都在 thread 中執行）
+        """
+        self._dirty = True
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:  # 事件迴圈已關閉
+                pass
+
+    @property
+    def next_due_at(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    # ---------- 主迴圈 ----------
+
+    async def _run(self) -> None:
+        while True:
+            sleep_for = settings.SCHEDULER_LOCK_TTL_SECONDS / 2
+            try:
+                self.is_leader = await asyncio.to_thread(self._try_acquire_lock)
+                if self.is_leader:
+                    sleep_for = await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("課程狀態排程執行失敗")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(sleep_for, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self) -> float:
+        """處理到期的轉換，回傳下次需要醒來的秒數"""
+        if self._dirty:
+            self._dirty = False
+            self._heap = await asyncio.to_thread(self._load_heap)
+
+        now = local_now()
+        earliest_due = None
+        while self._heap and self._heap[0][0] <= now:
+            due, _ = heapq.heappop(self._heap)
+            earliest_due = due if earliest_due is None else min(earliest_due, due)
+
+        if earliest_due is not None:
+            self.last_transitions = await asyncio.to_thread(self.apply_transitions, now)
+            self.last_run_at = now
+            self.last_lag_seconds = (now - earliest_due).total_seconds()
+            # 轉換後的課程可能還有下一個到期時間（例如開始後還要結束）
+            self._heap = await asyncio.to_thread(self._load_heap)
+
+        sleep_for = min(
+            settings.SCHEDULER_LOCK_TTL_SECONDS / 2,
+            settings.SCHEDULER_MAX_SLEEP_SECONDS
+        )
+        interval = settings.SEAT_RECONCILE_INTERVAL_SECONDS
+        if interval > 0:
+            elapsed = (now - self.last_reconcile_at).total_seconds() \
+                if self.last_reconcile_at else interval
+            if elapsed >= interval:
+                self.last_reconcile = await asyncio.to_thread(self._reconcile_seats)
+                self.last_reconcile_at = now
+                elapsed = 0
+            sleep_for = min(sleep_for, interval - elapsed)
+        interval = settings.ARCHIVE_INTERVAL_SECONDS
+        if interval > 0:
+            elapsed = (now - self.last_archive_at).total_seconds() \
+                if self.last_archive_at else interval
+            if elapsed >= interval:
+                self.last_archive = await asyncio.to_thread(self._archive_courses)
+                self.last_archive_at = now
+                elapsed = 0
+            sleep_for = min(sleep_for, interval - elapsed)
+        interval = settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+        if interval > 0:
+            elapsed = (now - self.last_partition_at).total_seconds() \
+                if self.last_partition_at else interval
+            if elapsed >= interval:
+                self.last_partition = await asyncio.to_thread(self._maintain_partitions)
+                self.last_partition_at = now
+                elapsed = 0
+            sleep_for = min(sleep_for, interval - elapsed)
+        interval = settings.CHANGES_COMPACT_INTERVAL_SECONDS
+        if interval > 0:
+            elapsed = (now - self.last_compact_at).total_seconds() \
+                if self.last_compact_at else interval
+            if elapsed >= interval:
+                self.last_compact = await asyncio.to_thread(self._compact_changes)
+                self.last_compact_at = now
+                elapsed = 0
+            sleep_for = min(sleep_for, interval - elapsed)
+        if self._heap:
+            sleep_for = min(sleep_for, (self._heap[0][0] - local_now()).total_seconds())
+        return sleep_for
+
+    # ---------- 資料庫操作（在 thread 中執行） ----------
+
+    def _load_heap(self) -> List[Tuple[datetime, int]]:
+        """載入所有尚未結束課程的下一個到期時間"""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Course.id, Course.status, Course.date, Course.start_time, Course.end_time
+            ).filter(Course.status.in_(ACTIVE_STATUSES)).all()
+        finally:
+            db.close()
+
+        heap = []
+        for row in rows:
+            if row.status == CourseStatus.UPCOMING:
+                heap.append((course_start(row.date, row.start_time), row.id))
+            else:
+                heap.append((course_end(row.date, row.end_time), row.id))
+        heapq.heapify(heap)
+        return heap
+
+    @staticmethod
+    def apply_transitions(now: Optional[datetime] = None) -> Dict[str, int]:
+        """以整批 UPDATE 套用所有已到期的狀態轉換，回傳各轉換的筆數"""
+        now = now or local_now()
+        today, now_time = now.date(), now.time()
+        db = SessionLocal()
+        try:
+            ended = or_(
+                Course.date < today,
+                and_(
+                    Course.date == today,
+                    Course.end_time.isnot(None),
+                    Course.end_time <= now_time
+                )
+            )
+            completed = db.execute(
+                update(Course)
+                .where(Course.status.in_(ACTIVE_STATUSES), ended)
+                .values(
+                    status=CourseStatus.COMPLETED,
+                    updated_at=datetime.utcnow(),
+                    version=Course.version + 1
+                )
+                .returning(Course.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+
+            started = or_(
+                Course.date < today,
+                and_(
+                    Course.date == today,
+                    or_(Course.start_time.is_(None), Course.start_time <= now_time)
+                )
+            )
+            ongoing = db.execute(
+                update(Course)
+                .where(Course.status == CourseStatus.UPCOMING, started)
+                .values(
+                    status=CourseStatus.ONGOING,
+                    updated_at=datetime.utcnow(),
+                    version=Course.version + 1
+                )
+                .returning(Course.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            publish_seats(db, [*completed, *ongoing])
+            record_changes(db, ENTITY_COURSE, [*completed, *ongoing])
+            db.commit()
+        finally:
+            db.close()
+
+        if completed or ongoing:
+            logger.info("課程狀態排程：%d 門開始、%d 門結束", len(ongoing), len(completed))
+        return {"ongoing": len(ongoing), "completed": len(completed)}
+
+    @staticmethod
+    def _reconcile_seats() -> Dict[str, int]:
+        """定期名額核對"""
+        from app.services.reconcile_service import ReconcileService
+        
+        db = SessionLocal()
+        try:
+            result = ReconcileService.reconcile(db, fix=settings.SEAT_RECONCILE_FIX)
+        finally:
+            db.close()
+        if result["drifted"]:
+            logger.warning(
+                "名額核對：%d 門課程不一致，已修正 %d 門，%d 門期間有異動而略過",
+                result["drifted"], result["fixed"], result["skipped"]
+            )
+        return {"drifted": result["drifted"], "fixed": result["fixed"], "skipped": result["skipped"]}
+
+    @staticmethod
+    def _archive_courses() -> Dict[str, int]:
+        """定期封存已結束的舊課程"""
+        from app.services.archive_service import ArchiveService
+
+        db = SessionLocal()
+        try:
+            result = ArchiveService.archive(db)
+        finally:
+            db.close()
+        return {"courses": result["courses"], "registrations": result["registrations"]}
+
+    @staticmethod
+    def _maintain_partitions() -> Dict[str, List[str]]:
+        """建立未來的報名分割並清除過期的空分割（非分割表時不做任何事）"""
+        from app.db import partitions
+        from app.models.models import Registration
+
+        db = SessionLocal()
+        try:
+            conn = db.connection()
+            created = partitions.ensure_partitions(conn, Registration.__table__)
+            expired = partitions.drop_expired(conn, Registration.__table__)
+            db.commit()
+        finally:
+            db.close()
+        return {"created": created, **expired}
+
+    @staticmethod
+    def _compact_changes() -> Dict[str, int]:
+        """定期壓縮增量同步的異動紀錄"""
+        from app.services.change_feed import ChangeFeedService
+
+        db = SessionLocal()
+        try:
+            return ChangeFeedService.compact(db)
+        finally:
+            db.close()
+
+    def _try_acquire_lock(self) -> bool:
+        """取得或續約領導者鎖"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=settings.SCHEDULER_LOCK_TTL_SECONDS)
+        db = SessionLocal()
+        try:
+            acquired = db.execute(
+                update(SchedulerLock)
+                .where(
+                    SchedulerLock.name == self.lock_name,
+                    or_(SchedulerLock.owner == self.owner, SchedulerLock.expires_at < now)
+                )
+                .values(owner=self.owner, expires_at=expires_at)
+            ).rowcount == 1
+            if not acquired and db.get(SchedulerLock, self.lock_name) is None:
+                db.add(SchedulerLock(
+                    name=self.lock_name, owner=self.owner, expires_at=expires_at
+                ))
+                try:
+                    db.flush()
+                    acquired = True
+                except IntegrityError:  # 其他 worker 同時建立了鎖
+                    db.rollback()
+                    return False
+            db.commit()
+        finally:
+            db.close()
+
+        if acquired and not self.is_leader:
+            # 剛成為領導者：重新載入到期時間
+            self._dirty = True
+        return acquired
+
+    def _release_lock(self) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(SchedulerLock)
+                .where(SchedulerLock.name == self.lock_name, SchedulerLock.owner == self.owner)
+                .values(expires_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # ---------- 狀態 ----------
+
+    def status(self) -> dict:
+        """排程器狀態（供監控使用）"""
+        now = local_now()
+        next_due = self.next_due_at
+        return {
+            "enabled": settings.SCHEDULER_ENABLED,
+            "running": self._task is not None,
+            "is_leader": self.is_leader,
+            "owner": self.owner,
+            "last_run_at": self.last_run_at,
+            "last_lag_seconds": self.last_lag_seconds,
+            "last_transitions": self.last_transitions,
+            "next_due_at": next_due,
+            # 若下一個到期時間已過仍未處理，代表排程落後
+            "current_lag_seconds": max((now - next_due).total_seconds(), 0) if next_due else 0,
+            "pending": len(self._heap),
+            "last_reconcile_at": self.last_reconcile_at,
+            "last_reconcile": self.last_reconcile,
+            "last_archive_at": self.last_archive_at,
+            "last_archive": self.last_archive,
+            "last_partition_at": self.last_partition_at,
+            "last_partition": self.last_partition,
+            "last_compact_at": self.last_compact_at,
+            "last_compact": self.last_compact,
+        }
+
+
+lifecycle_scheduler = CourseLifecycleScheduler()
+
+
+@cache_sync.subscribe(SCHEDULE_CHANNEL)
+def _schedule_changed_on_other_worker(db: Session, keys) -> None:
+    lifecycle_scheduler.wake()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    if not session.in_nested_transaction() and session.info.pop("schedule_changed", False):
+        lifecycle_scheduler.wake()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("schedule_changed", None)
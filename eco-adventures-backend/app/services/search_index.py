@@ -0,0 +1,405 @@
+"""
+自動完成（type-ahead）用的記憶體前綴索引
+
+以「排序陣列 + bisect」實作：每個可搜尋文字會展開成數個正規化後的鍵
+（整句、每個英數字詞開頭、每個中日韓字元開頭的後綴），查詢時以二分搜尋
+找出前綴範圍，再依熱門度（報名人數）取前 k 筆。重建時收集所有鍵後只排序一次。
+
+單一中文字這類很短的前綴會涵蓋大量項目，範圍超過 WIDE_PREFIX_ENTRIES 筆時改用快取的
+熱門清單（每個前綴保留前 WIDE_PREFIX_TOP 筆，最多 WIDE_PREFIX_TTL_SECONDS 秒或項目增刪時重新掃描），
+不會每次輸入都掃描整個範圍。
+
+索引保存在各 worker 的記憶體中：課程、講師與 FAQ 的異動會寫入快取失效通知
+（search 頻道，項目為 course:12 這類鍵），其他 worker 收到後從資料庫重新載入該筆資料。
+"""
+
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.models import Course, Instructor, FAQ
+from app.services.cache_sync import CacheSync, cache_sync
+
+# 建議類型
+KIND_COURSE = "course"
+KIND_LOCATION = "location"
+KIND_INSTRUCTOR = "instructor"
+KIND_FAQ = "faq"
+
+# 每個索引鍵最多保留的字元數（查詢也會截斷到相同長度）
+MAX_KEY_LENGTH = 24
+
+# 注音符號與聲調，輸入法組字中的查詢會夾帶這些字元
+_ZHUYIN_RANGES = ((0x3105, 0x312F), (0x31A0, 0x31BF))
+_ZHUYIN_TONES = {"ˊ", "ˇ", "ˋ", "˙"}
+
+# 前綴範圍超過此筆數時改用快取的熱門清單
+WIDE_PREFIX_ENTRIES = 1000
+# 熱門清單保留的項目數與重新掃描的間隔（清單中的項目仍依目前的熱門度排序）
+WIDE_PREFIX_TOP = 50
+WIDE_PREFIX_TTL_SECONDS = 60
+# 最多快取的前綴數
+WIDE_PREFIX_MAX_CACHED = 1024
+
+DocKey = Tuple[str, Union[int, str]]
+
+# 快取同步頻道
+SEARCH_CHANNEL = "search"
+
+
+@dataclass
+class Suggestion:
+    """索引中的一筆建議項目"""
+    kind: str
+    ident: Union[int, str]
+    text: str
+    popularity: int = 0
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF      # CJK 統一漢字
+        or 0x3400 <= code <= 0x4DBF   # 擴充 A
+        or 0x20000 <= code <= 0x2FA1F # 擴充 B 以後與相容字
+        or 0xF900 <= code <= 0xFAFF   # 相容漢字
+        or 0x3040 <= code <= 0x30FF   # 平假名、片假名
+        or 0xAC00 <= code <= 0xD7AF   # 韓文音節
+    )
+
+
+def _is_zhuyin(ch: str) -> bool:
+    code = ord(ch)
+    return ch in _ZHUYIN_TONES or any(lo <= code <= hi for lo, hi in _ZHUYIN_RANGES)
+
+
+def normalize(text: str) -> str:
+    """正規化文字：全形轉半形、大小寫折疊、移除多餘空白"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(text.split())
+
+
+def normalize_query(query: str) -> str:
+    """正規化查詢字串，並移除輸入法尚未選字的注音符號"""
+    text = normalize(query)
+    text = "".join(ch for ch in text if not _is_zhuyin(ch)).strip()
+    return text[:MAX_KEY_LENGTH]
+
+
+def _index_keys(text: str) -> List[str]:
+    """產生一段文字的所有索引鍵"""
+    text = normalize(text)
+    keys = set()
+    prev = " "
+    for i, ch in enumerate(text):
+        # 中日韓文字沒有空白分詞，每個字都可以是前綴的起點；
+        # 英數字則只從詞的開頭開始
+        if _is_cjk(ch) or (ch.isalnum() and not prev.isalnum()):
+            keys.add(text[i:i + MAX_KEY_LENGTH])
+        prev = ch
+    if text:
+        keys.add(text[:MAX_KEY_LENGTH])
+    return sorted(keys)
+
+
+class SuggestionIndex:
+    """課程標題、地點、講師與 FAQ 的前綴索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: List[Tuple[str, str, str]] = []  # (鍵, 類型, 識別碼字串)
+        self._docs: Dict[DocKey, Suggestion] = {}
+        self._doc_keys: Dict[DocKey, List[str]] = {}
+        # 課程對地點／講師熱門度的貢獻：course_id -> (地點, 講師 ID, 報名人數)
+        self._course_meta: Dict[int, Tuple[Optional[str], Optional[int], int]] = {}
+        # 地點被多少門課程引用：正規化地點 -> 課程數
+        self._location_counts: Dict[str, int] = {}
+        # 涵蓋大量項目的前綴：(前綴, 類型) -> (掃描時間, 熱門清單)
+        self._wide: Dict[Tuple[str, Optional[frozenset]], Tuple[float, List[Suggestion]]] = {}
+        # 重建期間只附加鍵，完成後一次排序
+        self._sorted = True
+
+    # ---------- 低階操作 ----------
+
+    def _add_doc(self, doc: Suggestion) -> None:
+        key = (doc.kind, doc.ident)
+        self._remove_doc(key)
+        keys = _index_keys(doc.text)
+        ident = str(doc.ident)
+        if self._sorted:
+            for k in keys:
+                bisect.insort(self._entries, (k, doc.kind, ident))
+        else:
+            self._entries.extend((k, doc.kind, ident) for k in keys)
+        self._docs[key] = doc
+        self._doc_keys[key] = keys
+        self._wide.clear()
+
+    def _remove_doc(self, key: DocKey) -> None:
+        keys = self._doc_keys.pop(key, None)
+        self._docs.pop(key, None)
+        if not keys:
+            return
+        ident = str(key[1])
+        self._wide.clear()
+        if not self._sorted:
+            self._entries = [e for e in self._entries if (e[1], e[2]) != (key[0], ident)]
+            return
+        for k in keys:
+            entry = (k, key[0], ident)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def _bump(self, key: DocKey, delta: int, text: Optional[str] = None) -> None:
+        """調整彙總型項目（地點、講師）的熱門度，地點歸零時自動移除"""
+        doc = self._docs.get(key)
+        if doc is None:
+            if key[0] != KIND_LOCATION or not text:
+                return
+            doc = Suggestion(kind=KIND_LOCATION, ident=key[1], text=text)
+            self._add_doc(doc)
+        doc.popularity += delta
+
+    def _attach_course(self, course_id: int, location: Optional[str],
+                       instructor_id: Optional[int], popularity: int) -> None:
+        self._detach_course(course_id)
+        self._course_meta[course_id] = (location, instructor_id, popularity)
+        if location:
+            self._bump((KIND_LOCATION, normalize(location)), popularity, text=location)
+            self._location_refs(normalize(location), +1)
+        if instructor_id is not None:
+            self._bump((KIND_INSTRUCTOR, instructor_id), popularity)
+
+    def _detach_course(self, course_id: int) -> None:
+        meta = self._course_meta.pop(course_id, None)
+        if meta is None:
+            return
+        location, instructor_id, popularity = meta
+        if location:
+            self._bump((KIND_LOCATION, normalize(location)), -popularity)
+            self._location_refs(normalize(location), -1)
+        if instructor_id is not None:
+            self._bump((KIND_INSTRUCTOR, instructor_id), -popularity)
+
+    def _location_refs(self, ident: str, delta: int) -> None:
+        refs = self._location_counts.get(ident, 0) + delta
+        if refs <= 0:
+            self._location_counts.pop(ident, None)
+            self._remove_doc((KIND_LOCATION, ident))
+        else:
+            self._location_counts[ident] = refs
+
+    # ---------- 建立與增量更新 ----------
+
+    def rebuild(self, db: Session) -> None:
+        """
+        從資料庫重建整個索引（啟動時與其他 worker 通知整個索引失效時呼叫）
+
+        在另一個索引物件中建立（收集所有鍵後排序一次），完成後才在鎖內替換，建立期間查詢不受影響
+        """
+        courses = db.query(
+            Course.id, Course.title, Course.location,
+            Course.instructor_id, Course.current_registrations
+        ).all()
+        instructors = db.query(Instructor.id, Instructor.name).filter(
+            Instructor.is_active == True  # noqa: E712
+        ).all()
+        faqs = db.query(FAQ.id, FAQ.question).filter(FAQ.is_active == True).all()  # noqa: E712
+
+        fresh = SuggestionIndex()
+        fresh._sorted = False
+        for row in instructors:
+            fresh._add_doc(Suggestion(KIND_INSTRUCTOR, row.id, row.name))
+        for row in faqs:
+            fresh._add_doc(Suggestion(KIND_FAQ, row.id, row.question))
+        for row in courses:
+            popularity = row.current_registrations or 0
+            fresh._add_doc(Suggestion(KIND_COURSE, row.id, row.title, popularity))
+            fresh._attach_course(row.id, row.location, row.instructor_id, popularity)
+        fresh._entries.sort()
+
+        with self._lock:
+            self._entries = fresh._entries
+            self._docs = fresh._docs
+            self._doc_keys = fresh._doc_keys
+            self._course_meta = fresh._course_meta
+            self._location_counts = fresh._location_counts
+            self._wide = {}
+
+    def index_course(self, course: Course) -> None:
+        """新增或更新課程"""
+        popularity = course.current_registrations or 0
+        with self._lock:
+            self._add_doc(Suggestion(KIND_COURSE, course.id, course.title, popularity))
+            self._attach_course(course.id, course.location, course.instructor_id, popularity)
+
+    def remove_course(self, course_id: int) -> None:
+        """移除課程"""
+        with self._lock:
+            self._detach_course(course_id)
+            self._remove_doc((KIND_COURSE, course_id))
+
+    def set_course_popularity(self, course_id: int, popularity: int) -> None:
+        """報名人數變動時更新課程熱門度（不需重建鍵）"""
+        with self._lock:
+            doc = self._docs.get((KIND_COURSE, course_id))
+            meta = self._course_meta.get(course_id)
+            if doc is None or meta is None:
+                return
+            delta = popularity - doc.popularity
+            doc.popularity = popularity
+            location, instructor_id, _ = meta
+            self._course_meta[course_id] = (location, instructor_id, popularity)
+            if location:
+                self._bump((KIND_LOCATION, normalize(location)), delta)
+            if instructor_id is not None:
+                self._bump((KIND_INSTRUCTOR, instructor_id), delta)
+
+    def index_instructor(self, instructor: Instructor) -> None:
+        """新增或更新講師（停用的講師不列入建議）"""
+        key = (KIND_INSTRUCTOR, instructor.id)
+        with self._lock:
+            if not instructor.is_active:
+                self._remove_doc(key)
+                return
+            popularity = sum(
+                meta[2] for meta in self._course_meta.values() if meta[1] == instructor.id
+            )
+            self._add_doc(Suggestion(KIND_INSTRUCTOR, instructor.id, instructor.name, popularity))
+
+    def remove_instructor(self, instructor_id: int) -> None:
+        """移除講師（該講師的課程同時改為沒有講師，與資料庫的 ON DELETE SET NULL 一致）"""
+        with self._lock:
+            self._remove_doc((KIND_INSTRUCTOR, instructor_id))
+            for course_id, (location, course_instructor, popularity) in list(self._course_meta.items()):
+                if course_instructor == instructor_id:
+                    self._course_meta[course_id] = (location, None, popularity)
+
+    def index_faq(self, faq: FAQ) -> None:
+        """新增或更新 FAQ（停用的 FAQ 不列入建議）"""
+        key = (KIND_FAQ, faq.id)
+        with self._lock:
+            if not faq.is_active:
+                self._remove_doc(key)
+                return
+            self._add_doc(Suggestion(KIND_FAQ, faq.id, faq.question))
+
+    def remove_faq(self, faq_id: int) -> None:
+        """移除 FAQ"""
+        with self._lock:
+            self._remove_doc((KIND_FAQ, faq_id))
+
+    def refresh(self, db: Session, keys: Set[Optional[str]]) -> None:
+        """
+        依快取失效通知從資料庫重新載入項目（course:ID、instructor:ID、faq:ID）
+
+        None 表示整個索引失效，直接重建
+        """
+        if None in keys:
+            self.rebuild(db)
+            return
+        for key in keys:
+            kind, _, ident = key.partition(":")
+            ident = int(ident)
+            if kind == KIND_COURSE:
+                course = db.query(Course).filter(Course.id == ident).first()
+                self.index_course(course) if course else self.remove_course(ident)
+            elif kind == KIND_INSTRUCTOR:
+                instructor = db.query(Instructor).filter(Instructor.id == ident).first()
+                self.index_instructor(instructor) if instructor else self.remove_instructor(ident)
+            elif kind == KIND_FAQ:
+                faq = db.query(FAQ).filter(FAQ.id == ident).first()
+                self.index_faq(faq) if faq else self.remove_faq(ident)
+
+    # ---------- 查詢 ----------
+
+    def suggest(
+        self,
+        query: str,
+        limit: int = 10,
+        kinds: Optional[Iterable[str]] = None
+    ) -> List[Suggestion]:
+        """
+        依前綴取得建議，依熱門度排序
+
+        - **query**: 使用者輸入（可含尚未選字的注音）
+        - **limit**: 回傳筆數上限
+        - **kinds**: 限定的建議類型（選填）
+        """
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+        allowed = set(kinds) if kinds else None
+
+        with self._lock:
+            lo = bisect.bisect_left(self._entries, (prefix,))
+            hi = bisect.bisect_left(self._entries, (prefix + "\U0010ffff",), lo)
+            if hi - lo > WIDE_PREFIX_ENTRIES and limit <= WIDE_PREFIX_TOP:
+                cache_key = (prefix, frozenset(allowed) if allowed is not None else None)
+                now = time.monotonic()
+                cached = self._wide.get(cache_key)
+                if cached is None or now - cached[0] > WIDE_PREFIX_TTL_SECONDS:
+                    if len(self._wide) >= WIDE_PREFIX_MAX_CACHED:
+                        self._wide.clear()
+                    cached = (now, self._top(self._candidates(lo, hi, allowed), WIDE_PREFIX_TOP))
+                    self._wide[cache_key] = cached
+                candidates = cached[1]
+            else:
+                candidates = self._candidates(lo, hi, allowed)
+            return self._top(candidates, limit)
+
+    def _candidates(self, lo: int, hi: int, allowed: Optional[Set[str]]) -> List[Suggestion]:
+        """索引範圍 [lo, hi) 內不重複的項目"""
+        seen = set()
+        candidates = []
+        for _, kind, ident in self._entries[lo:hi]:
+            if allowed is not None and kind not in allowed:
+                continue
+            if (kind, ident) in seen:
+                continue
+            seen.add((kind, ident))
+            doc = self._docs.get((kind, int(ident) if kind != KIND_LOCATION else ident))
+            if doc is not None:
+                candidates.append(doc)
+        return candidates
+
+    @staticmethod
+    def _top(candidates: List[Suggestion], limit: int) -> List[Suggestion]:
+        return heapq.nlargest(limit, candidates, key=lambda d: (d.popularity, -len(d.text)))
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+suggestion_index = SuggestionIndex()
+
+
+def publish_change(db: Session, kind: str, ident: int) -> None:
+    """通知其他 worker 重新載入一筆項目（不會 commit）"""
+    CacheSync.publish(db, SEARCH_CHANNEL, f"{kind}:{ident}")
+
+
+_INDEXED_MODELS = {Course: KIND_COURSE, Instructor: KIND_INSTRUCTOR, FAQ: KIND_FAQ}
+
+
+@cache_sync.subscribe(SEARCH_CHANNEL)
+def _refresh_from_other_worker(db: Session, keys: Set[Optional[str]]) -> None:
+    suggestion_index.refresh(db, keys)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _publish_index_changes(session: Session, flush_context) -> None:
+    # 整批 UPDATE 不經過 flush，報名人數（熱門度）的變動由寫入路徑自行呼叫 publish_change()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        kind = _INDEXED_MODELS.get(type(obj))
+        if kind is not None and obj.id is not None:
+            publish_change(session, kind, obj.id)
@@ -0,0 +1,297 @@
+"""
+課程名額與狀態的即時推播（Server-Sent Events）
+
+名額快滿時使用者會反覆重新整理課程頁面、前端也會輪詢課程列表。改由串流推播名額異動：
+
+- 寫入路徑（報名、取消、課程更新、整批操作、狀態排程、名額核對）以 publish_seats()
+  在交易中登記異動的課程，commit 後交給本 worker 的 SeatBroadcaster；同時寫入 cache_sync
+  的通知，其他 worker 輪詢到後也會推播
+- SeatBroadcaster 在事件迴圈上執行：收到通知後等待 SEAT_STREAM_COALESCE_SECONDS 秒，
+  把期間內的所有異動合併成一次查詢（不論訂閱者多少），再分送給訂閱該課程（或整個目錄）的連線
+- 每個連線只保存尚未送出的課程 → 最新狀態，同一門課程的多次異動只送最後一次；
+  閒置的連線只是一個等待中的 asyncio.Event，不佔用 threadpool 或資料庫連線
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.models import Course, CourseStatus
+from app.services.cache_sync import CacheSync, cache_sync
+
+logger = logging.getLogger(__name__)
+
+# 快取同步頻道
+SEATS_CHANNEL = "seats"
+
+# 每次查詢的課程數上限
+LOAD_CHUNK_SIZE = 500
+
+
+class SeatState(NamedTuple):
+    """一門課程的名額與狀態"""
+    id: int
+    status: Optional[CourseStatus]
+    max_spots: Optional[int]
+    current_registrations: Optional[int]
+    available_spots: Optional[int]
+    version: int
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "id": self.id,
+            "status": self.status.value if self.status else None,
+            "max_spots": self.max_spots,
+            "current_registrations": self.current_registrations,
+            "available_spots": self.available_spots,
+            "version": self.version,
+        }, ensure_ascii=False)
+
+
+class SeatSubscriber:
+    """一個串流連線的訂閱（course_ids 為 None 表示整個課程目錄）"""
+
+    __slots__ = ("course_ids", "pending", "wakeup")
+
+    def __init__(self, course_ids: Optional[FrozenSet[int]]):
+        self.course_ids = course_ids
+        # 尚未送出的異動：課程 ID -> 最新狀態（None 表示課程已刪除或封存）
+        self.pending: Dict[int, Optional[SeatState]] = {}
+        self.wakeup = asyncio.Event()
+
+    def push(self, states: Dict[int, Optional[SeatState]]) -> None:
+        self.pending.update(states)
+        self.wakeup.set()
+
+
+def _format(event_name: str, data: str) -> str:
+    return f"event: {event_name}\ndata: {data}\n\n"
+
+
+class SeatBroadcaster:
+    """名額異動的程序內發布／訂閱，由應用程式 lifespan 啟動與停止"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._dirty: Set[int] = set()
+        # 訂閱整個目錄的連線，與依課程 ID 索引的連線
+        self._catalog: Set[SeatSubscriber] = set()
+        self._by_course: Dict[int, Set[SeatSubscriber]] = {}
+        self.subscribers = 0
+        self.batches = 0
+        self.delivered = 0
+        self.last_batch_at: Optional[datetime] = None
+
+    # ---------- 生命週期 ----------
+
+    async def start(self) -> None:
+        """啟動背景工作"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="seat-stream")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+
+    # ---------- 發布 ----------
+
+    def changed(self, course_ids: Iterable[int]) -> None:
+        """
+        課程的名額或狀態已異動（已提交）
+
+        可在任何執行緒呼叫；沒有任何連線訂閱這些課程時直接略過
+        """
+        if self._loop is None or not self.subscribers:
+            return
+        with self._lock:
+            before = len(self._dirty)
+            self._dirty.update(course_ids)
+            if len(self._dirty) == before:
+                return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:  # 事件迴圈已關閉
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # 等待一小段時間，把連續的異動合併成一次查詢與一次推送
+            await asyncio.sleep(settings.SEAT_STREAM_COALESCE_SECONDS)
+            self._wakeup.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            ids = sorted(
+                dirty if self._catalog else (course_id for course_id in dirty if course_id in self._by_course)
+            )
+            if not ids:
+                continue
+            try:
+                states = await asyncio.to_thread(self.load, ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("讀取課程名額失敗")
+                continue
+            self._deliver(ids, states)
+
+    def _deliver(self, ids: List[int], states: Dict[int, SeatState]) -> None:
+        batch = {course_id: states.get(course_id) for course_id in ids}
+        for subscriber in self._catalog:
+            subscriber.push(batch)
+        self.delivered += len(self._catalog)
+        for course_id in ids:
+            for subscriber in self._by_course.get(course_id, ()):
+                subscriber.push({course_id: batch[course_id]})
+                self.delivered += 1
+        self.batches += 1
+        self.last_batch_at = datetime.utcnow()
+
+    @staticmethod
+    def load(course_ids: List[int]) -> Dict[int, SeatState]:
+        """讀取課程目前的名額與狀態（不存在的課程不會出現在結果中）"""
+        db = SessionLocal()
+        try:
+            states = {}
+            for start in range(0, len(course_ids), LOAD_CHUNK_SIZE):
+                rows = db.query(
+                    Course.id, Course.status, Course.max_spots,
+                    Course.current_registrations, Course.available_spots, Course.version
+                ).filter(Course.id.in_(course_ids[start:start + LOAD_CHUNK_SIZE])).all()
+                states.update((row.id, SeatState(*row)) for row in rows)
+            return states
+        finally:
+            db.close()
+
+    # ---------- 訂閱 ----------
+
+    @property
+    def is_full(self) -> bool:
+        """此 worker 的連線數是否已達 SEAT_STREAM_MAX_SUBSCRIBERS"""
+        return self.subscribers >= settings.SEAT_STREAM_MAX_SUBSCRIBERS
+
+    def subscribe(self, course_ids: Optional[Iterable[int]] = None) -> SeatSubscriber:
+        """新增訂閱（在事件迴圈中呼叫）"""
+        subscriber = SeatSubscriber(frozenset(course_ids) if course_ids else None)
+        if subscriber.course_ids is None:
+            self._catalog.add(subscriber)
+        else:
+            for course_id in subscriber.course_ids:
+                self._by_course.setdefault(course_id, set()).add(subscriber)
+        self.subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: SeatSubscriber) -> None:
+        if subscriber.course_ids is None:
+            self._catalog.discard(subscriber)
+        else:
+            for course_id in subscriber.course_ids:
+                watchers = self._by_course.get(course_id)
+                if watchers is not None:
+                    watchers.discard(subscriber)
+                    if not watchers:
+                        del self._by_course[course_id]
+        self.subscribers -= 1
+
+    async def stream(self, course_ids: Optional[Iterable[int]] = None) -> AsyncIterator[str]:
+        """
+        SSE 串流：先送出訂閱課程的目前狀態，之後只送異動（seats 事件；課程刪除或封存為 removed）
+
+        訂閱在產生器開始時建立、結束時移除（用戶端斷線時產生器被取消）；
+        閒置超過 SEAT_STREAM_KEEPALIVE_SECONDS 秒時送出註解行，讓代理伺服器不中斷連線
+        """
+        subscriber = self.subscribe(course_ids)
+        try:
+            yield f"retry: {settings.SEAT_STREAM_RETRY_MILLISECONDS}\n\n"
+            if subscriber.course_ids:
+                states = await asyncio.to_thread(self.load, sorted(subscriber.course_ids))
+                for course_id in sorted(subscriber.course_ids):
+                    state = states.get(course_id)
+                    if state is not None:
+                        yield _format("seats", state.to_json())
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        subscriber.wakeup.wait(), timeout=settings.SEAT_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                subscriber.wakeup.clear()
+                pending, subscriber.pending = subscriber.pending, {}
+                for course_id, state in pending.items():
+                    if state is None:
+                        yield _format("removed", json.dumps({"id": course_id}))
+                    else:
+                        yield _format("seats", state.to_json())
+        finally:
+            self.unsubscribe(subscriber)
+
+    def status(self) -> dict:
+        """推播狀態（供監控使用）"""
+        return {
+            "running": self._task is not None,
+            "subscribers": self.subscribers,
+            "catalog_subscribers": len(self._catalog),
+            "watched_courses": len(self._by_course),
+            "batches": self.batches,
+            "delivered": self.delivered,
+            "last_batch_at": self.last_batch_at,
+        }
+
+
+seat_broadcaster = SeatBroadcaster()
+
+
+def publish_seats(db: Session, course_ids: Iterable[int]) -> None:
+    """
+    登記名額或狀態異動的課程（不會 commit）
+
+    commit 後推播給本 worker 的連線；其他 worker 經由 cache_sync 收到通知後推播
+    """
+    staged = db.info.setdefault("seat_changes", set())
+    for course_id in course_ids:
+        if course_id not in staged:
+            staged.add(course_id)
+            CacheSync.publish(db, SEATS_CHANNEL, str(course_id))
+
+
+@cache_sync.subscribe(SEATS_CHANNEL)
+def _seats_from_other_worker(db: Session, keys) -> None:
+    seat_broadcaster.changed(int(key) for key in keys if key is not None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _broadcast_after_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # SAVEPOINT 的釋放也會觸發，等到最外層的交易提交後才廣播
+    staged = session.info.pop("seat_changes", None)
+    if staged:
+        seat_broadcaster.changed(staged)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("seat_changes", None)
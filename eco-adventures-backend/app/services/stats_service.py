@@ -0,0 +1,408 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.core.timeutils import local_now, to_local
+from app.db.counters import increment_row
+from app.models.models import (
+    Course, CourseCategory, CourseStatus, Registration, RegistrationStatus,
+    ArchivedCourse, ArchivedRegistration, StatCounter, CourseRegistrationStat, CategoryRegistrationStat, DailyRegistrationStat
+)
+
+# 計數名稱
+COURSES = "courses"
+REGISTRATIONS = "registrations"
+CANCELLATIONS = "cancellations"
+
+
+def _local_day(created_at: Optional[datetime]) -> date:
+    """報名建立時間（UTC）在設定時區的日期，每日統計以此分組"""
+    return to_local(created_at or datetime.utcnow()).date()
+
+
+def _sum_by_local_day(rows: Iterable, days: Optional[Dict] = None) -> Dict[Optional[date], List[int]]:
+    """
+    將 (created_at, participants, status) 依本地日期加總為 [報名數, 人數, 取消數]
+
+    時區轉換無法以跨資料庫的 SQL 表示（SQLite 沒有時區資料），改為逐列在 Python 中分組，
+    與寫入路徑使用同一個轉換；沒有建立時間的報名歸在 None
+    """
+    days = {} if days is None else days
+    for created_at, participants, status in rows:
+        row = days.setdefault(_local_day(created_at) if created_at else None, [0, 0, 0])
+        row[0] += 1
+        row[1] += participants or 0
+        row[2] += 1 if status == RegistrationStatus.CANCELLED else 0
+    return days
+
+
+class StatsService:
+    """
+    統計服務類別
+
+    計數與彙總表由課程、報名服務的寫入路徑在同一個交易中增量更新，
+    讀取時不需要任何 count()；rebuild() 可用分組查詢從頭重新計算。
+    """
+
+    # ---------- 寫入路徑 ----------
+
+    @staticmethod
+    def course_added(db: Session, delta: int = 1) -> None:
+        """課程新增（delta=1）或刪除（delta=-1）"""
+        increment_row(db, StatCounter, {"name": COURSES}, {"value": delta})
+
+    @staticmethod
+    def course_removed(
+        db: Session,
+        course_id: int,
+        category: Optional[CourseCategory] = None
+    ) -> int:
+        """
+        課程刪除（報名由資料庫的 ON DELETE CASCADE 一併刪除）
+
+        刪除前讀取該課程報名的建立時間、人數與狀態（不載入報名物件），依本地日期彙總後
+        從報名計數與類別、每日統計中扣除；回傳被刪除的報名數
+        """
+        per_day = _sum_by_local_day(db.query(
+            Registration.created_at, Registration.participants, Registration.status
+        ).filter(Registration.course_id == course_id))
+
+        StatsService.course_added(db, -1)
+        db.query(CourseRegistrationStat).filter(
+            CourseRegistrationStat.course_id == course_id
+        ).delete(synchronize_session=False)
+        if not per_day:
+            return 0
+
+        registrations = sum(row[0] for row in per_day.values())
+        participants = sum(row[1] for row in per_day.values())
+        cancellations = sum(row[2] for row in per_day.values())
+        increment_row(db, StatCounter, {"name": REGISTRATIONS}, {"value": -registrations})
+        increment_row(db, StatCounter, {"name": CANCELLATIONS}, {"value": -cancellations})
+        increment_row(db, CategoryRegistrationStat, {"category": category or CourseCategory.OTHER}, {
+            "registrations": -registrations,
+            "participants": -participants,
+            "cancellations": -cancellations,
+        })
+        for d, (count, total, cancelled) in per_day.items():
+            if d is None:
+                continue
+            increment_row(db, DailyRegistrationStat, {"day": d}, {
+                "registrations": -count,
+                "participants": -total,
+                "cancellations": -cancelled,
+            })
+        return registrations
+
+    @staticmethod
+    def courses_archived(
+        db: Session,
+        course_ids: Sequence[int],
+        registrations: int,
+        cancellations: int
+    ) -> None:
+        """
+        課程與其報名移到封存表
+
+        課程與報名計數只反映線上資料表（與列表分頁的總數一致），一併扣除；
+        類別與每日報名統計是歷史資料，保留不動
+        """
+        StatsService.course_added(db, -len(course_ids))
+        increment_row(db, StatCounter, {"name": REGISTRATIONS}, {"value": -registrations})
+        increment_row(db, StatCounter, {"name": CANCELLATIONS}, {"value": -cancellations})
+        db.query(CourseRegistrationStat).filter(
+            CourseRegistrationStat.course_id.in_(course_ids)
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def course_category_changed(
+        db: Session,
+        course_id: int,
+        old: Optional[CourseCategory],
+        new: Optional[CourseCategory]
+    ) -> None:
+        """課程類別變更時，將該課程的報名統計移到新類別"""
+        old, new = old or CourseCategory.OTHER, new or CourseCategory.OTHER
+        if old == new:
+            return
+        row = db.query(
+            func.count(Registration.id),
+            func.coalesce(func.sum(Registration.participants), 0),
+            func.coalesce(func.sum(case(
+                (Registration.status == RegistrationStatus.CANCELLED, 1), else_=0
+            )), 0)
+        ).filter(Registration.course_id == course_id).one()
+        count, participants, cancelled = row
+        if not count:
+            return
+        for category, sign in ((old, -1), (new, 1)):
+            increment_row(db, CategoryRegistrationStat, {"category": category}, {
+                "registrations": sign * count,
+                "participants": sign * participants,
+                "cancellations": sign * cancelled,
+            })
+
+    @staticmethod
+    def registration_changed(
+        db: Session,
+        registration: Registration,
+        category: Optional[CourseCategory],
+        sign: int = 1,
+        cancelled: bool = False
+    ) -> None:
+        """
+        報名新增（sign=1）或刪除（sign=-1）
+
+        - **cancelled**: 被刪除的報名是否為已取消狀態（需一併扣除取消數）
+        """
+        day = _local_day(registration.created_at)
+        participants = registration.participants or 1
+        cancel_delta = sign if cancelled else 0
+
+        increment_row(db, StatCounter, {"name": REGISTRATIONS}, {"value": sign})
+        if cancel_delta:
+            increment_row(db, StatCounter, {"name": CANCELLATIONS}, {"value": cancel_delta})
+        increment_row(db, CourseRegistrationStat, {"course_id": registration.course_id}, {
+            "registrations": sign, "cancellations": cancel_delta,
+        })
+        increment_row(db, CategoryRegistrationStat, {"category": category or CourseCategory.OTHER}, {
+            "registrations": sign, "participants": sign * participants,
+            "cancellations": cancel_delta,
+        })
+        increment_row(db, DailyRegistrationStat, {"day": day}, {
+            "registrations": sign, "participants": sign * participants,
+            "cancellations": cancel_delta,
+        })
+
+    @staticmethod
+    def registration_cancelled(
+        db: Session,
+        registration: Registration,
+        category: Optional[CourseCategory],
+        delta: int = 1
+    ) -> None:
+        """報名取消（delta=1）或由取消恢復（delta=-1）"""
+        day = _local_day(registration.created_at)
+        increment_row(db, StatCounter, {"name": CANCELLATIONS}, {"value": delta})
+        increment_row(db, CourseRegistrationStat, {"course_id": registration.course_id}, {
+            "cancellations": delta,
+        })
+        increment_row(db, CategoryRegistrationStat, {"category": category or CourseCategory.OTHER}, {
+            "cancellations": delta,
+        })
+        increment_row(db, DailyRegistrationStat, {"day": day}, {"cancellations": delta})
+
+    @staticmethod
+    def registrations_cancelled_many(db: Session, rows: Iterable) -> None:
+        """
+        整批取消報名
+
+        rows 需有 course_id、category、created_at；依課程、類別、日期分組，各只更新一次
+        """
+        StatsService._apply_grouped(db, rows, lambda row: {"cancellations": 1})
+
+    @staticmethod
+    def registrations_removed_many(db: Session, rows: Iterable) -> None:
+        """
+        整批刪除報名
+
+        rows 需有 course_id、category、created_at、participants、status
+        """
+        StatsService._apply_grouped(db, rows, lambda row: {
+            "registrations": -1,
+            "participants": -(row.participants or 1),
+            "cancellations": -1 if row.status == RegistrationStatus.CANCELLED else 0,
+        })
+
+    @staticmethod
+    def _apply_grouped(db: Session, rows: Iterable, deltas_of: Callable[[object], Dict[str, int]]) -> None:
+        counters: Counter = Counter()
+        per_course: Dict[int, Counter] = defaultdict(Counter)
+        per_category: Dict[CourseCategory, Counter] = defaultdict(Counter)
+        per_day: Dict[date, Counter] = defaultdict(Counter)
+        for row in rows:
+            deltas = deltas_of(row)
+            counters[REGISTRATIONS] += deltas.get("registrations", 0)
+            counters[CANCELLATIONS] += deltas.get("cancellations", 0)
+            per_course[row.course_id].update({
+                col: deltas.get(col, 0) for col in ("registrations", "cancellations")
+            })
+            per_category[row.category or CourseCategory.OTHER].update(deltas)
+            per_day[_local_day(row.created_at)].update(deltas)
+
+        for name, delta in counters.items():
+            increment_row(db, StatCounter, {"name": name}, {"value": delta})
+        for model, column, groups in (
+            (CourseRegistrationStat, "course_id", per_course),
+            (CategoryRegistrationStat, "category", per_category),
+            (DailyRegistrationStat, "day", per_day),
+        ):
+            for key, deltas in groups.items():
+                increment_row(db, model, {column: key}, dict(deltas))
+
+    # ---------- 讀取 ----------
+
+    @staticmethod
+    def get_counter(db: Session, name: str) -> int:
+        """讀取單一計數"""
+        value = db.query(StatCounter.value).filter(StatCounter.name == name).scalar()
+        return value or 0
+
+    @staticmethod
+    def get_course_registration_count(db: Session, course_id: int) -> int:
+        """讀取單一課程的報名數"""
+        value = db.query(CourseRegistrationStat.registrations).filter(
+            CourseRegistrationStat.course_id == course_id
+        ).scalar()
+        return value or 0
+
+    @staticmethod
+    def get_dashboard(db: Session, days: int = 30) -> dict:
+        """取得管理後台儀表板資料"""
+        counters = dict(db.query(StatCounter.name, StatCounter.value).all())
+
+        # 進行中課程的填滿率（已結束、已取消的課程不列出）
+        courses = db.query(
+            Course.id, Course.title, Course.date, Course.status,
+            Course.max_spots, Course.current_registrations
+        ).filter(
+            Course.status.notin_([CourseStatus.COMPLETED, CourseStatus.CANCELLED])
+        ).order_by(Course.date).all()
+
+        by_category = db.query(CategoryRegistrationStat).filter(
+            CategoryRegistrationStat.registrations != 0
+        ).order_by(
+            CategoryRegistrationStat.category
+        ).all()
+
+        since = local_now().date() - timedelta(days=days - 1)
+        by_day = db.query(DailyRegistrationStat).filter(
+            DailyRegistrationStat.day >= since
+        ).order_by(DailyRegistrationStat.day).all()
+
+        return {
+            "totals": {
+                "courses": counters.get(COURSES, 0),
+                "registrations": counters.get(REGISTRATIONS, 0),
+                "cancellations": counters.get(CANCELLATIONS, 0),
+            },
+            "fill_rates": [
+                {
+                    "course_id": c.id,
+                    "title": c.title,
+                    "date": c.date,
+                    "status": c.status,
+                    "max_spots": c.max_spots,
+                    "current_registrations": c.current_registrations,
+                    "fill_rate": round(c.current_registrations / c.max_spots, 4)
+                    if c.max_spots else 0.0,
+                }
+                for c in courses
+            ],
+            "registrations_by_category": [
+                {
+                    "category": row.category,
+                    "registrations": row.registrations,
+                    "participants": row.participants,
+                    "cancellations": row.cancellations,
+                }
+                for row in by_category
+            ],
+            "registrations_by_day": [
+                {
+                    "day": row.day,
+                    "registrations": row.registrations,
+                    "participants": row.participants,
+                    "cancellations": row.cancellations,
+                }
+                for row in by_day
+            ],
+        }
+
+    # ---------- 重建 ----------
+
+    @staticmethod
+    def rebuild(db: Session) -> Dict[str, int]:
+        """
+        以分組查詢從頭重新計算所有統計，回傳各表的筆數
+
+        每日統計需依本地日期分組，逐列讀取報名的建立時間、人數與狀態（每批 5000 筆）
+        """
+        is_cancelled = case((Registration.status == RegistrationStatus.CANCELLED, 1), else_=0)
+        participants = func.coalesce(func.sum(Registration.participants), 0)
+        cancellations = func.coalesce(func.sum(is_cancelled), 0)
+
+        course_total = db.query(func.count(Course.id)).scalar()
+        per_course = db.query(
+            Registration.course_id, func.count(Registration.id), cancellations
+        ).group_by(Registration.course_id).all()
+        per_category = db.query(
+            Course.category, func.count(Registration.id), participants, cancellations
+        ).join(Course, Course.id == Registration.course_id).group_by(Course.category).all()
+        per_day = _sum_by_local_day(db.query(
+            Registration.created_at, Registration.participants, Registration.status
+        ).yield_per(5000))
+
+        # 類別與每日統計包含已封存的報名
+        archived_cancelled = case((ArchivedRegistration.status == RegistrationStatus.CANCELLED, 1), else_=0)
+        archived_participants = func.coalesce(func.sum(ArchivedRegistration.participants), 0)
+        archived_cancellations = func.coalesce(func.sum(archived_cancelled), 0)
+        per_category += db.query(
+            ArchivedCourse.category, func.count(ArchivedRegistration.id),
+            archived_participants, archived_cancellations
+        ).join(
+            ArchivedCourse, ArchivedCourse.id == ArchivedRegistration.course_id
+        ).group_by(ArchivedCourse.category).all()
+        _sum_by_local_day(db.query(
+            ArchivedRegistration.created_at, ArchivedRegistration.participants, ArchivedRegistration.status
+        ).yield_per(5000), per_day)
+
+        for model in (StatCounter, CourseRegistrationStat,
+                      CategoryRegistrationStat, DailyRegistrationStat):
+            db.query(model).delete(synchronize_session=False)
+
+        db.add_all([
+            StatCounter(name=COURSES, value=course_total),
+            StatCounter(name=REGISTRATIONS, value=sum(r[1] for r in per_course)),
+            StatCounter(name=CANCELLATIONS, value=sum(r[2] for r in per_course)),
+        ])
+        db.add_all([
+            CourseRegistrationStat(course_id=course_id, registrations=count, cancellations=cancelled)
+            for course_id, count, cancelled in per_course
+        ])
+
+        categories: Dict[CourseCategory, List[int]] = {}
+        for category, count, total, cancelled in per_category:
+            row = categories.setdefault(category or CourseCategory.OTHER, [0, 0, 0])
+            row[0] += count
+            row[1] += total
+            row[2] += cancelled
+        db.add_all([
+            CategoryRegistrationStat(
+                category=category, registrations=count,
+                participants=total, cancellations=cancelled
+            )
+            for category, (count, total, cancelled) in categories.items()
+        ])
+        days = {d: totals for d, totals in per_day.items() if d is not None}
+        db.add_all([
+            DailyRegistrationStat(
+                day=d, registrations=count, participants=total, cancellations=cancelled
+            )
+            for d, (count, total, cancelled) in days.items()
+        ])
+        db.commit()
+        return {
+            "course_stats": len(per_course),
+            "category_stats": len(categories),
+            "daily_stats": len(days),
+        }
+
+    @staticmethod
+    def ensure_built(db: Session) -> None:
+        """統計表為空但已有資料時（例如既有資料庫），重新計算一次"""
+        if db.query(StatCounter).first() is None and db.query(Course.id).first() is not None:
+            StatsService.rebuild(db)
@@ -0,0 +1,100 @@
+"""
+樂觀並行控制（列版本號）
+
+可修改的模型（課程、報名、講師、活動、常見問題）有 version 欄位，並設為 SQLAlchemy 的
+version_id_col：ORM 產生的 UPDATE 都是 `WHERE id = ? AND version = ?` 的比較後交換，同時把
+版本號加一。讀取後若有其他交易先更新，UPDATE 影響 0 列，flush 會引發 StaleDataError，
+不會覆蓋對方剛寫入的欄位；整個過程不需要鎖定資料列，報名的寫入路徑不會被後台編輯卡住。
+
+直接以 UPDATE 語句修改這些資料表的寫入路徑（名額加減、狀態排程、名額核對、整批操作）
+也會把 version 加一，讓之前讀到舊資料的編輯失敗而不是蓋掉新的報名人數。
+
+PUT 端點以 If-Match 標頭指定預期的版本號（GET / PUT 回應的 ETag）：與目前版本不同時
+回傳 412。沒有 If-Match 時，更新途中遇到其他寫入會重新讀取並重試。
+
+更新前不需要讀取舊值的模型（講師、活動、常見問題）以 update_returning() 一個
+UPDATE … RETURNING 完成比對、更新與取回新資料。
+"""
+
+import functools
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.config import settings
+
+
+class VersionConflict(Exception):
+    """資料已被其他交易更新（版本號不符）"""
+
+    def __init__(self, current_version: Optional[int] = None):
+        super().__init__("資料已被其他人更新，請重新讀取後再修改")
+        self.current_version = current_version
+
+
+def etag(version: int) -> str:
+    """版本號對應的 ETag"""
+    return f'"{version}"'
+
+
+def check_version(obj, expected_version: Optional[int]) -> None:
+    """讀取到的資料與 If-Match 指定的版本不同時引發 VersionConflict"""
+    if expected_version is not None and obj.version != expected_version:
+        raise VersionConflict(obj.version)
+
+
+def retry_on_conflict(func):
+    """
+    更新函式的裝飾器：commit 時遇到 StaleDataError 先 rollback
+
+    呼叫端有指定 expected_version（If-Match）時直接引發 VersionConflict；
+    否則重新執行整個函式（重新讀取、修改並提交），最多 VERSION_CONFLICT_RETRIES 次
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        db = kwargs["db"] if "db" in kwargs else args[0]
+        expected_version = kwargs.get("expected_version")
+        for _ in range(settings.VERSION_CONFLICT_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except StaleDataError:
+                db.rollback()
+                if expected_version is not None:
+                    raise VersionConflict()
+        raise VersionConflict()
+    return wrapper
+
+
+def update_returning(
+    db: Session,
+    model,
+    ident: int,
+    values: Dict[str, Any],
+    expected_version: Optional[int] = None
+):
+    """
+    以單一 UPDATE … RETURNING 更新一筆資料並回傳更新後的物件（不 commit）
+
+    版本號在同一個語句中加一；有 expected_version 時只在版本相同時更新，否則引發
+    VersionConflict。找不到資料時回傳 None。
+    """
+    if not values:
+        obj = db.get(model, ident)
+        if obj is not None:
+            check_version(obj, expected_version)
+        return obj
+
+    stmt = update(model).where(model.id == ident)
+    if expected_version is not None:
+        stmt = stmt.where(model.version == expected_version)
+    obj = db.scalars(
+        stmt.values(**values, version=model.version + 1).returning(model)
+    ).one_or_none()
+    if obj is None and expected_version is not None:
+        # 只有失敗時才多查一次，區分資料不存在與版本不符
+        current = db.scalar(select(model.version).where(model.id == ident))
+        if current is not None:
+            raise VersionConflict(current)
+    return obj
@@ -0,0 +1,118 @@
+"""
+讀取吞吐量隨 worker 數的擴展
+
+依序以不同的 WEB_WORKERS 啟動 `python -m app.serve`，用多個負載程序對讀取端點
+持續發送請求，輸出每秒請求數與相對單一 worker 的擴展效率。
+
+    python bench/read_scaling.py --workers 1 2 4 --path /api/v1/courses/?limit=20
+
+負載程序與伺服器在同一台機器上時，worker 數加上負載程序數不應超過 CPU 核心數，
+否則量到的是核心的競爭而不是伺服器的擴展。
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _client_process(url: str, connections: int, seconds: float, result) -> None:
+    async def run() -> int:
+        done = 0
+        deadline = time.monotonic() + seconds
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            async def loop():
+                nonlocal done
+                while time.monotonic() < deadline:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    done += 1
+            await asyncio.gather(*(loop() for _ in range(connections)))
+        return done
+
+    result.put(asyncio.run(run()))
+
+
+def measure(url: str, clients: int, connections: int, seconds: float) -> float:
+    """以多個負載程序量測每秒請求數"""
+    result = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_client_process, args=(url, connections, seconds, result))
+        for _ in range(clients)
+    ]
+    start = time.monotonic()
+    for p in procs:
+        p.start()
+    total = sum(result.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return total / (time.monotonic() - start)
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_WORKERS": str(workers),
+        "WEB_PORT": str(port),
+        "WEB_HOST": "127.0.0.1",
+        "DEBUG": "false",
+        "SCHEDULER_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.serve"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                # 等所有 worker 都完成啟動
+                time.sleep(1 + workers * 0.5)
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError(f"{workers} 個 worker 的伺服器啟動逾時")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/api/v1/courses/?limit=20")
+    parser.add_argument("--clients", type=int, default=2, help="負載程序數")
+    parser.add_argument("--connections", type=int, default=32, help="每個負載程序的並行連線數")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"CPU 核心數：{os.cpu_count()}，端點：{args.path}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for workers in args.workers:
+        proc = start_server(workers, args.port)
+        try:
+            url = f"http://127.0.0.1:{args.port}{args.path}"
+            measure(url, args.clients, args.connections, args.warmup)
+            rps = measure(url, args.clients, args.connections, args.seconds)
+        finally:
+            proc.terminate()
+            proc.wait()
+        baseline = baseline or rps / workers
+        speedup = rps / baseline
+        print(f"{workers:>8} {rps:>10.0f} {speedup:>8.2f} {speedup / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+寫入路徑的 SQL 語句數
+
+以與 API 相同的 session 設定（get_db）呼叫各服務的 create / update，並以回應 Schema 序列化，
+記錄每個操作送出的語句：寫入的資料表應只有一個語句（INSERT、UPDATE … RETURNING），
+commit 之後也不應再查詢寫入的資料表。不符合預期時以結束碼 1 結束。
+
+    python bench/write_statements.py [--database-url postgresql+psycopg2://…] [-v]
+
+未指定 --database-url 時使用暫存的 SQLite 資料庫（需要 SQLite 3.35 以上才支援 RETURNING）。
+統計表、每月摘要、outbox 與快取同步的語句另外列出，不計入寫入的資料表。
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_TABLE = re.compile(r'^\s*(?:INSERT INTO|UPDATE|DELETE FROM)\s+"?(\w+)|\bFROM\s+"?(\w+)', re.IGNORECASE)
+
+
+def _table_of(statement: str) -> str:
+    match = _TABLE.search(statement)
+    return (match.group(1) or match.group(2)) if match else ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("-v", "--verbose", action="store_true", help="列出每個語句")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.database_url is None:
+        tmp = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{tmp.name}/bench.db"
+    os.environ.update({"DATABASE_URL": args.database_url, "DEBUG": "false", "SCHEDULER_ENABLED": "false"})
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from sqlalchemy import event
+
+    import app.main  # noqa: F401  註冊與 API 相同的 session 事件並建立資料表
+    from app.db.database import engine, get_db
+    from app.schemas import schemas
+    from app.services.course_service import CourseService
+    from app.services.other_services import ActivityService, FAQService, InstructorService
+    from app.services.registration_service import RegistrationService
+
+    statements = []
+    committed = [False]
+    owner = threading.get_ident()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == owner:
+            statements.append((committed[0], " ".join(statement.split())))
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        if threading.get_ident() == owner:
+            committed[0] = True
+
+    def run(label, table, expected, call, schema):
+        statements.clear()
+        committed[0] = False
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            obj = call(db)
+            schema.model_validate(obj).model_dump()
+        finally:
+            db_gen.close()
+        written = [s for done, s in statements if not done and _table_of(s) == table]
+        after_commit = [s for done, s in statements if done and _table_of(s) == table]
+        ok = len(written) == expected and not after_commit
+        print(
+            f"{'OK ' if ok else 'NG '} {label:<22} {table:<14} {len(written)}/{expected}"
+            f"  commit 後 {len(after_commit)}  全部 {len(statements)}"
+        )
+        if args.verbose or not ok:
+            for done, s in statements:
+                print(f"      {'↳' if done else ' '} {s[:140]}")
+        return obj, ok
+
+    results = []
+    instructor, ok = run(
+        "create instructor", "instructors", 1,
+        lambda db: InstructorService.create(db, schemas.InstructorCreate(name="林老師", specialties=["濕地"])),
+        schemas.Instructor
+    )
+    results.append(ok)
+    results.append(run(
+        "update instructor", "instructors", 1,
+        lambda db: InstructorService.update(
+            db=db, instructor_id=instructor.id,
+            instructor_in=schemas.InstructorUpdate(title="講師"), expected_version=instructor.version
+        ),
+        schemas.Instructor
+    )[1])
+
+    course, ok = run(
+        "create course", "courses", 1,
+        lambda db: CourseService.create(db, schemas.CourseCreate(
+            title="濕地觀察", date=date.today() + timedelta(days=30), max_spots=20,
+            instructor_id=instructor.id
+        )),
+        schemas.Course
+    )
+    results.append(ok)
+    # 更新課程需先讀取舊值（每月摘要、類別統計），再以版本號比對後更新
+    results.append(run(
+        "update course", "courses", 2,
+        lambda db: CourseService.update(
+            db=db, course_id=course.id, course_in=schemas.CourseUpdate(location="新豐紅樹林")
+        ),
+        schemas.Course
+    )[1])
+
+    registration, ok = run(
+        "create registration", "registrations", 1,
+        lambda db: RegistrationService.create(db, schemas.RegistrationCreate(
+            course_id=course.id, name="王小明", email="bench@example.com", phone="0912345678"
+        )),
+        schemas.Registration
+    )
+    results.append(ok)
+    # 報名同時以一個 UPDATE … RETURNING 加減課程名額（另有一次讀取課程）
+    results.append(run(
+        "create registration", "courses", 2,
+        lambda db: RegistrationService.create(db, schemas.RegistrationCreate(
+            course_id=course.id, name="王小華", email="bench2@example.com", phone="0912345678"
+        )),
+        schemas.Registration
+    )[1])
+    results.append(run(
+        "update registration", "registrations", 2,
+        lambda db: RegistrationService.update(
+            db=db, registration_id=registration.id,
+            registration_in=schemas.RegistrationUpdate(notes="素食")
+        ),
+        schemas.Registration
+    )[1])
+
+    activity, ok = run(
+        "create activity", "activities", 1,
+        lambda db: ActivityService.create(db, schemas.ActivityCreate(
+            title="淨灘", date=date.today(), photos=["a.jpg"]
+        )),
+        schemas.Activity
+    )
+    results.append(ok)
+    results.append(run(
+        "update activity", "activities", 1,
+        lambda db: ActivityService.update(
+            db=db, activity_id=activity.id, activity_in=schemas.ActivityUpdate(participants_count=30)
+        ),
+        schemas.Activity
+    )[1])
+
+    faq, ok = run(
+        "create faq", "faqs", 1,
+        lambda db: FAQService.create(db, schemas.FAQCreate(question="如何報名？", answer="線上報名")),
+        schemas.FAQ
+    )
+    results.append(ok)
+    results.append(run(
+        "update faq", "faqs", 1,
+        lambda db: FAQService.update(db=db, faq_id=faq.id, faq_in=schemas.FAQUpdate(order=2)),
+        schemas.FAQ
+    )[1])
+
+    engine.dispose()
+    if tmp is not None:
+        tmp.cleanup()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+測試共用設定
+
+在匯入應用程式之前指定暫存的 SQLite 資料庫，並關閉背景排程與速率限制
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+_tmp = tempfile.TemporaryDirectory()
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp.name}/test.db",
+    "DEBUG": "false",
+    "SCHEDULER_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "EMAIL_BACKEND": "memory",
+})
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    from app.db.database import engine
+
+    engine.dispose()
+    _tmp.cleanup()
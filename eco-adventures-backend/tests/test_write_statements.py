@@ -0,0 +1,216 @@
+"""
+寫入路徑的 SQL 語句數
+
+以與 API 相同的 session 設定（get_db）呼叫各服務的 create / update，並以回應 Schema 序列化，
+寫入的資料表應只有一個語句（INSERT、UPDATE … RETURNING），commit 之後也不應再查詢寫入的資料表。
+需要先讀取舊值的操作另外註明。逐一列出語句請執行 python bench/write_statements.py -v
+
+另外限制每個操作的語句總數，避免副表（統計、outbox、快取失效通知、變更紀錄）的寫入悄悄增加。
+目前的總數（SQLite，含 commit 後序列化的查詢）：
+
+- 講師、活動、FAQ 的新增與更新：3（本身 1、cache_invalidations 1、change_log 1）
+- 新增課程：13（本身 1、每月摘要與統計計數各一次 upsert、outbox 1、快取失效與變更紀錄各 1、
+  commit 後讀取講師 1）
+- 更新課程：6（讀取舊值、UPDATE、outbox、快取失效、變更紀錄、commit 後讀取講師）
+- 新增報名：23（讀取課程、加減名額、每月摘要、四個統計 upsert、報名本身、outbox、快取失效、變更紀錄）
+- 更新報名（僅備註）：3（讀取舊值、outbox、UPDATE）
+
+upsert 的資料列已存在時只需一個 UPDATE，第一次建立時多出 SAVEPOINT、INSERT、RELEASE 三個語句；
+上限以第一次建立計算，例如同一課程的下一筆報名只有 11 個語句。
+"""
+
+import re
+import threading
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app.main  # noqa: F401  註冊與 API 相同的 session 事件並建立資料表
+from app.db.database import engine, get_db
+from app.schemas import schemas
+from app.services.course_service import CourseService
+from app.services.other_services import ActivityService, FAQService, InstructorService
+from app.services.registration_service import RegistrationService
+
+_TABLE = re.compile(r'^\s*(?:INSERT INTO|UPDATE|DELETE FROM)\s+"?(\w+)|\bFROM\s+"?(\w+)', re.IGNORECASE)
+
+
+def _table_of(statement: str) -> str:
+    match = _TABLE.search(statement)
+    return (match.group(1) or match.group(2)) if match else ""
+
+
+class StatementRecorder:
+    """記錄目前執行緒送出的語句，以及是否已經 commit"""
+
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+        self._owner = threading.get_ident()
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._owner:
+            self.statements.append((self.committed, " ".join(statement.split())))
+
+    def commit(self, conn):
+        if threading.get_ident() == self._owner:
+            self.committed = True
+
+    def run(self, call, schema):
+        """在新的 session 中執行 call(db) 並序列化結果，只保留這次的語句"""
+        self.statements = []
+        self.committed = False
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            obj = call(db)
+            schema.model_validate(obj).model_dump()
+        finally:
+            db_gen.close()
+        return obj
+
+    def assert_writes(self, table: str, expected: int = 1) -> None:
+        written = [s for done, s in self.statements if not done and _table_of(s) == table]
+        after_commit = [s for done, s in self.statements if done and _table_of(s) == table]
+        listing = "\n".join(s for _, s in self.statements)
+        assert len(written) == expected, f"{table} 的語句數為 {len(written)}，預期 {expected}：\n{listing}"
+        assert not after_commit, f"commit 後仍查詢 {table}：\n{listing}"
+
+    def assert_total(self, limit: int) -> None:
+        listing = "\n".join(s for _, s in self.statements)
+        assert len(self.statements) <= limit, f"語句總數為 {len(self.statements)}，上限 {limit}：\n{listing}"
+
+
+@pytest.fixture(scope="module")
+def recorder():
+    recorder = StatementRecorder()
+    event.listen(engine, "before_cursor_execute", recorder.before_cursor_execute)
+    event.listen(engine, "commit", recorder.commit)
+    yield recorder
+    event.remove(engine, "before_cursor_execute", recorder.before_cursor_execute)
+    event.remove(engine, "commit", recorder.commit)
+
+
+@pytest.fixture(scope="module")
+def instructor(recorder):
+    return recorder.run(
+        lambda db: InstructorService.create(db, schemas.InstructorCreate(name="林老師", specialties=["濕地"])),
+        schemas.Instructor
+    )
+
+
+@pytest.fixture(scope="module")
+def course(recorder, instructor):
+    return recorder.run(
+        lambda db: CourseService.create(db, schemas.CourseCreate(
+            title="濕地觀察", date=date.today() + timedelta(days=30), max_spots=20,
+            instructor_id=instructor.id
+        )),
+        schemas.Course
+    )
+
+
+def test_create_instructor(recorder):
+    recorder.run(
+        lambda db: InstructorService.create(db, schemas.InstructorCreate(name="陳老師")),
+        schemas.Instructor
+    )
+    recorder.assert_writes("instructors")
+    recorder.assert_total(3)
+
+
+def test_update_instructor(recorder, instructor):
+    recorder.run(
+        lambda db: InstructorService.update(
+            db=db, instructor_id=instructor.id,
+            instructor_in=schemas.InstructorUpdate(title="講師"), expected_version=instructor.version
+        ),
+        schemas.Instructor
+    )
+    recorder.assert_writes("instructors")
+    recorder.assert_total(3)
+
+
+def test_create_course(recorder, instructor):
+    recorder.run(
+        lambda db: CourseService.create(db, schemas.CourseCreate(
+            title="紅樹林導覽", date=date.today() + timedelta(days=40), max_spots=30,
+            instructor_id=instructor.id
+        )),
+        schemas.Course
+    )
+    recorder.assert_writes("courses")
+    recorder.assert_total(13)
+
+
+def test_update_course(recorder, course):
+    recorder.run(
+        lambda db: CourseService.update(
+            db=db, course_id=course.id, course_in=schemas.CourseUpdate(location="新豐紅樹林")
+        ),
+        schemas.Course
+    )
+    # 更新課程需先讀取舊值（每月摘要、類別統計），再以版本號比對後更新
+    recorder.assert_writes("courses", 2)
+    recorder.assert_total(6)
+
+
+def test_create_and_update_registration(recorder, course):
+    registration = recorder.run(
+        lambda db: RegistrationService.create(db, schemas.RegistrationCreate(
+            course_id=course.id, name="王小明", email="test@example.com", phone="0912345678"
+        )),
+        schemas.Registration
+    )
+    recorder.assert_writes("registrations")
+    # 報名同時以一個 UPDATE … RETURNING 加減課程名額（另有一次讀取課程）
+    recorder.assert_writes("courses", 2)
+    recorder.assert_total(23)
+
+    recorder.run(
+        lambda db: RegistrationService.update(
+            db=db, registration_id=registration.id,
+            registration_in=schemas.RegistrationUpdate(notes="素食")
+        ),
+        schemas.Registration
+    )
+    # 更新報名需先讀取舊值（人數與狀態的異動要同步到課程名額）
+    recorder.assert_writes("registrations", 2)
+    recorder.assert_total(3)
+
+
+def test_create_and_update_activity(recorder):
+    activity = recorder.run(
+        lambda db: ActivityService.create(db, schemas.ActivityCreate(
+            title="淨灘", date=date.today(), photos=["a.jpg"]
+        )),
+        schemas.Activity
+    )
+    recorder.assert_writes("activities")
+    recorder.assert_total(3)
+
+    recorder.run(
+        lambda db: ActivityService.update(
+            db=db, activity_id=activity.id, activity_in=schemas.ActivityUpdate(participants_count=30)
+        ),
+        schemas.Activity
+    )
+    recorder.assert_writes("activities")
+    recorder.assert_total(3)
+
+
+def test_create_and_update_faq(recorder):
+    faq = recorder.run(
+        lambda db: FAQService.create(db, schemas.FAQCreate(question="如何報名？", answer="線上報名")),
+        schemas.FAQ
+    )
+    recorder.assert_writes("faqs")
+    recorder.assert_total(3)
+
+    recorder.run(
+        lambda db: FAQService.update(db=db, faq_id=faq.id, faq_in=schemas.FAQUpdate(order=2)),
+        schemas.FAQ
+    )
+    recorder.assert_writes("faqs")
+    recorder.assert_total(3)
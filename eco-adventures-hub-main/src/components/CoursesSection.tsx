@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import CourseCard from "./CourseCard";
 import RegistrationModal from "./RegistrationModal";
-import { courseAPI } from "@/lib/api";
+import { homeAPI } from "@/lib/api";
 import { useToast } from "@/hooks/use-toast";
 
 interface Course {
@@ -31,8 +31,8 @@ const CoursesSection = () => {
     const fetchCourses = async () => {
       try {
         setLoading(true);
-        const data = await courseAPI.getUpcoming(10);
-        setCourses(data);
+        const data = await homeAPI.get();
+        setCourses(data.upcoming_courses);
       } catch (error) {
         console.error("載入課程失敗:", error);
         toast({
@@ -3,6 +3,9 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 const API_VERSION = '/api/v1';
 
 export const API_ENDPOINTS = {
+  // 首頁（課程、講師、活動、FAQ 一次取得）
+  HOME: `${API_BASE_URL}${API_VERSION}/home`,
+  
   // 課程相關
   COURSES: `${API_BASE_URL}${API_VERSION}/courses`,
   COURSES_UPCOMING: `${API_BASE_URL}${API_VERSION}/courses/upcoming`,
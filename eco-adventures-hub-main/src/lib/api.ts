@@ -33,6 +33,19 @@ async function fetchAPI<T>(url: string, options: RequestInit = {}): Promise<T> {
   }
 }
 
+// ============ 首頁 API ============
+export const homeAPI = {
+  // 取得首頁所需的所有資料（即將開始的課程、講師、活動、FAQ）
+  get: () => {
+    return fetchAPI<{
+      upcoming_courses: any[];
+      instructors: any[];
+      activities: any[];
+      faqs: any[];
+    }>(API_ENDPOINTS.HOME);
+  },
+};
+
 // ============ 課程 API ============
 export const courseAPI = {
   // 取得課程列表